@@ -0,0 +1,96 @@
+"""
+Benchmark of DAYSIM DA result file parsing on dense sensor grids
+
+Writes one synthetic DA file per metric (DA, DAcon, DAmax, DSP) for a grid of
+sensor points and compares time and peak memory of the previous dict-per-point
+parser with the array-backed daysim_post.parse_da_grid.
+
+"""
+
+import os
+import csv
+import re
+import argparse
+import tempfile
+import tracemalloc
+from shutil import rmtree
+from time import time
+
+from pybps.postprocess.daysim import parse_da_grid, DA_METRICS
+
+
+TITLES = ['Daylight Autonomy', 'Continuous Daylight Autonomy', 'DA_max',
+          'Daylight Saturation Potential']
+
+
+def write_da(file_abspath, title, npoint):
+    """Write a synthetic DA file for a grid of npoint sensor points"""
+
+    with open(file_abspath, 'w') as f:
+        f.write('# %s - Active User (500 lux)\n' % title)
+        f.write('# Synthetic file\n')
+        for i in range(npoint):
+            f.write('%.3f\t%.3f\t0.850\t%d\n' % (i % 1000 * 0.1,
+                                                 i // 1000 * 0.1, i % 101))
+
+
+def parse_da_dicts(file_abspathlist):
+    """Dict-per-point DA parser (reference implementation)"""
+
+    da_results = []
+    for file_abspath in file_abspathlist:
+        with open(file_abspath, 'r') as out_f:
+            line_1 = next(out_f)
+            da_data = re.search(r'# (.*) - Active User', line_1).group(1)
+            match = re.search(r'(.*) \((\d{3}) lux\)', da_data)
+            if match:
+                da_data = match.group(1)
+            name = DA_METRICS.get(da_data, da_data)
+            next(out_f)
+            dict_list = [{'sens_x': row[0], 'sens_y': row[1],
+                          'sens_z': row[2], name: row[3]}
+                         for row in csv.reader(out_f, delimiter='\t')]
+        if not da_results:
+            da_results.extend(dict_list)
+        else:
+            for (res_dict, new_dict) in zip(da_results, dict_list):
+                res_dict.update(new_dict)
+    return da_results
+
+
+def bench(func, file_abspathlist):
+    """Return parsing time and peak memory traced during parsing (measured
+    in a second run, since tracing slows down parsing)"""
+
+    start_time = time()
+    result = func(file_abspathlist)
+    elapsed = time() - start_time
+    del result
+    tracemalloc.start()
+    result = func(file_abspathlist)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del result
+    return elapsed, peak
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Benchmark DA parsers.')
+    parser.add_argument('--npoint', default=500000, type=int,
+                        help='Number of sensor points')
+    args = parser.parse_args()
+
+    tmp_abspath = tempfile.mkdtemp(prefix='pybps_bench_')
+    try:
+        file_abspathlist = []
+        for i, title in enumerate(TITLES):
+            file_abspath = os.path.join(tmp_abspath, 'res%d.da' % i)
+            write_da(file_abspath, title, args.npoint)
+            file_abspathlist.append(file_abspath)
+        print('%10s %12s %16s' % ('parser', 'time (s)', 'peak mem (MB)'))
+        for name, func in [('dicts', parse_da_dicts), ('grid', parse_da_grid)]:
+            elapsed, peak = bench(func, file_abspathlist)
+            print('%10s %12.2f %16.1f' % (name, elapsed, peak / 1024. ** 2))
+    finally:
+        rmtree(tmp_abspath)
@@ -0,0 +1,69 @@
+"""
+Benchmark of file lookups in a results tree
+
+Creates a synthetic results directory (one sub-folder per job) and compares
+repeated lookups with util.get_file_paths, which walks the tree for every
+call, against lookups in a util.DirIndex walked only once.
+
+"""
+
+import os
+import argparse
+import tempfile
+from shutil import rmtree
+from time import time
+
+from pybps import util
+
+
+def make_tree(dir, nfile, per_job=4):
+    """Create nfile empty files spread over job sub-folders"""
+
+    exts = ['.month', '.log', '.lst', '.out']
+    for i in range(nfile // per_job):
+        jobdir = os.path.join(dir, 'BENCH001_%05d' % (i + 1))
+        os.mkdir(jobdir)
+        for ext in exts[:per_job]:
+            open(os.path.join(jobdir, 'Model' + ext), 'w').close()
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Benchmark file lookups.')
+    parser.add_argument('--nfile', default=100000, type=int,
+                        help='Number of files in results tree')
+    parser.add_argument('--nquery', default=5, type=int,
+                        help='Number of repeated lookups')
+    args = parser.parse_args()
+
+    tmp_abspath = tempfile.mkdtemp(prefix='pybps_bench_')
+    try:
+        make_tree(tmp_abspath, args.nfile)
+        queries = [['.month'], ['.log'], ['.month', '.log']]
+
+        start_time = time()
+        for i in range(args.nquery):
+            for q in queries:
+                util.get_file_paths(q, tmp_abspath)
+        walk_time = (time() - start_time) / (args.nquery * len(queries))
+
+        index = util.DirIndex(tmp_abspath)
+        start_time = time()
+        index.files()
+        build_time = time() - start_time
+        start_time = time()
+        for i in range(args.nquery):
+            for q in queries:
+                index.find(q)
+        query_time = (time() - start_time) / (args.nquery * len(queries))
+        start_time = time()
+        for i in range(1, args.nfile // 4 + 1):
+            index.find(['.month'], subdir='BENCH001_%05d' % i)
+        subdir_time = (time() - start_time) / (args.nfile // 4)
+
+        print('get_file_paths per lookup:   %10.2f ms' % (1000 * walk_time))
+        print('DirIndex build (one walk):   %10.2f ms' % (1000 * build_time))
+        print('DirIndex per lookup:         %10.3f ms' % (1000 * query_time))
+        print('DirIndex per job lookup:     %10.4f ms' % (1000 * subdir_time))
+    finally:
+        rmtree(tmp_abspath)
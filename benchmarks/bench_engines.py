@@ -0,0 +1,99 @@
+"""
+Benchmark of batch run engines on many short simulation jobs
+
+Creates a synthetic TRNSYS project whose simulation tool is a tiny shell
+script (POSIX only), then runs all jobs with the multiprocessing pool engine
+and with the asyncio engine of BPSProject.run. Each engine is run in its own
+process, so that throughput and peak memory of the parent process (and of
+the largest child process, pool workers included) are measured separately.
+
+"""
+
+import os
+import sys
+import argparse
+import resource
+import subprocess
+import tempfile
+from shutil import rmtree
+from time import time
+
+
+STUB = """#!/bin/sh
+printf 'Month\\tQHEAT\\t\\nJanuary\\t1.0\\t\\n' > "$(dirname "$1")/out.month"
+printf 'Total Warnings   :  0\\nTotal Fatal Errors  :  0\\n' > "${1%.dck}.log"
+"""
+
+
+def make_project(proj_abspath, njob):
+    """Create a synthetic TRNSYS project with a stub simulation tool"""
+
+    os.makedirs(proj_abspath)
+    exe_abspath = os.path.join(proj_abspath, '..', 'trnexe.sh')
+    with open(exe_abspath, 'w') as f:
+        f.write(STUB)
+    os.chmod(exe_abspath, 0o755)
+    with open(os.path.join(proj_abspath, 'config.ini'), 'w') as f:
+        f.write('[TRNSYS]\n'
+                'TRNExe_Path = %s\n' % os.path.abspath(exe_abspath) +
+                'ModelFile_Extensions = .dck\n'
+                'Results_Folder = .\\Results\n'
+                'ResultFile_Extensions = .month\n'
+                'LogFile_Extensions = .log\n'
+                'TemplateFile_SearchString = _Template\n'
+                'SampleFile_SearchString = _Samples\n')
+    with open(os.path.join(proj_abspath, 'Model_Template.dck'), 'w') as f:
+        f.write('VERSION 17\nCONSTANTS 1\nHEAT = $HEAT\nEND\n')
+    with open(os.path.join(proj_abspath, 'Model_Samples.csv'), 'w') as f:
+        f.write('HEAT\n' + ''.join('%d\n' % i for i in range(njob)))
+
+
+def bench(proj_abspath, engine, ncore):
+    """Run all jobs of project with given engine and print measurements"""
+
+    from pybps import BPSProject
+
+    bps = BPSProject(proj_abspath, seriesID='BENCH' + engine[:3].upper())
+    bps.add_jobs()
+    start_time = time()
+    bps.run(ncore=ncore, engine=engine, schedule='sample')
+    elapsed = time() - start_time
+    self_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    child_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    print('RESULT %s %.3f %d %d' % (engine, elapsed, self_rss, child_rss))
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Benchmark run engines.')
+    parser.add_argument('--njob', default=10000, type=int,
+                        help='Number of jobs')
+    parser.add_argument('--ncore', default=-1, type=int,
+                        help='Number of simulations run at a time')
+    parser.add_argument('--engine', default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--project', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.engine:
+        bench(args.project, args.engine, args.ncore)
+        sys.exit()
+
+    tmp_abspath = tempfile.mkdtemp(prefix='pybps_bench_')
+    try:
+        proj_abspath = os.path.join(tmp_abspath, 'proj')
+        make_project(proj_abspath, args.njob)
+        print('%10s %12s %10s %18s %18s' % ('engine', 'time (s)', 'jobs/s',
+              'parent mem (MB)', 'max child mem (MB)'))
+        for engine in ['pool', 'asyncio']:
+            out = subprocess.check_output([sys.executable, __file__,
+                '--engine', engine, '--project', proj_abspath,
+                '--ncore', str(args.ncore)], universal_newlines=True)
+            line = [l for l in out.splitlines() if l.startswith('RESULT')][0]
+            engine, elapsed, self_rss, child_rss = line.split()[1:]
+            # Peak memory is given in KB (bytes on Mac OS X)
+            unit = 1024. ** 2 if sys.platform == 'darwin' else 1024.
+            print('%10s %12.2f %10.1f %18.1f %18.1f' % (engine,
+                float(elapsed), args.njob / float(elapsed),
+                int(self_rss) / unit, int(child_rss) / unit))
+    finally:
+        rmtree(tmp_abspath)
@@ -0,0 +1,86 @@
+"""
+Benchmark of TRNSYS log file parsing on large log files
+
+Writes a synthetic TRNSYS log file and compares time and peak memory of the
+previous parser (one regex search per field on the whole file content) with
+the single-pass streaming extraction of trnsys_post.parse_log.
+
+"""
+
+import os
+import re
+import argparse
+import tempfile
+import tracemalloc
+from shutil import rmtree
+from time import time
+
+from pybps.postprocess.trnsys import parse_log
+
+
+def write_log(file_abspath, nline):
+    """Write a synthetic TRNSYS log file with nline message lines"""
+
+    with open(file_abspath, 'w') as f:
+        for i in range(nline):
+            if i % 20 == 0:
+                f.write('*** Warning at time : %d.000000\n' % i)
+            f.write('TRNSYS Message %d : Synthetic message for unit %d\n' %
+                    (i % 500, i % 37))
+        f.write('Total Warnings      :     %d\n' % (nline // 20))
+        f.write('Total Fatal Errors  :     0\n')
+
+
+def parse_log_read(file_abspath):
+    """Log parser reading whole file content (reference implementation)"""
+
+    runsumdict = {}
+    with open(file_abspath, 'r') as log_f:
+        temp = log_f.read()
+        match = re.search(r'Simulation stopped with errors', temp)
+        if match:
+            runsumdict['Message'] = match.group()
+            match = re.search(r'Total Warnings\s+:\s+(\d+)', temp)
+            runsumdict['Warnings'] = int(match.group(1))
+            match = re.search(r'Total Fatal Errors\s+:\s+(\d+)', temp)
+            runsumdict['Errors'] = int(match.group(1))
+        else:
+            runsumdict['Message'] = "Simulation ended successfully"
+            runsumdict['Warnings'] = len(re.findall(r'Warning at time', temp))
+            runsumdict['Errors'] = 0
+    return runsumdict
+
+
+def bench(func, file_abspath):
+    """Return parsing time and peak memory traced during parsing (measured
+    in a second run, since tracing slows down parsing)"""
+
+    start_time = time()
+    func(file_abspath)
+    elapsed = time() - start_time
+    tracemalloc.start()
+    func(file_abspath)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Benchmark log parsers.')
+    parser.add_argument('--nline', default=2000000, type=int,
+                        help='Number of message lines in log file')
+    args = parser.parse_args()
+
+    tmp_abspath = tempfile.mkdtemp(prefix='pybps_bench_')
+    try:
+        file_abspath = os.path.join(tmp_abspath, 'Model.log')
+        write_log(file_abspath, args.nline)
+        print('File size: %.1f MB' % (os.path.getsize(file_abspath) / 1024. ** 2))
+        assert parse_log_read(file_abspath) == parse_log(file_abspath)
+        print('%10s %12s %16s' % ('parser', 'time (s)', 'peak mem (MB)'))
+        for name, func in [('read', parse_log_read), ('stream', parse_log)]:
+            elapsed, peak = bench(func, file_abspath)
+            print('%10s %12.2f %16.1f' % (name, elapsed, peak / 1024. ** 2))
+    finally:
+        rmtree(tmp_abspath)
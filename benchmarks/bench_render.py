@@ -0,0 +1,84 @@
+"""
+Benchmark of template rendering throughput
+
+Renders a multi-megabyte synthetic TRNSYS deck template for a large number
+of jobs, either with the precompiled render plan used by BPSJob.preprocess or
+by re-reading the template and building a string.Template for every job.
+
+"""
+
+import io
+import os
+import argparse
+import tempfile
+from shutil import rmtree
+from string import Template
+from time import time
+
+from pybps.template import get_render_plan
+
+
+def make_template(temp_abspath, size_mb, nparam):
+    """Write a synthetic deck template with nparam parameters spread over
+    size_mb megabytes of text"""
+
+    line = '* ' + 'x' * 70 + '\n'
+    nline = int(size_mb * 1024 ** 2 / len(line))
+    step = max(1, nline // nparam)
+    with open(temp_abspath, 'w') as f:
+        for i in range(nline):
+            if i % step == 0 and i // step < nparam:
+                f.write('PAR%03d = $PAR%03d\n' % (i // step, i // step))
+            else:
+                f.write(line)
+
+
+def bench_plan(proj_abspath, njob, nparam, write):
+    start_time = time()
+    plan = get_render_plan(proj_abspath, ['Model_Template.dck'], '_Template')
+    for jobID in range(njob):
+        values = dict(('PAR%03d' % i, jobID + i) for i in range(nparam))
+        if write:
+            plan.render(values, proj_abspath)
+        else:
+            for entry in plan.entries:
+                entry[2].render(values)
+    return time() - start_time
+
+
+def bench_legacy(proj_abspath, njob, nparam, write):
+    start_time = time()
+    temp_abspath = os.path.join(proj_abspath, 'Model_Template.dck')
+    for jobID in range(njob):
+        values = dict(('PAR%03d' % i, jobID + i) for i in range(nparam))
+        with io.open(temp_abspath, 'r', encoding='latin-1') as T:
+            temp = Template(T.read()).safe_substitute(values)
+        if write:
+            with io.open(os.path.join(proj_abspath, 'Model.dck'), 'w',
+                         encoding='latin-1') as sim_f:
+                sim_f.write(temp)
+    return time() - start_time
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Benchmark template rendering.')
+    parser.add_argument('--njob', default=10000, type=int, help='Number of jobs')
+    parser.add_argument('--size', default=2., type=float,
+                        help='Size of template file in MB')
+    parser.add_argument('--nparam', default=50, type=int,
+                        help='Number of parameters in template')
+    parser.add_argument('--write', action='store_true',
+                        help='Write rendered files to disk')
+    args = parser.parse_args()
+
+    tmp_abspath = tempfile.mkdtemp(prefix='pybps_bench_')
+    try:
+        make_template(os.path.join(tmp_abspath, 'Model_Template.dck'),
+                      args.size, args.nparam)
+        print('%10s %12s %12s' % ('engine', 'time (s)', 'jobs/s'))
+        for name, func in [('plan', bench_plan), ('legacy', bench_legacy)]:
+            elapsed = func(tmp_abspath, args.njob, args.nparam, args.write)
+            print('%10s %12.3f %12.1f' % (name, elapsed, args.njob / elapsed))
+    finally:
+        rmtree(tmp_abspath)
@@ -0,0 +1,79 @@
+"""
+Benchmark of results ingestion with BPSProject.results2df
+
+Generates synthetic TRNSYS Type 46 monthly result files for an increasing
+number of jobs and measures the time needed to build the results DataFrame.
+Time per file should remain roughly constant as the number of jobs grows,
+and should drop with the number of cores used for parsing (--ncore).
+
+"""
+
+import os
+import argparse
+import tempfile
+from shutil import rmtree
+from time import time
+
+from pybps import BPSProject
+
+
+MONTHS = ['January','February','March','April','May','June','July',
+          'August','September','October','November','December']
+
+
+def write_type46(file_abspath, nvar=8, seed=0):
+    """Write a synthetic Type 46 monthly integrated result file"""
+
+    with open(file_abspath, 'w') as f:
+        f.write(' TRNSYS - Type 46 synthetic output\n')
+        f.write('\t'.join(['Month'] + ['VAR%02d' % v for v in range(nvar)])
+                + '\t\n')
+        for i in range(34):
+            label = MONTHS[i] if i < 12 else 'Stat%02d' % i
+            values = ['%.4f' % (seed + i * 1.5 + v) for v in range(nvar)]
+            f.write('\t'.join([label] + values) + '\t\n')
+
+
+def make_results(resultsdir_abspath, seriesID, njob):
+    """Create one results sub-folder with a Type 46 file per job"""
+
+    for jobID in range(1, njob + 1):
+        jobdir = os.path.join(resultsdir_abspath,
+                              '%s_%05d' % (seriesID, jobID))
+        os.mkdir(jobdir)
+        write_type46(os.path.join(jobdir, 'Model.month'), seed=jobID)
+
+
+def bench(njob, ncore=1):
+    """Return time needed by results2df to ingest results from njob jobs"""
+
+    tmp_abspath = tempfile.mkdtemp(prefix='pybps_bench_')
+    try:
+        bps = BPSProject(seriesID='BENCH001')
+        bps.simtool = 'TRNSYS'
+        bps.config = {'resultfile_extensions': '.month'}
+        bps.resultsdir_abspath = tmp_abspath
+        make_results(tmp_abspath, bps.seriesID, njob)
+        start_time = time()
+        bps.results2df(ncore)
+        elapsed = time() - start_time
+        assert len(bps.results_df) == njob * 28
+    finally:
+        rmtree(tmp_abspath)
+
+    return elapsed
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Benchmark results2df.')
+    parser.add_argument('--sizes', default='100,1000,10000,50000',
+                        help='Comma separated list of job counts')
+    parser.add_argument('--ncore', default=1, type=int,
+                        help='Number of cores used to parse results')
+    args = parser.parse_args()
+
+    print('%10s %12s %16s' % ('jobs', 'time (s)', 'time/file (ms)'))
+    for njob in [int(n) for n in args.sizes.split(',')]:
+        elapsed = bench(njob, args.ncore)
+        print('%10d %12.3f %16.3f' % (njob, elapsed, 1000. * elapsed / njob))
@@ -0,0 +1,65 @@
+"""
+Micro-benchmark of TRNSYS Type 46 result file parsers
+
+Compares the row-by-row parser previously used by PyBPS (csv.DictReader and
+util.dict_cleanconvert on every row) with the vectorized columnar parser
+trnsys_post.parse_type46_columns, for files with an increasing number of
+variables.
+
+"""
+
+import os
+import csv
+import argparse
+import tempfile
+from shutil import rmtree
+from time import time
+
+from pybps.util import dict_cleanconvert
+from pybps.postprocess.trnsys import parse_type46_columns, TYPE46_SKIPROWS
+
+from bench_results2df import write_type46
+
+
+def parse_type46_rows(file_abspath):
+    """Row-by-row Type 46 parser (reference implementation)"""
+
+    with open(file_abspath, 'r') as out_f:
+        next(out_f)
+        dr = csv.DictReader(out_f, delimiter='\t')
+        fieldnames = dr.fieldnames
+        dict_list = [row for idx, row in enumerate(dr)
+                     if (any(row[fieldnames[0]].strip()) and
+                         idx not in TYPE46_SKIPROWS)]
+    return [dict_cleanconvert(row) for row in dict_list]
+
+
+def bench(func, file_abspath, nrep):
+    start_time = time()
+    for i in range(nrep):
+        func(file_abspath)
+    return (time() - start_time) / nrep
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Benchmark Type 46 parsers.')
+    parser.add_argument('--nvars', default='8,50,200,1000',
+                        help='Comma separated list of variable counts')
+    parser.add_argument('--nrep', default=200, type=int,
+                        help='Number of parsed files per measure')
+    args = parser.parse_args()
+
+    tmp_abspath = tempfile.mkdtemp(prefix='pybps_bench_')
+    try:
+        file_abspath = os.path.join(tmp_abspath, 'Model.month')
+        print('%8s %14s %14s %10s' % ('vars', 'rows (ms)', 'columns (ms)',
+                                      'speedup'))
+        for nvar in [int(n) for n in args.nvars.split(',')]:
+            write_type46(file_abspath, nvar=nvar)
+            t_rows = bench(parse_type46_rows, file_abspath, args.nrep)
+            t_cols = bench(parse_type46_columns, file_abspath, args.nrep)
+            print('%8d %14.3f %14.3f %10.1f' % (nvar, 1000 * t_rows,
+                                                 1000 * t_cols, t_rows / t_cols))
+    finally:
+        rmtree(tmp_abspath)
@@ -0,0 +1,88 @@
+"""
+Benchmark of job workspace preparation with BPSJob.prepare
+
+Creates a synthetic TRNSYS project holding a large weather file and building
+description, then measures per-job setup time and extra disk use of job
+folders with 'Workspace_Mode' set to 'copy' and to 'link'.
+
+"""
+
+import os
+import argparse
+import tempfile
+from shutil import rmtree
+from time import time
+
+from pybps import BPSProject
+
+
+def make_project(proj_abspath, size_mb, njob):
+    """Create a synthetic TRNSYS project with a template and a sample file"""
+
+    os.makedirs(proj_abspath)
+    with open(os.path.join(proj_abspath, 'Model_Template.dck'), 'w') as f:
+        f.write('VERSION 17\nCONSTANTS 1\nHEAT = $HEAT\nEND\n')
+    with open(os.path.join(proj_abspath, 'Model_Samples.csv'), 'w') as f:
+        f.write('HEAT\n' + ''.join('%d\n' % i for i in range(njob)))
+    with open(os.path.join(proj_abspath, 'Weather.tm2'), 'wb') as f:
+        f.write(os.urandom(int(size_mb * 1024 ** 2)))
+    with open(os.path.join(proj_abspath, 'Building.b17'), 'wb') as f:
+        f.write(os.urandom(512 * 1024))
+
+
+def disk_use(base_abspath, jobs_abspath):
+    """Return size in bytes of files in jobs folder that are not shared with
+    project folder (hardlinks and symlinks are not counted)"""
+
+    base_inodes = set()
+    for root, dirs, files in os.walk(base_abspath):
+        for name in files:
+            st = os.lstat(os.path.join(root, name))
+            base_inodes.add((st.st_dev, st.st_ino))
+    size = 0
+    for root, dirs, files in os.walk(jobs_abspath):
+        for name in files:
+            st = os.lstat(os.path.join(root, name))
+            if (os.path.islink(os.path.join(root, name)) or
+                    (st.st_dev, st.st_ino) in base_inodes):
+                continue
+            size += st.st_size
+
+    return size
+
+
+def bench(tmp_abspath, mode, njob):
+    """Prepare njob jobs in given workspace mode"""
+
+    bps = BPSProject(os.path.join(tmp_abspath, 'proj'), seriesID='BENCH' + mode[:3].upper())
+    bps.add_jobs()
+    start_time = time()
+    for job in bps.jobs:
+        job.config = dict(job.config, workspace_mode=mode)
+        job.prepare()
+    elapsed = time() - start_time
+    size = disk_use(bps.abspath, bps.jobsdir_abspath)
+    for job in bps.jobs:
+        rmtree(job.abspath, ignore_errors=True)
+
+    return elapsed, size
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Benchmark job workspaces.')
+    parser.add_argument('--njob', default=20, type=int, help='Number of jobs')
+    parser.add_argument('--size', default=100., type=float,
+                        help='Size of weather file in MB')
+    args = parser.parse_args()
+
+    tmp_abspath = tempfile.mkdtemp(prefix='pybps_bench_')
+    try:
+        make_project(os.path.join(tmp_abspath, 'proj'), args.size, args.njob)
+        print('%8s %18s %18s' % ('mode', 'setup/job (ms)', 'disk/job (MB)'))
+        for mode in ['copy', 'link']:
+            elapsed, size = bench(tmp_abspath, mode, args.njob)
+            print('%8s %18.2f %18.3f' % (mode, 1000. * elapsed / args.njob,
+                                         size / 1024. ** 2 / args.njob))
+    finally:
+        rmtree(tmp_abspath)
@@ -7,35 +7,70 @@ import os
 import argparse
 
 from pybps import BPSProject
+from pybps.events import ChromeTraceSink
+from pybps.executor import FileQueueExecutor, run_worker
 
 
 if __name__ == '__main__':
 
     parser = argparse.ArgumentParser(description='Run PyBPS parametric simulation manager.')
 
-    parser.add_argument('model_path', help='path to folder containing model')
+    parser.add_argument('model_path', nargs='?', help='path to folder containing model')
     parser.add_argument('--ncore', default=-1, type=int, help='Number of local cores used for parallel simulations (default: -1 to use all local cores)')
     parser.add_argument('--stopwatch', action='store_true', help='Enables stopwatch to return total simulation run time.')
+    parser.add_argument('--seriesID', default='random', help='ID of series of jobs (default: random ID)')
+    parser.add_argument('--resume', action='store_true', help='Skip jobs of given series already completed in a previous run.')
+    parser.add_argument('--parse-inline', action='store_true', help='Parse result files within each job and send them back with run summary.')
+    parser.add_argument('--timeout', default=None, type=float, help='Timeout of each simulation job in seconds (default: Job_Timeout in config.ini).')
+    parser.add_argument('--retries', default=None, type=int, help='Number of retries of failed or timed out jobs (default: Job_Retries in config.ini).')
+    parser.add_argument('--engine', default='pool', choices=['pool', 'asyncio'], help='Batch run engine (default: pool).')
+    parser.add_argument('--trace', default=None, help='Path to Chrome trace event file showing all jobs on a timeline.')
+    parser.add_argument('--queue', default=None, help='Path to shared work queue directory; jobs are run by worker daemons instead of local cores.')
+    parser.add_argument('--worker', default=None, metavar='QUEUE_DIR', help='Start a worker daemon running jobs found in given work queue directory. Jobs are unpickled and run as found, so only trusted users should be able to write to this directory.')
+    parser.add_argument('--heartbeat', default=10, type=float, help='Interval in seconds between heartbeats of worker daemon (default: 10).')
+    parser.add_argument('--lease-timeout', default=60, type=float, help='Time in seconds after which jobs of a silent worker are requeued (default: 60).')
+    parser.add_argument('--store', action='store_true', help='Also append jobs list, results and run summary to the columnar result store.')
+    parser.add_argument('--log-messages', default=None, type=int, help='Number of distinct TRNSYS log messages kept in run summary (default: Log_MaxMessages in config.ini).')
 
     args = parser.parse_args()
 
     print(args)
 
+    # Run as worker daemon until asked to stop
+    if args.worker:
+        run_worker(os.path.abspath(args.worker), heartbeat=args.heartbeat)
+        sys.exit(0)
+
+    if args.model_path is None:
+        parser.error('model_path is required unless --worker is given')
+
     model_path = os.path.abspath(args.model_path)
 
 	# Creatw new instance of BPSProject class to hold all of the info
 	# about simulation project
-    module = BPSProject(model_path)
+    module = BPSProject(model_path, seriesID=args.seriesID)
 
     # Add simulation jobs to BPSProject instance
-    module.add_jobs()
+    module.add_jobs(resume=args.resume)
+
+    # Record job lifecycle events in a trace file if requested
+    if args.trace:
+        module.add_sink(ChromeTraceSink(os.path.abspath(args.trace)))
+
+    # Dispatch jobs to worker daemons if a work queue is given
+    executor = None
+    if args.queue:
+        executor = FileQueueExecutor(os.path.abspath(args.queue),
+                                     lease_timeout=args.lease_timeout)
 
     # Run simulation jobs
-    module.run(args.ncore, args.stopwatch)
+    module.run(args.ncore, args.stopwatch, parse_inline=args.parse_inline,
+               log_messages=args.log_messages, timeout=args.timeout,
+               retries=args.retries, engine=args.engine, executor=executor)
 
     # Get jobs list, results and run summary into pandas DataFrames
     module.jobs2df()
-    module.results2df()
+    module.results2df(args.ncore)
     module.runsum2df()
 
     # Save jobs list, results and run summary DataFrames into sqlite database
@@ -47,8 +82,17 @@ if __name__ == '__main__':
     # Save jobs list, results and run summary DataFrames into pickled files
     module.save2pkl()
 
+    # Append jobs list, results and run summary DataFrames to result store
+    if args.store:
+        module.save2store()
+
+    for sink in module.sinks:
+        sink.close()
+
     print("\nResults saved to following output files, located in '_pybps_results' directory:")
     print("- " + module.db_name)
     print("- " + module.jobs_fname + ".csv/.pkl")
     print("- " + module.results_fname + ".csv/.pkl")
     print("- " + module.runsum_fname + ".csv/.pkl")
+    if args.store:
+        print("- " + module.store_name + " directory")
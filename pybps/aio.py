@@ -0,0 +1,184 @@
+"""
+Asyncio engine running simulation jobs from a single process
+
+Simulation tool processes are launched directly by an asyncio event loop,
+with a semaphore limiting the number of simulations run at a time. Job
+folders are prepared, rendered and closed in a small thread pool. Simulation
+tool processes are waited for in another pool of ncore threads, so that
+their resource usage is measured as by the multiprocessing pool engine. Unlike the
+multiprocessing pool engine, jobs are never pickled and no Python worker
+process is started. Requires Python 3.
+"""
+
+# Common imports
+import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from copy import deepcopy
+from subprocess import DEVNULL, STDOUT, CalledProcessError, Popen
+from time import time
+
+# Custom imports
+from pybps import util
+
+
+def run_jobs(jobs, ncore, callback, run_mode='silent', debug=False,
+             retries=0, nthread=None):
+    """Run simulation jobs with an asyncio event loop
+
+    Args:
+        jobs: list of jobs to be run (run in list order)
+        ncore: maximum number of simulation tool processes run at a time
+        callback: function called with the run summary dict of each job as
+            soon as it ends (called from the current thread)
+        run_mode: 'silent', 'nostop' or 'normal' (see BPSProject.run)
+        debug: if True, standard output of simulation tool is not captured
+        retries: number of times a job that failed or timed out is run again
+        nthread: number of threads used to prepare and close jobs. By
+            default, min(ncore, 4) threads are used
+
+    """
+
+    nthread = nthread or max(1, min(ncore, 4))
+    if os.name == 'nt':
+        # Subprocesses are only supported by proactor event loop on Windows
+        loop = asyncio.ProactorEventLoop()
+    else:
+        loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    executor = ThreadPoolExecutor(nthread)
+    waiter = ThreadPoolExecutor(ncore)
+    try:
+        loop.run_until_complete(_run_all(jobs, ncore, callback, run_mode,
+                                         debug, retries, nthread, executor,
+                                         waiter))
+    finally:
+        executor.shutdown()
+        waiter.shutdown()
+        asyncio.set_event_loop(None)
+        loop.close()
+
+
+async def _run_all(jobs, ncore, callback, run_mode, debug, retries, nthread,
+                   executor, waiter):
+    """Run all jobs with a fixed number of worker coroutines"""
+
+    sim_slots = asyncio.Semaphore(ncore)
+    queue = iter(jobs)
+
+    async def worker(slot):
+        for job in queue:
+            # Events of jobs run by this coroutine are emitted with its slot
+            job.slot = slot
+            attempt_job = job
+            failures = 0
+            while True:
+                runsumdict = await _run_job(attempt_job, sim_slots, executor,
+                                            waiter, run_mode, debug)
+                if (runsumdict.get('Status') not in ('failed', 'timeout') or
+                        failures >= retries):
+                    break
+                failures += 1
+                print("Job %s %s, retrying (%d/%d) ..." % (job.jobID,
+                    runsumdict['Status'], failures, retries))
+                # Later attempts are run in their own folder
+                attempt_job = deepcopy(job)
+                attempt_job.set_attempt(failures + 1)
+            callback(runsumdict)
+
+    # A few more jobs than simulation slots are in progress, so that next
+    # jobs are prepared while simulations are running
+    await asyncio.gather(*[worker(i) for i in range(ncore + nthread)])
+
+
+async def _run_job(job, sim_slots, executor, waiter, run_mode, debug):
+    """Prepare, Preprocess, Run and Close a BPSJob (see core.run_job)"""
+
+    loop = asyncio.get_event_loop()
+    print("Running simulation job %s ..." % job.jobID)
+    # Measure wall-clock time of each phase of the job
+    phasetimes = []
+    try:
+        start_time = time()
+        await loop.run_in_executor(executor, job.prepare)
+        phasetimes.append(('PrepareTime(sec)', time() - start_time))
+        start_time = time()
+        await loop.run_in_executor(executor, job.preprocess)
+        phasetimes.append(('PreprocessTime(sec)', time() - start_time))
+        start_time = time()
+        # Only run simulation if results could not be restored from cache
+        if not await loop.run_in_executor(executor, job.restore_results):
+            async with sim_slots:
+                await _run_simulation(job, waiter, run_mode, debug)
+            await loop.run_in_executor(executor, job.store_results)
+        phasetimes.append(('RunTime(sec)', time() - start_time))
+        start_time = time()
+        await loop.run_in_executor(executor, job.close)
+    except Exception as e:
+        return job.abort(e, phasetimes=phasetimes, phase_start=start_time)
+    # Time spent parsing files is reported separately by the job
+    phasetimes.append(('CloseTime(sec)',
+                       time() - start_time - job.parsetime))
+    for (name, phasetime) in phasetimes:
+        job.runsumdict[name] = round(phasetime, 3)
+    if job.events:
+        job.runsumdict['Events'] = job.events
+
+    return job.runsumdict
+
+
+async def _run_simulation(job, waiter, run_mode, debug):
+    """Run simulation tool process(es) of a job, one after the other
+
+    Job timeout applies to all processes of the job, as a whole.
+
+    Raises:
+        CommandTimeout: simulation tool was killed after job timeout.
+        CalledProcessError: simulation tool returned a non-zero exit status.
+    """
+
+    loop = asyncio.get_event_loop()
+    cmds = job.get_cmds(run_mode)
+    kwargs = {}
+    if debug == False:
+        kwargs['stdout'] = DEVNULL
+        kwargs['stderr'] = STDOUT
+    # Run simulation tool in a new process group, so that it can be killed
+    # along with all of its sub-processes
+    if os.name == 'posix':
+        kwargs['start_new_session'] = True
+    tracing = job.tracing()
+    start_time = time()
+    if tracing:
+        job.emit({'name': 'run', 'when': 'before', 'time': start_time})
+    # Resource usage of all processes of the job
+    job.usage = {}
+    try:
+        for cmd in cmds:
+            timeout = None
+            if job.timeout:
+                timeout = job.timeout - (time() - start_time)
+                if timeout <= 0:
+                    raise util.CommandTimeout(cmd, job.timeout)
+            proc = Popen(cmd, **kwargs)
+            wait = loop.run_in_executor(waiter, util.wait_usage, proc)
+            done, pending = await asyncio.wait([wait], timeout=timeout)
+            if pending:
+                util.kill_tree(proc.pid)
+                await wait
+                raise util.CommandTimeout(cmd, job.timeout)
+            usage = wait.result()
+            if usage:
+                job.usage = {
+                    'cpu': job.usage.get('cpu', 0) + usage.get('cpu', 0),
+                    'maxrss': max(job.usage.get('maxrss', 0),
+                                  usage.get('maxrss', 0))}
+            if proc.returncode:
+                raise CalledProcessError(proc.returncode, cmd)
+    finally:
+        end_time = time()
+        job.simtime = round(end_time - start_time, 3)
+        if tracing:
+            job.emit({'name': 'run', 'when': 'after', 'time': end_time,
+                      'start': start_time, 'duration': end_time - start_time,
+                      'bytes': None})
@@ -0,0 +1,419 @@
+"""
+Content-addressed cache of simulation result files
+"""
+
+# Common imports
+import os
+import sys
+import errno
+import hashlib
+import threading
+from shutil import copy2, rmtree
+from time import time, sleep
+
+# Custom imports
+from pybps import util
+
+
+def hash_files(file_abspathlist, base_abspath, extra=()):
+    """Compute a hash key from the content of a list of files.
+
+    Args:
+        file_abspathlist: list of absolute paths to files to be hashed.
+        base_abspath: absolute path to base directory. File paths relative
+            to this directory are included in the hash.
+        extra: list of additional strings to be included in the hash
+            (for example the path to the simulation tool executable).
+
+    Returns:
+        Hash key as an hexadecimal string.
+    """
+
+    h = hashlib.sha1()
+    for s in extra:
+        h.update(str(s).encode('utf-8'))
+        h.update(b'\0')
+    relpaths = sorted(set(os.path.relpath(f, base_abspath)
+                          for f in file_abspathlist))
+    for relpath in relpaths:
+        h.update(relpath.replace(os.sep, '/').encode('utf-8'))
+        h.update(b'\0')
+        with open(os.path.join(base_abspath, relpath), 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+        h.update(b'\0')
+
+    return h.hexdigest()
+
+
+# Name of file recording the size of a cache entry
+SIZE_FILE = '.pybps_size'
+
+
+class ResultCache(object):
+    """Class that stores simulation result and log files in a directory,
+    with one sub-folder per hash key, and evicts least recently used entries
+    when the cache grows over its maximum size
+
+    The size of each entry is recorded in the entry when it is stored. Each
+    process keeps an estimate of the cache size, increased by the entries it
+    stores, and only scans the cache directory when this estimate goes over
+    the maximum size or every 'scan_interval' stores (to account for entries
+    stored by other processes).
+
+    """
+
+    # Number of stores between scans of cache directory
+    scan_interval = 100
+    # Fraction of maximum size down to which entries are evicted, so that
+    # a full cache is not scanned at every store
+    low_water = 0.9
+
+    def __init__(self, cache_abspath, max_size):
+        """Initialization of ResultCache Class
+
+        Args:
+            cache_abspath: absolute path to cache directory
+            max_size: maximum size of cache in bytes
+
+        """
+
+        self.abspath = cache_abspath
+        self.max_size = max_size
+        self.size = None
+        self.nstore = 0
+        util.tmp_dir('create', self.abspath)
+
+
+    def restore(self, key, dst_abspath):
+        """Copy files cached under key to destination folder
+
+        Args:
+            key: hash key of cache entry
+            dst_abspath: absolute path to destination folder
+
+        Returns:
+            True if cache entry was found and restored, False otherwise
+
+        """
+
+        entry_abspath = os.path.join(self.abspath, key)
+        if not os.path.isdir(entry_abspath):
+            return False
+        try:
+            for root, dirs, files in os.walk(entry_abspath):
+                for name in files:
+                    if root == entry_abspath and name == SIZE_FILE:
+                        continue
+                    src = os.path.join(root, name)
+                    dst = os.path.join(dst_abspath,
+                                       os.path.relpath(src, entry_abspath))
+                    if not os.path.isdir(os.path.dirname(dst)):
+                        os.makedirs(os.path.dirname(dst))
+                    copy2(src, dst)
+            # Mark entry as recently used
+            os.utime(entry_abspath, None)
+        except (IOError, OSError):
+            # Entry was evicted while being restored
+            return False
+
+        return True
+
+
+    def store(self, key, file_abspathlist, base_abspath):
+        """Store files in cache under key
+
+        Files are first copied to a temporary folder, which is then renamed,
+        so that concurrent jobs never see incomplete cache entries.
+
+        Args:
+            key: hash key of cache entry
+            file_abspathlist: list of absolute paths to files to be cached
+            base_abspath: absolute path to base directory. File paths relative
+                to this directory are kept in cache entry.
+
+        """
+
+        entry_abspath = os.path.join(self.abspath, key)
+        if os.path.isdir(entry_abspath):
+            return
+        tmp_abspath = os.path.join(self.abspath,
+                                   '.tmp_' + key + '_' + util.random_str(6))
+        size = 0
+        try:
+            for src in file_abspathlist:
+                dst = os.path.join(tmp_abspath,
+                                   os.path.relpath(src, base_abspath))
+                if not os.path.isdir(os.path.dirname(dst)):
+                    os.makedirs(os.path.dirname(dst))
+                copy2(src, dst)
+                size += os.path.getsize(dst)
+            with open(os.path.join(tmp_abspath, SIZE_FILE), 'w') as f:
+                f.write(str(size))
+            os.rename(tmp_abspath, entry_abspath)
+        except (IOError, OSError):
+            # Entry was stored in the meantime by another job
+            util.tmp_dir('remove', tmp_abspath)
+            return
+
+        self.nstore += 1
+        if self.size is not None:
+            self.size += size
+        if self.size is None or self.size > self.max_size or \
+                self.nstore % self.scan_interval == 0:
+            self.evict()
+
+
+    def evict(self):
+        """Remove least recently used entries if cache size is over its
+        maximum size, until it is below a fraction 'low_water' of it"""
+
+        self.size = evict_lru(self.abspath, self.max_size, self.low_water)
+
+
+
+def evict_lru(cache_abspath, max_size, low_water):
+    """Remove least recently used entries of a cache directory if their size
+    is over max_size, until it is below a fraction low_water of max_size
+
+    Entries being stored ('.tmp_' folders) and locks ('.lock' folders) are
+    left alone.
+
+    Returns:
+        Size in bytes of entries left in cache
+
+    """
+
+    entries = []
+    total_size = 0
+    for key in os.listdir(cache_abspath):
+        entry_abspath = os.path.join(cache_abspath, key)
+        if ('.tmp_' in key or key.endswith('.lock') or
+                not os.path.isdir(entry_abspath)):
+            continue
+        try:
+            size = entry_size(entry_abspath)
+            entries.append((os.path.getmtime(entry_abspath), size,
+                            entry_abspath))
+        except OSError:
+            continue
+        total_size += size
+
+    if total_size <= max_size:
+        return total_size
+    for (mtime, size, entry_abspath) in sorted(entries):
+        if total_size <= max_size * low_water:
+            break
+        try:
+            rmtree(entry_abspath)
+        except OSError:
+            print("Exception: ", str(sys.exc_info()))
+        total_size -= size
+
+    return total_size
+
+
+
+def entry_size(entry_abspath):
+    """Get size in bytes of files of a cache entry, as recorded when the
+    entry was stored (entries stored by older versions are walked)"""
+
+    try:
+        with open(os.path.join(entry_abspath, SIZE_FILE)) as f:
+            return int(f.read())
+    except (IOError, OSError, ValueError):
+        size = 0
+        for root, dirs, files in os.walk(entry_abspath):
+            for name in files:
+                size += os.path.getsize(os.path.join(root, name))
+        return size
+
+
+
+class StageCache(object):
+    """Class that caches the files produced by a stage of a simulation
+    pipeline (for example TRNBUILD matrices or DAYSIM daylight
+    coefficients), so that the stage runs once per distinct input even when
+    many jobs need it at the same time.
+
+    The first job needing an entry takes a lock (atomic creation of a
+    '.lock' folder), runs the stage and stores the files it created or
+    modified in its work directory. The lock is touched at regular intervals
+    while the stage runs, so that it is only considered left by a dead
+    process once it has not been touched for 'lock_timeout' seconds. Other
+    jobs needing the same entry wait for it and copy cached files to their
+    own work directory (files are not hardlinked, since a job writing to a
+    linked file would corrupt the cache entry).
+
+    If a maximum size is given, least recently used entries are evicted
+    once an entry is stored and cache grows over it (see 'evict_lru').
+
+    """
+
+    def __init__(self, cache_abspath, lock_timeout=3600, max_size=None):
+        """Initialization of StageCache Class
+
+        Args:
+            cache_abspath: absolute path to cache directory
+            lock_timeout: time in seconds after which a lock that was not
+                touched is considered left by a dead process and removed
+            max_size: maximum size of cache in bytes (no limit if None)
+
+        """
+
+        self.abspath = cache_abspath
+        self.lock_timeout = lock_timeout
+        self.max_size = max_size
+        util.tmp_dir('create', self.abspath)
+
+
+    def run(self, key, work_abspath, stage):
+        """Restore files of a stage from cache, or run stage and store them
+
+        Args:
+            key: hash key of stage inputs
+            work_abspath: absolute path to directory where stage writes its
+                files (usually job folder)
+            stage: function running stage (called with no argument)
+
+        Returns:
+            True if files were restored from cache, False if stage was run
+
+        """
+
+        entry_abspath = os.path.join(self.abspath, key)
+        lock_abspath = entry_abspath + '.lock'
+
+        while True:
+            if self.restore(entry_abspath, work_abspath):
+                return True
+            try:
+                os.mkdir(lock_abspath)
+            except OSError:
+                # Another job is running stage
+                try:
+                    if (time() - os.path.getmtime(lock_abspath) >
+                            self.lock_timeout):
+                        os.rmdir(lock_abspath)
+                except OSError:
+                    pass
+                sleep(0.2)
+                continue
+            # Show other jobs that lock holder is alive while stage runs
+            stop = threading.Event()
+            heartbeat = threading.Thread(target=touch_lock,
+                args=(lock_abspath, stop, self.lock_timeout / 4.))
+            heartbeat.daemon = True
+            heartbeat.start()
+            try:
+                # Entry may have been stored while lock was being taken
+                if self.restore(entry_abspath, work_abspath):
+                    return True
+                before = tree_state(work_abspath)
+                stage()
+                after = tree_state(work_abspath)
+                self.store(entry_abspath, [os.path.join(work_abspath, relpath)
+                    for relpath in after if before.get(relpath) != after[relpath]],
+                    work_abspath)
+            finally:
+                stop.set()
+                heartbeat.join()
+                try:
+                    os.rmdir(lock_abspath)
+                except OSError as e:
+                    # Lock was removed by a job that considered it stale
+                    if e.errno != errno.ENOENT:
+                        raise
+            return False
+
+
+    def store(self, entry_abspath, file_abspathlist, base_abspath):
+        """Copy files produced by stage to a cache entry
+
+        Files are first copied to a temporary folder, which is then renamed,
+        so that other jobs never see incomplete entries.
+
+        """
+
+        tmp_abspath = entry_abspath + '.tmp_' + util.random_str(6)
+        size = 0
+        try:
+            for src in file_abspathlist:
+                dst = os.path.join(tmp_abspath,
+                                   os.path.relpath(src, base_abspath))
+                if not os.path.isdir(os.path.dirname(dst)):
+                    os.makedirs(os.path.dirname(dst))
+                copy2(src, dst)
+                size += os.path.getsize(dst)
+            if not os.path.isdir(tmp_abspath):
+                # Stage produced no file
+                os.mkdir(tmp_abspath)
+            with open(os.path.join(tmp_abspath, SIZE_FILE), 'w') as f:
+                f.write(str(size))
+            os.rename(tmp_abspath, entry_abspath)
+        except (IOError, OSError):
+            util.tmp_dir('remove', tmp_abspath)
+            return
+
+        if self.max_size is not None:
+            evict_lru(self.abspath, self.max_size, ResultCache.low_water)
+
+
+    def restore(self, entry_abspath, dst_abspath):
+        """Copy files of a cache entry to a work directory
+
+        Returns:
+            True if entry was found and restored, False otherwise
+
+        """
+
+        if not os.path.isdir(entry_abspath):
+            return False
+        try:
+            for root, dirs, files in os.walk(entry_abspath):
+                for name in files:
+                    if root == entry_abspath and name == SIZE_FILE:
+                        continue
+                    src = os.path.join(root, name)
+                    dst = os.path.join(dst_abspath,
+                                       os.path.relpath(src, entry_abspath))
+                    if os.path.lexists(dst):
+                        os.remove(dst)
+                    elif not os.path.isdir(os.path.dirname(dst)):
+                        os.makedirs(os.path.dirname(dst))
+                    copy2(src, dst)
+            # Mark entry as recently used
+            os.utime(entry_abspath, None)
+        except (IOError, OSError):
+            # Entry was evicted while being restored
+            return False
+
+        return True
+
+
+
+def touch_lock(lock_abspath, stop, interval):
+    """Update modification time of a lock folder every 'interval' seconds,
+    until 'stop' event is set"""
+
+    while not stop.wait(interval):
+        try:
+            os.utime(lock_abspath, None)
+        except OSError:
+            pass
+
+
+
+def tree_state(dir_abspath):
+    """Get (modification time, size) of each file of a directory tree, with
+    relative file path as key"""
+
+    state = {}
+    for root, dirs, files in os.walk(dir_abspath):
+        for name in files:
+            f_abspath = os.path.join(root, name)
+            st = os.stat(f_abspath)
+            state[os.path.relpath(f_abspath, dir_abspath)] = (st.st_mtime,
+                                                               st.st_size)
+
+    return state
@@ -6,20 +6,30 @@ Core classes and functions of the pybps package
 import os
 import sys
 import re
-import sqlite3
+import socket
 from copy import deepcopy
+from collections import deque
+from math import ceil
 from multiprocessing import Pool, cpu_count, freeze_support
 from time import time, sleep
 from random import uniform
 from shutil import copy, copytree
-from string import Template
 
 # Third-party imports
+import numpy as np
 import pandas as pd
-from pandas.io import sql
 
 # Custom imports
 from pybps import util
+from pybps.ledger import JobLedger
+from pybps.cache import ResultCache, hash_files
+from pybps.template import get_render_plan
+from pybps import schedule as sched
+from pybps.events import traced, tree_size
+from pybps.executor import PoolExecutor
+from pybps.jobs import Sample, JobList
+from pybps.store import ResultStore
+from pybps import db
 import pybps.preprocess.trnsys as trnsys_pre
 import pybps.preprocess.daysim as daysim_pre
 import pybps.postprocess.trnsys as trnsys_post
@@ -46,15 +56,77 @@ def run_job(job):
     """
 
     print("Running simulation job %s ..." % job.jobID)
-    job.prepare()
-    job.preprocess()
-    job.run()
-    job.close()
+    # Measure wall-clock time of each phase of the job
+    phasetimes = []
+    # Failed or timed out jobs are reported in run summary, so that
+    # they can be retried by the main process
+    try:
+        start_time = time()
+        job.prepare()
+        phasetimes.append(('PrepareTime(sec)', time() - start_time))
+        start_time = time()
+        job.preprocess()
+        phasetimes.append(('PreprocessTime(sec)', time() - start_time))
+        start_time = time()
+        # Only run simulation if results could not be restored from cache
+        if not job.restore_results():
+            job.run()
+            job.store_results()
+        phasetimes.append(('RunTime(sec)', time() - start_time))
+        start_time = time()
+        job.close()
+    except Exception as e:
+        return job.abort(e, phasetimes=phasetimes, phase_start=start_time)
+    # Time spent parsing files is reported separately by the job
+    phasetimes.append(('CloseTime(sec)',
+                       time() - start_time - job.parsetime))
+    for (name, phasetime) in phasetimes:
+        job.runsumdict[name] = round(phasetime, 3)
+    # Send events collected by job back to main process
+    if job.events:
+        job.runsumdict['Events'] = job.events
 
     return job.runsumdict
 
 
 
+def parse_results(task):
+    """Parse all result files of a simulation job
+    This function is called by the multiprocessing.pool.imap method when
+    results are post-processed in parallel.
+
+    Args:
+        task: (simtool, file_abspathlist) tuple, where file_abspathlist is the
+            list of paths to result files of a single job
+
+    Returns:
+        list of batches of results (one batch per parsed result file). A batch
+        is either a list of dicts (one dict per row) or a dict of columns
+
+    """
+
+    simtool, file_abspathlist = task
+    batches = []
+
+    if simtool == 'TRNSYS':
+        for file_abspath in file_abspathlist:
+            batches.append(trnsys_post.parse_type46_columns(file_abspath))
+    elif simtool == 'DAYSIM':
+        da_abspathlist = []
+        for file_abspath in file_abspathlist:
+            if file_abspath.endswith('.htm'):
+                batches.append(daysim_post.parse_el_lighting(file_abspath))
+            elif file_abspath.lower().endswith('.da'):
+                da_abspathlist.append(file_abspath)
+        # DA files of a same job are merged (one metric per file)
+        if da_abspathlist:
+            batches.append(
+                daysim_post.parse_da_grid(da_abspathlist).to_columns())
+
+    return [batch for batch in batches if len(batch)]
+
+
+
 def sort_key_dfcolnames(x):
     """Sort key function for list of pandas DataFrame column names.
     Used to put 'JobID' column first in pandas DataFrame"""
@@ -107,16 +179,61 @@ class BPSProject(object):
         self._batch = False
         # Simulation run time
         self.simtime = 0
+        # Resource usage (CPU time and peak memory) of simulation tool
+        self.usage = {}
         # Relative path to model file to be used in current run
         self.model_relpath = None
-        # List of jobs to be run
+        # List of jobs to be run (JobList, see pybps.jobs)
         self.jobs = []
         # List of dicts containing run summaries for all jobs
         self.runsummary = []
+        # If True, jobs parse their own result files before their temporary
+        # folder is deleted and send parsed results back with run summary
+        self.parse_inline = False
+        # Dict of results parsed inline by jobs, with JobID as key and
+        # list of batches (one per result file) as value
+        self.inline_results = {}
+        # If True, jobs already completed in a previous run of the same
+        # series are not run again
+        self.resume = False
+        # List of IDs of jobs skipped because already completed
+        self.skipped_jobIDs = []
+        # Name of job ledger table in results database
+        self.ledger_table = 'JobLedger'
+        # Cache of simulation results (None if cache is not used)
+        self.cache = None
+        # Maximum number of distinct log messages kept in run summaries
+        self.log_messages = 0
+        # If True, jobs run tool-specific preprocessing (see 'preprocess')
+        self.pretool = False
+        # Dict of expected job run times, with JobID as key
+        self.expected_runtimes = {}
+        # Achieved run time of last batch run and its lower bound
+        self.makespan = None
+        self.makespan_bound = None
+        # Event sinks receiving events of traced methods (see pybps.events)
+        self.sinks = []
+        # If True, events are collected in 'events' list (used by jobs run
+        # in worker processes, which send them back with their run summary)
+        self.collect_events = False
+        self.events = []
+        # Number of bytes processed by last traced method call
+        self.event_bytes = None
         # Absolute path to base directory for jobs
         self.jobsdir_abspath = None
+        # Wall-clock timeout of simulation tool process, in seconds
+        self.timeout = None
+        # File where ID of simulation tool process is written (jobs only)
+        self.pid_abspath = None
+        # If True, DAYSIM pipeline is run stage by stage, with daylight
+        # coefficients computed in 'preprocess' (jobs only)
+        self.staged = False
         # Absolute path to jobs results directory
         self.resultsdir_abspath = None
+        # Index of files in project directory
+        self.index = None
+        # Index of files in jobs results directory
+        self.results_index = None
         # Name of results database
         self.db_name = 'SimResults.db'
         # Name of jobs csv/pkl file
@@ -125,6 +242,8 @@ class BPSProject(object):
         self.results_fname = 'SimResults'
         # Name of run summary csv/pkl file
         self.runsum_fname = 'RunSummary'
+        # Name of columnar result store directory
+        self.store_name = 'ResultStore'
         # List of relative paths to template simulation files
         self.temp_relpaths = []
         # List of parameters found in template files
@@ -133,8 +252,9 @@ class BPSProject(object):
         self.samp_relpath = None
         # List of parameters found in sample file
         self.samp_params = []
-        # Raw sample extracted from csv file. It's a list of dicts with
-        # each dict holding all parameter for a particular job
+        # Raw sample extracted from csv file. It's a sequence of dicts with
+        # each dict holding all parameter for a particular job (Sample
+        # instance storing values column-wise, or list of dicts)
         self.sample = []
         # Pandas DataFrame for jobs list
         self.jobs_df = None
@@ -183,7 +303,9 @@ class BPSProject(object):
         if src == 'samplefile':
 		    # Get information needed to find jobs file in folder
             samp_sstr = self.config['samplefile_searchstring']
-            samp_abspathlist = util.get_file_paths([samp_sstr], self.abspath)
+            if self.index is None:
+                self.index = util.DirIndex(self.abspath)
+            samp_abspathlist = self.index.find([samp_sstr])
 
             # Check if there is no more than 1 sample file in directory
             if len(samp_abspathlist) > 0:
@@ -199,14 +321,12 @@ class BPSProject(object):
                     print("You selected %s" % self.samp_relpath)
                 else:
                     self.samp_relpath = samp_relpathlist[0]
-                # Build list of dicts with parameter values for all job runs
+                # Read parameter values for all job runs, column-wise, with
+                # model and sample file names as parameters
                 samp_abspath = os.path.join(self.abspath, self.samp_relpath)
-                sample_data = pd.read_csv(samp_abspath)
-                self.sample = list(sample_data.transpose().to_dict().values())
-                # Add model and sample file names as parameters
-                for s in self.sample:
-                    s['ModelFile'] = self.model_relpath
-                    s['SampleFile'] = self.samp_relpath
+                self.sample = Sample.read_csv(samp_abspath,
+                    {'ModelFile': self.model_relpath,
+                     'SampleFile': self.samp_relpath})
             else:
                 sys.stderr.write("Could not find any sample file in " +
                     "project directory\nPlease put a \'" + samp_sstr +
@@ -232,25 +352,16 @@ class BPSProject(object):
         if src == 'sample':
             self.samp_params = sorted(self.sample[0].keys())
         elif src == 'tempfile':
-            pattern = re.compile(r'%(.*?)%')
-            self.temp_params = []
-            for temp_relpath in self.temp_relpaths:
-                # Open jobs file
-                temp_abspath = os.path.join(self.abspath, temp_relpath)
-                with open(temp_abspath, 'rU') as tmp_f:
-                    # Read the entire file and store it in a temporary variable
-                    temp = tmp_f.read()
-                    # Build a list of all paramaters found in file
-                    # Parameters are identified as strings surrounded by '%'
-                    self.temp_params.extend(pattern.findall(temp))
-            # Remove duplicates, then sort list
-            self.temp_params = list(set(self.temp_params))
-            self.temp_params.sort()
+            # Parameters are identified as strings with a leading '$' sign
+            # by the same tokenizer that renders templates in jobs
+            plan = get_render_plan(self.abspath, self.temp_relpaths,
+                                   self.config['templatefile_searchstring'])
+            self.temp_params = list(plan.params)
         else:
             print("Unrecognized argument.")
 
 
-    def add_jobs(self):
+    def add_jobs(self, resume=False):
         """Add simulation jobs to BPSProject
 
         Simulation jobs are created and added to BPSProject only when this
@@ -259,10 +370,16 @@ class BPSProject(object):
         class is initialized if a sample file is found in project directory)
         prior to creating and adding jobs to the BPSProject. This can come in
         handy is the variables in your sample differ from the parameters you
-        need for your model.
+        need for your model. The sample may be replaced by a list of dicts,
+        or by a pandas DataFrame wrapped with 'pybps.jobs.Sample.from_df'.
+
+        Jobs are stored as sample row indices (see pybps.jobs.JobList) and
+        BPSJob instances are only created when jobs are run.
 
         Args:
-            No args
+            resume: if True, jobs of current series that were already
+                completed in a previous run (see 'get_completed' method)
+                will be skipped by the 'run' method
 
         Returns:
             Warning messages if sample parameters don't match parameters found
@@ -285,24 +402,71 @@ class BPSProject(object):
             # Get list of all parameters found in template files
             self.get_parameterlist('tempfile')
             self.get_parameterlist('sample')
-            if self.valid_check == True:
-                # Check if template files and jobs file contain the same list
-                # of parameters. Raise an error if not
-                if set(self.temp_params).issubset(self.samp_params):
-                    for jobID in range(self.startJobID, self.startJobID + njob):
-                        self.jobs.append(BPSJob(self, jobID))
-                    print("\n%d jobs added to BPSProject instance" % njob)
-                else:
-                    print("\nMismatch between template and sample file" +
-                        " parameters!\nNo jobs added to BPSproject instance")
+            # Check if template files and jobs file contain the same list
+            # of parameters. Raise an error if not
+            if (self.valid_check == True and
+                    not set(self.temp_params).issubset(self.samp_params)):
+                print("\nMismatch between template and sample file" +
+                    " parameters!\nNo jobs added to BPSproject instance")
             else:
-                for jobID in (self.startJobID, self.startJobID + njob):
-                    self.jobs.append(BPSJob(self, jobID))
+                self.jobs = JobList(self, np.arange(njob), BPSJob)
                 print("\n%d jobs added to BPSProject instance" % njob)
+            self.resume = resume
+            if self.resume and self.jobs:
+                print("%d jobs already completed in previous runs" %
+                    len(self.get_completed()))
         else:
             print("\nBPS project not a batch run. Jobs can't be added")
 
 
+    def get_cache_maxsize(self):
+        """Get maximum size in bytes of result and stage caches, from
+        'ResultCache_MaxSize' (in MB, see config.ini)"""
+
+        return int(float(self.config.get('resultcache_maxsize', 1024)) *
+                   1024 ** 2)
+
+
+    def get_completed(self):
+        """Get run summaries of jobs already completed in previous runs
+
+        A job is considered completed if the job ledger holds a run summary
+        with 'ok' status for it (see pybps.ledger.get_status) and if its
+        results folder contains result files.
+
+        Returns:
+            dict with JobID as key and run summary dict as value
+
+        """
+
+        db_abspath = os.path.join(self.resultsdir_abspath, self.db_name)
+        if not os.path.exists(db_abspath):
+            return {}
+        ledger = JobLedger(db_abspath, self.ledger_table)
+        runsumdicts = ledger.completed(self.seriesID)
+        ledger.close()
+
+        # Only keep jobs with valid result files in results folder
+        results_ext = self.config['resultfile_extensions'].split(',')
+        index = self.get_results_index()
+        for jobID in list(runsumdicts):
+            if not index.find(results_ext, subdir=jobID):
+                del runsumdicts[jobID]
+
+        return runsumdicts
+
+
+    def get_results_index(self):
+        """Return index of files in jobs results directory, creating it if
+        needed. The index is invalidated after each batch run"""
+
+        if (self.results_index is None or
+                self.results_index.dir != self.resultsdir_abspath):
+            self.results_index = util.DirIndex(self.resultsdir_abspath)
+
+        return self.results_index
+
+
     def check(self):
         """Check for simulation files in project directory
 
@@ -331,6 +495,9 @@ class BPSProject(object):
         conf.read(conf_file)
         sections = conf.sections()
 
+        # Index project directory once for all file searches
+        self.index = util.DirIndex(self.abspath)
+
         # Detect simulation tool used for current simulation job and check if
         # basic simulation input files are there
         found = 0 # Variable to store whether a simulation project was found
@@ -341,7 +508,7 @@ class BPSProject(object):
             model_ext = model_ext.split(',')
             tmp_sstr = conf.get(section, 'TemplateFile_SearchString')
 	        # Check if we can find a model file for the selected simtool
-            model_abspathlist = util.get_file_paths(model_ext, self.abspath)
+            model_abspathlist = self.index.find(model_ext)
             if model_abspathlist:
                 model_relpathlist = [os.path.relpath(fname, self.abspath)
                                         for fname in model_abspathlist]
@@ -399,7 +566,7 @@ class BPSProject(object):
 		# Once we have found a simulation project and stored config info,
         # let's see if we can find a template file for this project
         tmpfile_sstr = self.config['templatefile_searchstring']
-        temp_abspathlist = util.get_file_paths([tmpfile_sstr], self.abspath)
+        temp_abspathlist = self.index.find([tmpfile_sstr])
 
         if temp_abspathlist:
             self._batch = True
@@ -422,7 +589,117 @@ class BPSProject(object):
             print("No template found. BPS project identified as single run")
 
 
-    def run(self, ncore=-1, stopwatch=False, run_mode='silent', debug=False):
+    def check_placeholders(self, jobs=None):
+        """Check that all template parameters have a value in every job
+
+        Templates are tokenized once and each job's parameters are checked
+        against the placeholders found, before any simulation is launched.
+
+        Args:
+            jobs: JobList of jobs to be checked (by default, all jobs)
+
+        Returns:
+            dict with JobID as key and list of unresolved parameters as value,
+            only for jobs with unresolved parameters
+
+        """
+
+        unresolved = {}
+        if not self.temp_relpaths:
+            return unresolved
+        plan = get_render_plan(self.abspath, self.temp_relpaths,
+                               self.config['templatefile_searchstring'])
+        jobs = self.jobs if jobs is None else jobs
+        if not plan.params or not len(jobs):
+            return unresolved
+        # Missing values are looked for column-wise
+        params_df = jobs.frame()
+        missing_df = pd.DataFrame(index=params_df.index)
+        for param in plan.params:
+            if param in params_df:
+                missing_df[param] = params_df[param].isnull().values
+            else:
+                missing_df[param] = True
+        missing_df = missing_df[sorted(missing_df.columns)]
+        for jobID, row in missing_df[missing_df.any(axis=1)].iterrows():
+            unresolved[jobID] = list(row.index[row.values])
+
+        return unresolved
+
+
+    def get_exepath(self):
+        """Return path to executable of detected simulation tool"""
+
+        if self.simtool == 'TRNSYS':
+            return self.config['trnexe_path']
+        elif self.simtool == 'DAYSIM':
+            return self.config['exe_path']
+
+
+    def get_cmd(self, run_mode='silent'):
+        """Build command running simulation tool on model file
+
+        Args:
+            run_mode: 'silent', 'nostop' or 'normal' (see 'run' method)
+
+        Returns:
+            Command in list format
+
+        """
+
+        #Create executable path for selected simulation tool
+        executable_abspath = self.get_exepath()
+        if self.simtool == 'TRNSYS':
+            silent_flag = '/h'
+            nostop_flag = '/n'
+        elif self.simtool == 'DAYSIM':
+            silent_flag = ''
+            nostop_flag = ''
+
+        # Build absolute path to model file
+        model_abspath = os.path.join(self.abspath, self.model_relpath)
+        cmd = [executable_abspath, model_abspath]
+        if run_mode == 'silent':
+            cmd.append(silent_flag)
+        elif run_mode == 'nostop':
+            cmd.append(nostop_flag)
+
+        return cmd
+
+
+    def get_cmds(self, run_mode='silent'):
+        """Build list of commands run one after the other by the 'run'
+        method
+
+        Staged DAYSIM jobs (see 'DC_Cache' in config.ini) run the stages of
+        the DAYSIM pipeline that follow daylight coefficient calculation,
+        which is done by the 'preprocess' method. Otherwise, a single command
+        runs the simulation tool (see 'get_cmd' method).
+
+        Args:
+            run_mode: 'silent', 'nostop' or 'normal' (see 'run' method)
+
+        Returns:
+            List of commands in list format
+
+        """
+
+        if not self.staged:
+            return [self.get_cmd(run_mode)]
+        bin_dir = os.path.abspath(self.config['bin_dir'])
+        model_abspath = os.path.join(self.abspath, self.model_relpath)
+        stages = [s.strip() for s in
+                  self.config['downstream_stages'].split(',') if s.strip()]
+
+        return [[os.path.join(bin_dir, stage), model_abspath]
+                for stage in stages]
+
+
+    @traced('run')
+    def run(self, ncore=-1, stopwatch=False, run_mode='silent', debug=False,
+            parse_inline=False, resume=None, cache=False, log_messages=None,
+            schedule='longest', timeout=None, retries=None, speculate=None,
+            engine='pool', executor=None, pretool=False):
         """Run simulation jobs
 
         Args:
@@ -438,39 +715,84 @@ class BPSProject(object):
                and therefore does not appear on screens. if debug is set to
                'True' any output text return by the simuation tool is printed
                (useful for debuggingsimulation model)
+            parse_inline: if True, result files are parsed by each job before
+               its temporary folder is deleted and parsed results are sent
+               back with the job run summary, so that 'results2df' does not
+               have to read result files back from the results directory
+            resume: if True, jobs already completed in a previous run of the
+               same series are skipped. By default (resume=None), the value
+               given to the 'add_jobs' method is used
+            cache: if True, result and log files of jobs are stored in a
+               cache directory, with simulation inputs as key, and jobs
+               whose inputs are found in cache are not run again. Cache size
+               is limited to 'ResultCache_MaxSize' MB (see config.ini)
+            log_messages: maximum number of distinct messages found in TRNSYS
+               log files and kept in the 'WarningMessages' column of run
+               summaries. By default (log_messages=None), the value of
+               'Log_MaxMessages' (see config.ini) is used
+            schedule: order in which jobs are dispatched to cores.
+               'longest' (default) dispatches jobs with the longest expected
+               run time first, run times being estimated from previous jobs
+               saved to the results database (see 'schedule_jobs' method).
+               'sample' dispatches jobs in sample order
+            timeout: wall-clock time (in seconds) after which the simulation
+               tool process(es) of a job (and all of their sub-processes) are
+               killed, whatever the number of processes run by the job.
+               By default (timeout=None), the value of 'Job_Timeout' (see
+               config.ini) is used. 0 means no timeout
+            retries: number of times a job that failed or timed out is run
+               again. By default (retries=None), the value of 'Job_Retries'
+               (see config.ini) is used
+            speculate: fraction of jobs that may be launched a second time
+               once all jobs have been dispatched, if they run longer than the
+               median run time of ended jobs. The first attempt to end wins
+               and the other one is cancelled. By default (speculate=None),
+               the value of 'Job_Speculate' (see config.ini) is used
+            engine: 'pool' (default) runs each job in a process of a
+               multiprocessing pool. 'asyncio' runs all jobs from the current
+               process, launching simulation tool processes directly and
+               preparing/closing jobs in a small thread pool (see pybps.aio).
+               Executors and speculative duplicates are only supported by the
+               'pool' engine (ValueError is raised otherwise)
+            executor: executor to which jobs are submitted by the 'pool'
+               engine (see pybps.executor). By default (executor=None), jobs
+               run in a local multiprocessing pool of ncore processes.
+               FileQueueExecutor dispatches jobs to worker daemons started
+               with 'run-pybps.py --worker'. For ncore<=0, the number of jobs
+               given at a time to executor is set by executor. Executor is
+               closed once all jobs have ended
+            pretool: if True, jobs run tool-specific preprocessing, such as
+               TRNBUILD matrix generation for TRNSYS Type56 (see BPSJob
+               'preprocess' method)
 
         Returns:
             Info message for current simulation job run
 
         """
 
-        #Create executable path for selected simulation tool
-        if self.simtool == 'TRNSYS':
-            executable_abspath = self.config['trnexe_path']
-            silent_flag = '/h'
-            nostop_flag = '/n'
-        elif self.simtool == 'DAYSIM':
-            executable_abspath = self.config['exe_path']
-            silent_flag = ''
-            nostop_flag = ''
-
         # If simulation project is identified as single run, directly
         # call simulation tool to run simulation
         if self._batch == False:
-            # Build absolute path to model file
-            model_abspath = os.path.join(self.abspath, self.model_relpath)
-            # Run the simulation, by default in silent mode
-            if run_mode == 'silent': flag = silent_flag
-            elif run_mode == 'nostop': flag = nostop_flag
-            elif run_mode == 'normal': flag = None
-            cmd = [executable_abspath, model_abspath, flag]
+            # Build commands running simulation, by default in silent mode
+            cmds = self.get_cmds(run_mode)
             # Measure simulation run time
             start_time = time()
-            # Launch command
-            if debug == False:
-                util.run_cmd(cmd)
-            else:
-                util.run_cmd(cmd, debug=True)
+            # Launch commands, adding up their resource usage
+            self.usage = {}
+            for cmd in cmds:
+                # Timeout applies to all commands of the job, as a whole
+                timeout = self.timeout
+                if timeout:
+                    timeout -= time() - start_time
+                    if timeout <= 0:
+                        raise util.CommandTimeout(cmd, self.timeout)
+                usage = util.run_cmd(cmd, debug=debug, timeout=timeout,
+                                     pid_abspath=self.pid_abspath)
+                if usage:
+                    self.usage = {
+                        'cpu': self.usage.get('cpu', 0) + usage.get('cpu', 0),
+                        'maxrss': max(self.usage.get('maxrss', 0),
+                                      usage.get('maxrss', 0))}
             # Save simulation time
             self.simtime = round(time() - start_time, 3)
         # If simulation project corresponds to a batch run, run jobs
@@ -479,27 +801,129 @@ class BPSProject(object):
             # Check first if there are some jobs defined
             if self.jobs:
                 print('\nStarting batch run ...')
+                # Jobs are created when dispatched and get the following
+                # settings from project.
+                # Tell jobs whether they should parse their own results
+                self.parse_inline = parse_inline
+                self.inline_results = {}
+                # Tell jobs whether they should run tool-specific
+                # preprocessing
+                self.pretool = pretool
+                # Number of log messages kept in run summaries
+                if log_messages is None:
+                    log_messages = int(self.config.get('log_maxmessages', 0))
+                self.log_messages = log_messages
+                # Timeout of simulation tool processes and failure handling
+                if timeout is None:
+                    timeout = float(self.config.get('job_timeout', 0))
+                if retries is None:
+                    retries = int(self.config.get('job_retries', 0))
+                if speculate is None:
+                    speculate = float(self.config.get('job_speculate', 0))
+                self.timeout = timeout or None
+                if engine == 'asyncio' and executor is not None:
+                    raise ValueError("Executors are only supported by the "
+                                     "'pool' engine")
+                if engine == 'asyncio' and speculate > 0:
+                    raise ValueError("Speculative duplicates are only "
+                                     "supported by the 'pool' engine")
+                # Share result cache with jobs if requested by user
+                if cache:
+                    cache_abspath = os.path.join(self.abspath, '../_pybps_cache')
+                    self.cache = ResultCache(cache_abspath,
+                                             self.get_cache_maxsize())
+                else:
+                    self.cache = None
+                # Skip jobs already completed if resuming a previous run
+                if resume is not None:
+                    self.resume = resume
+                jobs = self.jobs
+                self.skipped_jobIDs = []
+                if self.resume:
+                    completed = self.get_completed()
+                    jobs = self.jobs.exclude(completed)
+                    done = [r['JobID'] for r in self.runsummary]
+                    for jobID in sorted(completed):
+                        self.skipped_jobIDs.append(jobID)
+                        if jobID not in done:
+                            self.runsummary.append(completed[jobID])
+                    print("%d jobs already completed, %d jobs left to run" %
+                        (len(self.skipped_jobIDs), len(jobs)))
+                # Check that all placeholders will be resolved in all jobs
+                if self.valid_check == True:
+                    unresolved = self.check_placeholders(jobs)
+                    if unresolved:
+                        print("\nUnresolved template parameters in %d job(s)!"
+                            % len(unresolved))
+                        for jobID in sorted(unresolved):
+                            print("%s: %s" % (jobID,
+                                ', '.join(unresolved[jobID])))
+                        print("No simulation job was run")
+                        return
+                # Dispatch longest jobs first, so that no core stays idle
+                # at the end of the batch run
+                if schedule == 'longest':
+                    jobs = self.schedule_jobs(jobs)
+                # Ledger recording run summary of each job as soon as it ends
+                ledger = JobLedger(os.path.join(self.resultsdir_abspath,
+                                       self.db_name), self.ledger_table)
                 # Start timer if stopwatch requested by user
                 if stopwatch == True:
                     start_time = time()
-                # Create multiprocessing pool for parallel subprocess run
-                if ncore <= 0:
-                    pool = Pool(None)
-                    print(str(cpu_count()) +
+                if engine != 'asyncio' and executor is not None:
+                    if ncore <= 0:
+                        ncore = executor.ncore or len(jobs)
+                    print('Up to %d job(s) at a time submitted to %s\n' %
+                        (ncore, executor))
+                elif ncore <= 0:
+                    ncore = cpu_count()
+                    print(str(ncore) +
                         ' core(s) used in current run (max local cores)\n')
                 else:
-                    pool = Pool(ncore)
                     print(str(ncore) + ' core(s) used in current run\n')
-                # This method automatically assigns processes to available
-                # cores and the entire operation stops when all values from
-                # jobs from the jobs list have been evaluated.
-                # A callback function is used to retrieve run summary from job
-                # and store it in runsummary list
-                r = pool.map_async(self.runjob_func, self.jobs, chunksize=1,
-                        callback=self.runsummary.extend)
-                r.wait()
-                pool.close()
-                pool.join()
+                # Jobs are dispatched to available cores and the entire
+                # operation stops when all jobs have ended.
+                # Run summaries are retrieved as soon as each job ends, stored
+                # in runsummary list and recorded in job ledger
+                batch_start = time()
+                runtimes = []
+                def record(runsumdict):
+                    runtimes.append(runsumdict['SimulTime(sec)'])
+                    self.store_runsummary([runsumdict])
+                    ledger.record(runsumdict)
+                try:
+                    if engine == 'asyncio':
+                        from pybps import aio
+                        aio.run_jobs(jobs, ncore, record, run_mode, debug,
+                                     retries)
+                    else:
+                        # Create multiprocessing pool for parallel
+                        # subprocess run, unless an executor was given
+                        if executor is None:
+                            executor = PoolExecutor(ncore)
+                        for runsumdict in self.dispatch_jobs(executor, jobs,
+                                ncore, retries, speculate):
+                            record(runsumdict)
+                finally:
+                    if engine != 'asyncio' and executor is not None:
+                        executor.close()
+                    ledger.close()
+                    # Results directory content has changed
+                    if self.results_index is not None:
+                        self.results_index.invalidate()
+                self.runsummary.sort(key=lambda r: r['JobID'])
+                # Compare batch run time with its lower bound (jobs run
+                # back to back on all cores)
+                self.makespan = time() - batch_start
+                self.makespan_bound = sched.makespan_bound(runtimes, ncore)
+                if runtimes:
+                    print('\nBatch makespan: {:.2f} seconds '.format(
+                        self.makespan) + '(lower bound: {:.2f} seconds)'.format(
+                        self.makespan_bound))
+                if self.cache is not None:
+                    hits = sum(r.get('CacheHit', 0) for r in self.runsummary)
+                    print('\nResult cache: %d hit(s), %d miss(es)' %
+                        (hits, len(self.runsummary) - hits))
                 # Stop timer if stopwatch requested by user
                 if stopwatch == True:
                     self.simtime = time()-start_time
@@ -512,17 +936,242 @@ class BPSProject(object):
                 "\n'add_jobs' methods prior to calling the 'run' method")
 
 
+    def dispatch_jobs(self, executor, jobs, ncore, retries=0, speculate=0):
+        """Run jobs with an executor and yield their run summaries
+
+        Jobs are dispatched in list order, no more than ncore at a time, and
+        only taken from the list when a core is free (JobList creates them on
+        the fly).
+        Jobs that failed or timed out are dispatched again, at most 'retries'
+        times. Once all jobs have been dispatched, jobs running longer than
+        the median run time of ended jobs may get a speculative duplicate
+        (a second attempt run in its own folder). The first attempt to end
+        wins and the other attempts of the same job are cancelled.
+
+        Args:
+            executor: executor running jobs (see pybps.executor)
+            jobs: list of jobs to be run
+            ncore: number of jobs run at a time
+            retries: maximum number of retries per job
+            speculate: maximum fraction of jobs getting a duplicate
+
+        Yields:
+            Run summary dict of each job (one per job, whatever the number of
+            attempts)
+
+        """
+
+        queue = iter(jobs)
+        # Jobs to be retried, dispatched before next jobs of queue
+        pending = deque()
+        exhausted = False
+        # List of (task handle, job attempt, start time) tuples
+        running = []
+        # Number of attempts and failures per JobID
+        attempts = {}
+        failures = {}
+        # IDs of jobs already ended and of jobs that got a duplicate
+        ended = set()
+        duplicated = set()
+        max_duplicates = int(ceil(speculate * len(jobs)))
+        durations = []
+        last_cancel = 0
+
+        while True:
+            # Fill free cores with pending jobs
+            while len(running) < ncore:
+                if pending:
+                    job = pending.popleft()
+                else:
+                    job = next(queue, None)
+                    if job is None:
+                        exhausted = True
+                        break
+                running.append(self._submit_job(executor, job, attempts))
+            if not running:
+                break
+            # Launch speculative duplicates of stragglers once all jobs
+            # have been dispatched
+            if (exhausted and not pending and len(running) < ncore and
+                    durations and len(duplicated) < max_duplicates):
+                median = sorted(durations)[len(durations) // 2]
+                now = time()
+                stragglers = [(now - start, job) for (r, job, start) in running
+                              if job.get_jobID() not in ended and
+                                 job.get_jobID() not in duplicated and
+                                 now - start > median]
+                if stragglers:
+                    job = max(stragglers, key=lambda s: s[0])[1]
+                    duplicated.add(job.get_jobID())
+                    print("Launching duplicate of straggling job %s ..." %
+                        job.jobID)
+                    running.append(self._submit_job(executor, job, attempts))
+            ready_tasks = executor.ready([r for (r, job, start) in running])
+            ready = [item for item in running if item[0] in ready_tasks]
+            if not ready:
+                # Attempts of ended jobs are cancelled again every second,
+                # in case their simulation tool process was not started yet
+                if time() - last_cancel > 1:
+                    last_cancel = time()
+                    for (r, job, start) in running:
+                        if job.get_jobID() in ended:
+                            job.cancel()
+                sleep(0.05)
+                continue
+            for item in ready:
+                running.remove(item)
+                (r, job, start) = item
+                jobID = job.get_jobID()
+                try:
+                    runsumdict = r.get()
+                except Exception as e:
+                    runsumdict = job.abort(e, cleanup=False)
+                # Attempt of a job that has already ended
+                if jobID in ended:
+                    continue
+                others = [j for (r2, j, s2) in running
+                          if j.get_jobID() == jobID]
+                if runsumdict.get('Status') in ('failed', 'timeout'):
+                    if others:
+                        # Wait for other attempt of the same job
+                        continue
+                    failures[jobID] = failures.get(jobID, 0) + 1
+                    if failures[jobID] <= retries:
+                        print("Job %s %s, retrying (%d/%d) ..." % (job.jobID,
+                            runsumdict['Status'], failures[jobID], retries))
+                        pending.append(job)
+                        continue
+                ended.add(jobID)
+                durations.append(time() - start)
+                for other in others:
+                    other.cancel()
+                yield runsumdict
+
+
+    def _submit_job(self, executor, job, attempts):
+        """Submit a new attempt of a job to executor
+
+        Returns:
+            (task handle, job attempt, start time) tuple
+
+        """
+
+        jobID = job.get_jobID()
+        attempts[jobID] = attempts.get(jobID, 0) + 1
+        if attempts[jobID] > 1:
+            # Later attempts are run in their own folder
+            job = deepcopy(job)
+            job.set_attempt(attempts[jobID])
+
+        return (executor.submit(self.runjob_func, job), job, time())
+
+
+    def schedule_jobs(self, jobs):
+        """Sort jobs by decreasing expected run time
+
+        Run time of each job is estimated from the run time of the previous
+        job with the nearest parameters, as found in the 'Jobs' and
+        'RunSummary' tables of the results database (see 'save2db' method).
+        Jobs are kept in sample order if no history is available.
+
+        Args:
+            jobs: JobList of jobs to be run
+
+        Returns:
+            Sorted JobList of jobs
+
+        """
+
+        self.expected_runtimes = {}
+        history = sched.load_history(os.path.join(self.resultsdir_abspath,
+                                                  self.db_name))
+        if history is None or not jobs:
+            return jobs
+        estimator = sched.RuntimeEstimator(history)
+        estimates = estimator.estimate(jobs.frame())
+        for jobID, estimate in zip(jobs.jobIDs(), estimates):
+            if estimate == estimate:
+                self.expected_runtimes[jobID] = float(estimate)
+        print("Jobs dispatched longest first (%d of %d run time(s) " %
+            (len(self.expected_runtimes), len(jobs)) +
+            "estimated from %d previous job(s))" % len(history))
+
+        return sched.longest_first(jobs, estimates)
+
+
+    def add_sink(self, sink):
+        """Attach an event sink to project
+
+        Sink receives events emitted before and after calls of traced
+        methods ('prepare', 'preprocess', 'run' and 'close' methods of jobs,
+        'run', 'results2df' and 'save2db' methods of project).
+        See pybps.events for available sinks.
+
+        Args:
+            sink: instance of an EventSink subclass
+
+        """
+
+        self.sinks.append(sink)
+
+
+    def remove_sink(self, sink):
+        """Detach an event sink from project"""
+
+        self.sinks.remove(sink)
+
+
+    def tracing(self):
+        """Return True if events of traced methods have to be emitted"""
+
+        return self.collect_events or bool(self.sinks)
+
+
+    def emit(self, event):
+        """Hand an event to all event sinks
+
+        Args:
+            event: event dict (see pybps.events.EventSink)
+
+        """
+
+        event.setdefault('job', None)
+        event.setdefault('pid', os.getpid())
+        event.setdefault('tid', event['pid'])
+        if self.collect_events:
+            self.events.append(event)
+        for sink in self.sinks:
+            sink.handle(event)
+
+
+    def store_runsummary(self, runsumdict_list):
+        """Store run summaries returned by simulation jobs
+
+        This method is used as a callback by the 'run' method. Results parsed
+        inline by jobs (see 'parse_inline' arg of 'run' method) are removed
+        from run summaries and stored in the 'inline_results' dict. Events
+        collected by jobs are removed from run summaries and handed to event
+        sinks.
+
+        Args:
+            runsumdict_list: list of run summary dicts returned by jobs
+
+        """
+
+        for runsumdict in runsumdict_list:
+            batches = runsumdict.pop('Results', None)
+            if batches is not None:
+                self.inline_results[runsumdict['JobID']] = batches
+            for event in runsumdict.pop('Events', []):
+                self.emit(event)
+            self.runsummary.append(runsumdict)
+
+
     def jobs2df(self):
         """Create pandas DataFrame from sample"""
 
         # Build a 'pandas' DataFrame with all jobs parameters
-        jobdict_list = []
-        jobsdf_index = []
-        for job in self.jobs:
-            jobsdf_index.append(job.seriesID + '_' + job.jobID)
-            jobdict_list.append(job.jobdict)
-        colnames = sorted(jobdict_list[0].keys())
-        self.jobs_df = pd.DataFrame(jobdict_list, columns=colnames, index=jobsdf_index)
+        self.jobs_df = self.jobs.frame()
 
 
     def runsum2df(self):
@@ -530,56 +1179,123 @@ class BPSProject(object):
 
         # Build a 'pandas' DataFrame with run summaries for all jobs
         colnames = ['JobID','Message','Warnings','Errors','SimulTime(sec)']
+        # Optional columns, only present in run summaries of batch runs or
+        # depending on run options
+        for colname in ['PrepareTime(sec)', 'PreprocessTime(sec)',
+                        'RunTime(sec)', 'CloseTime(sec)', 'ParseTime(sec)',
+                        'CPUTime(sec)', 'PeakRSS(MB)', 'Status', 'Attempt',
+                        'CacheHit', 'WarningMessages']:
+            if any(colname in r for r in self.runsummary):
+                colnames.append(colname)
         self.runsum_df = pd.DataFrame(self.runsummary, columns=colnames)
 
 
-    def results2df(self):
-        """Create pandas DataFrame from simulation results"""
+    def iter_results(self, ncore=1):
+        """Iterate over parsed simulation results of current series
+
+        Result files are parsed one job at a time, so that results can be
+        streamed to a columnar buffer without holding intermediate
+        DataFrames in memory. Jobs are always yielded in JobID order.
+        If jobs were run with the 'parse_inline' option, results they
+        sent back are yielded instead and result files are not read again.
+
+        Args:
+            ncore: number of local cores used to parse result files.
+               By default (ncore=1), files are parsed in the current process.
+               For ncore>=2, files are parsed in parallel by a pool of
+               processes. For ncore<=0, the max number of local cores is used.
+
+        Yields:
+            (JobID, batch) tuples, one per parsed result file, where batch is
+            either a list of dicts (one dict per row of results) or a dict of
+            columns (see 'parse_results' function)
+
+        """
+
+        # Use results parsed inline by jobs if available. Results of jobs
+        # skipped because completed in a previous run are read from disk
+        if self.parse_inline and self.inline_results:
+            results_ext = self.config['resultfile_extensions'].split(',')
+            for jobID in sorted(set(self.inline_results) |
+                                set(self.skipped_jobIDs)):
+                if jobID in self.inline_results:
+                    batches = self.inline_results[jobID]
+                else:
+                    batches = parse_results((self.simtool, sorted(
+                        self.get_results_index().find(results_ext,
+                                                      subdir=jobID))))
+                for batch in batches:
+                    yield jobID, batch
+            return
 
         # Get extensions of results files
         results_ext = self.config['resultfile_extensions']
         results_ext = results_ext.split(',')
         # Get list of paths to results files
-        results_abspathlist = util.get_file_paths(results_ext,
-                                  self.resultsdir_abspath)
-        # Go through all results files from all simulated jobs
-        df_exists = False
+        results_abspathlist = self.get_results_index().find(results_ext)
+        # Group results files by job, only keeping files within sub-folders
+        # pertaining to current batch run identified by seriesID
+        jobfiles = {}
         for results_abspath in results_abspathlist:
             # Get Series/Job IDs
             match = re.search(r'([A-Z0-9]{8})_[0-9]{5}', results_abspath)
-            if match:
-                # Only parse results within sub-folders pertaining to
-                # current batch run identified by seriesID
-                if match.group(1) == self.seriesID:
-                    # Build a 'pandas' dataframe with results from all jobs
-                    if self.simtool == 'TRNSYS':
-                        dict_list = trnsys_post.parse_type46(
-                                               results_abspath)
-                    elif self.simtool == 'DAYSIM':
-                        if (os.path.splitext(os.path.basename(
-                            results_abspath))[1] == '.htm'):
-                            dict_list = daysim_post.parse_el_lighting(
-                                            results_abspath)
-                    if dict_list:
-                        for dict in dict_list:
-                            dict['JobID'] = match.group()
-                        colnames = dict_list[0].keys()
-                        #colnames.sort(key = sort_key_dfcolnames)
-                        if not df_exists:
-                            self.results_df = pd.DataFrame(dict_list,
-                                              columns=colnames)
-                            df_exists = True
-                        else:
-                            df = pd.DataFrame(dict_list, columns=colnames)
-                            self.results_df = self.results_df.append(df,
-                                                  ignore_index=True)
-                    else:
-                        print("No results dataframe created")
+            if match and match.group(1) == self.seriesID:
+                jobfiles.setdefault(match.group(), []).append(results_abspath)
+        jobIDs = sorted(jobfiles)
+        tasks = [(self.simtool, sorted(jobfiles[jobID])) for jobID in jobIDs]
+
+        # Parse results files, either serially or in a pool of processes.
+        # Pool.imap returns parsed results in the order of submitted tasks
+        if ncore == 1 or len(tasks) < 2:
+            parsed = (parse_results(task) for task in tasks)
+            pool = None
+        else:
+            pool = Pool(None if ncore <= 0 else ncore)
+            parsed = pool.imap(parse_results, tasks,
+                               chunksize=max(1, len(tasks) // (8 * cpu_count())))
+        try:
+            for jobID, batches in zip(jobIDs, parsed):
+                for batch in batches:
+                    yield jobID, batch
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+
+
+    @traced('results2df')
+    def results2df(self, ncore=1):
+        """Create pandas DataFrame from simulation results
 
+        Parsed results are collected in a columnar buffer and the DataFrame
+        is built once all result files have been parsed.
 
+        Args:
+            ncore: number of local cores used to parse result files
+               (see 'iter_results' method)
+
+        """
+
+        buf = util.ColumnBuffer()
+        for jobID, batch in self.iter_results(ncore):
+            buf.extend(batch, JobID=jobID)
+
+        if len(buf):
+            self.results_df = pd.DataFrame(buf.to_dict())
+            if self.tracing():
+                self.event_bytes = int(self.results_df.memory_usage().sum())
+        else:
+            print("No results dataframe created")
+
+
+    @traced('save2db')
     def save2db(self, items='all'):
         """Save project jobs/results to sql database
 
+        Jobs and results are stored in long format (see pybps.db), in a
+        single transaction. Jobs of current series already found in database
+        are replaced.
+
         Args:
             items: 'jobs','results' and 'runsummary' respectively save jobs,
                 results or run summary to the database; 'all' saves everything
@@ -587,16 +1303,25 @@ class BPSProject(object):
         """
 
         db_abspath = os.path.join(self.resultsdir_abspath, self.db_name)
-        cnx = sqlite3.connect(db_abspath)
+        if self.tracing() and os.path.isfile(db_abspath):
+            db_size = os.path.getsize(db_abspath)
+        else:
+            db_size = 0
 
-        if items == 'all' or items == 'jobs':
-            self.jobs_df.to_sql(name='Jobs', con=cnx, if_exists='append')
-        if items == 'all' or items == 'results':
-            self.results_df.to_sql(name='Results', con=cnx, if_exists='append')
-        if items == 'all' or items == 'runsummary':
-            self.runsum_df.to_sql(name='RunSummary', con=cnx, if_exists='append')
+        # Tables of older versions are renamed by first save
+        renamed = db.write(db_abspath, self.seriesID,
+            jobs_df=self.jobs_df if items in ('all', 'jobs') else None,
+            results_df=(self.results_df if items in ('all', 'results')
+                        else None),
+            runsum_df=(self.runsum_df if items in ('all', 'runsummary')
+                       else None),
+            project=self.abspath, simtool=self.simtool)
+        for table in sorted(renamed):
+            print("Table %s of older version renamed to %s" %
+                  (table, renamed[table]))
 
-        cnx.close()
+        if self.tracing():
+            self.event_bytes = os.path.getsize(db_abspath) - db_size
 
 
     def save2csv(self, items='all'):
@@ -647,46 +1372,99 @@ class BPSProject(object):
             self.runsum_df.to_pickle(runsumpkl_abspath)
 
 
-    def getfromdb_jobs(self, seriesID=None, db_name="SimResults.db"):
+    def save2store(self, items='all', backend=None):
+        """Append project jobs/results to the columnar result store
+
+        Each call appends a new part to the partition of current series, in
+        the 'ResultStore' directory of results folder (see pybps.store).
+        Stored data can then be read back, one series or a filtered subset at
+        a time, with the 'load' method of ResultStore class.
+
+        Args:
+            items: 'jobs','results' and 'runsummary' respectively save jobs,
+                results or run summary to the store; 'all' saves everything
+            backend: 'parquet' or 'npy' (by default, 'parquet' if pyarrow is
+                installed)
+
+        Returns:
+            ResultStore instance
+
+        """
+
+        store = ResultStore(os.path.join(self.resultsdir_abspath,
+                                         self.store_name), backend)
+
+        if (items == 'all' or items == 'jobs') and self.jobs_df is not None:
+            jobs_df = self.jobs_df.copy()
+            jobs_df.index.name = 'JobID'
+            store.append('Jobs', jobs_df, self.seriesID)
+        if (items == 'all' or items == 'results') and \
+                self.results_df is not None:
+            store.append('Results', self.results_df, self.seriesID)
+        if (items == 'all' or items == 'runsummary') and \
+                self.runsum_df is not None:
+            store.append('RunSummary', self.runsum_df, self.seriesID)
+
+        return store
+
+
+    def getfromdb_jobs(self, seriesID=None, params=None, chunksize=None,
+                       db_name=None):
         """Get jobs from database
 
-        NOT IMPLEMENTED YET! DO NOT USE!
+        Args:
+            seriesID: ID or list of IDs of series of jobs (by default, jobs
+                of all series)
+            params: dict with parameter name as key and, as value, either a
+                value, a (min, max) tuple (bounds included, None for no
+                bound) or a list of values
+            chunksize: if given, an iterator over DataFrames of at most
+                chunksize jobs is returned
+            db_name: name of database file in results directory (by default,
+                'SimResults.db')
+
+        Returns:
+            pandas DataFrame (or iterator of DataFrames) with JobID as index
+            and one column per parameter, or None if no jobs were found
 
         """
 
-        self.seriesID = seriesID
-        self.db_abspath = os.path.join(self.resultsdir_abspath, db_name)
-        cnx = sqlite3.connect(self.db_abspath)
-        if self.seriesID:
-            sql_query = (r"SELECT * FROM Parameters WHERE _JOB_ID LIKE '%s%%'"
-                            % seriesID)
-        else:
-            sql_query = r"SELECT * FROM Parameters"
-        parameters_df = sql.read_frame(sql_query, cnx)
-        cnx.close()
-        return parameters_df
+        db_abspath = os.path.join(self.resultsdir_abspath,
+                                  db_name or self.db_name)
 
+        return db.load_jobs(db_abspath, seriesID, params, chunksize)
 
-    def getfromdb_results(self, seriesID=None, month=None, db_name="SimResults.db"):
+
+    def getfromdb_results(self, seriesID=None, month=None, filters=None,
+                          columns=None, chunksize=None, db_name=None):
         """Get results from database
 
-        NOT IMPLEMENTED YET! DO NOT USE!
+        Args:
+            seriesID: ID or list of IDs of series of jobs (by default, results
+                of all series)
+            month: month (period) name or list of month names
+            filters: dict of filters on result variables (see
+                getfromdb_jobs); only result rows whose variables pass all
+                filters are returned
+            columns: list of variables to be returned (by default, all
+                variables)
+            chunksize: if given, an iterator over DataFrames of at most
+                chunksize result rows is returned
+            db_name: name of database file in results directory (by default,
+                'SimResults.db')
+
+        Returns:
+            pandas DataFrame (or iterator of DataFrames) with SeriesID, JobID
+            and Period columns and one column per variable, or None if no
+            results were found
 
         """
 
-        self.db_abspath = os.path.join(self.resultsdir_abspath, db_name)
-        cnx = sqlite3.connect(self.db_abspath)
-        if seriesID and month:
-            sql_query = (r"SELECT * FROM Results WHERE (_JOB_ID LIKE '%s%%')" +
-                            " AND (Month LIKE '%s')" % (seriesID, month))
-        elif seriesID:
-            sql_query = (r"SELECT * FROM Results WHERE _JOB_ID LIKE '%s%%'"
-                            % seriesID)
-        else:
-            sql_query = r"SELECT * FROM Results"
-        results_df = sql.read_frame(sql_query, cnx)
-        cnx.close()
-        return results_df
+        db_abspath = os.path.join(self.resultsdir_abspath,
+                                  db_name or self.db_name)
+
+        return db.load_results(db_abspath, seriesID, month, columns, filters,
+                               chunksize)
 
 
 
@@ -694,38 +1472,180 @@ class BPSJob(BPSProject):
     """Class that holds all information and methods to manage a particular
     simulation job"""
 
-    def __init__(self, bpsproject, jobID):
+    # Run summary columns of job phase times, in phase order
+    phases = ['PrepareTime(sec)', 'PreprocessTime(sec)', 'RunTime(sec)',
+              'CloseTime(sec)']
+
+    def __init__(self, bpsproject, jobID, row=None):
         #BPSProject.__init__(self, path=None, batch=True)
         # Define variables specific to BPSJob class instances
         self.jobID = '%0*d' % (5, jobID) # ID of current job run
         self.runsumdict = {} # Run summary dict
         self.simtime = 0 # Simulation run time
+        self.usage = {} # Resource usage of simulation tool process
+        self.parsetime = 0 # Time spent parsing log and result files
+        self.sinks = [] # Event sinks (events are sent back to project)
+        self.collect_events = bool(bpsproject.sinks) # Collect events
+        self.events = [] # Events collected by job
+        self.slot = None # Worker slot running job (asyncio engine)
+        self.event_bytes = None # Bytes processed by last traced method
+        self.parse_inline = bpsproject.parse_inline # Parse results in close
+        self.pretool = bpsproject.pretool # Tool-specific preprocessing
+        self.cache = bpsproject.cache # Result cache shared by all jobs
+        self.cache_hit = False # True if results were restored from cache
+        self.log_messages = bpsproject.log_messages # Log messages kept
+        self.rendered_abspaths = [] # Paths to files rendered from templates
         # Define basic instance variables from main BPSProject class instance
         self.seriesID = bpsproject.seriesID
         self.simtool = bpsproject.simtool
         self.config = bpsproject.config
-        self.jobdict = bpsproject.sample[jobID-1]
+        # Sample row of job (by default, jobs are numbered from startJobID)
+        if row is None:
+            row = jobID - bpsproject.startJobID
+        self.jobdict = bpsproject.sample[row]
         self.base_abspath = bpsproject.abspath
-        self.abspath = os.path.join(bpsproject.jobsdir_abspath, self.seriesID +
-                          '_' + self.jobID)
+        self.jobsdir_abspath = bpsproject.jobsdir_abspath
         self.resultsdir_abspath = bpsproject.resultsdir_abspath
+        self.timeout = bpsproject.timeout # Timeout of simulation process
+        # Run DAYSIM pipeline stage by stage, reusing daylight coefficients
+        self.staged = (self.simtool == 'DAYSIM' and
+                       bool(int(self.config.get('dc_cache', 0))))
+        self.set_attempt(1)
         self.model_relpath = self.jobdict['ModelFile']
-        # The following instance variables are used only if project
-        # has template and sample files
-        self.temp_params = bpsproject.temp_params
-        self.samp_params = bpsproject.samp_params
+        self.temp_relpaths = bpsproject.temp_relpaths
         # IMPORTANT: instance of BPSJob class are by default identified
         # as single runs (self.batch = False).
         # The 'batch' instance variable MUST NOT BE CHANGED to 'True'!!!
         self._batch = False
 
 
+    def get_jobID(self):
+        """Get ID of job, prefixed with series ID"""
+
+        return self.seriesID + '_' + self.jobID
+
+
+    def set_attempt(self, attempt, lease=0):
+        """Set number of attempt to run job
+
+        First attempt is run in a folder named after the job ID. Later
+        attempts (retries or speculative duplicates) are run in their own
+        folder, suffixed with the attempt number. So are attempts leased
+        again by a worker of a work queue (see pybps.executor), since the
+        worker holding the previous lease may still be running the job.
+
+        Args:
+            attempt: attempt number (1 for first attempt)
+            lease: number of times attempt was leased again
+
+        """
+
+        self.attempt = attempt
+        dirname = self.get_jobID()
+        if attempt > 1:
+            dirname += '_a%d' % attempt
+        if lease > 0:
+            dirname += '_l%d' % lease
+        self.abspath = os.path.join(self.jobsdir_abspath, dirname)
+        self.pid_abspath = os.path.join(self.abspath, '.pybps_pid')
+
+
+    def cancel(self):
+        """Cancel job attempt run by another process
+
+        A marker file is written to job folder, so that job results are not
+        copied to results folder, and simulation tool process is killed if
+        it runs on the current host.
+
+        """
+
+        if not os.path.isdir(self.abspath):
+            return
+        try:
+            open(os.path.join(self.abspath, '.pybps_cancel'), 'w').close()
+            with open(self.pid_abspath) as pid_f:
+                host, pid = pid_f.read().split()
+        except (IOError, OSError, ValueError):
+            return
+        # Process IDs are only meaningful on the host that wrote them
+        if host == socket.gethostname():
+            util.kill_tree(int(pid))
+
+
+    def cancelled(self):
+        """Return True if job attempt was cancelled (see 'cancel' method)"""
+
+        return os.path.exists(os.path.join(self.abspath, '.pybps_cancel'))
+
+
+    def abort(self, exc, cleanup=True, phasetimes=(), phase_start=None):
+        """Get run summary of a job attempt that failed
+
+        Phase times measured before the failure and events collected by the
+        job are kept in run summary, so that failed jobs show up in traces.
+
+        Args:
+            exc: exception raised while running job
+            cleanup: if True, temporary job folder is removed
+            phasetimes: list of (run summary column, duration) tuples of
+                phases that ended
+            phase_start: start time of phase that failed, if known
+
+        Returns:
+            Run summary dict
+
+        """
+
+        if cleanup:
+            util.tmp_dir('remove', self.abspath)
+        if isinstance(exc, util.CommandTimeout):
+            status = 'timeout'
+            message = "Simulation timed out after %s seconds" % exc.timeout
+        else:
+            status = 'failed'
+            message = "Job failed: %s" % exc
+        self.runsumdict = {'JobID': self.get_jobID(), 'Message': message,
+                           'Warnings': None, 'Errors': 1,
+                           'SimulTime(sec)': self.simtime,
+                           'Status': status, 'Attempt': self.attempt}
+        phasetimes = list(phasetimes)
+        # Time spent in failed phase until failure
+        if phase_start is not None and len(phasetimes) < len(self.phases):
+            phasetimes.append((self.phases[len(phasetimes)],
+                               time() - phase_start))
+        for (name, phasetime) in phasetimes:
+            self.runsumdict[name] = round(phasetime, 3)
+        if self.events:
+            self.runsumdict['Events'] = self.events
+
+        return self.runsumdict
+
+
+    def emit(self, event):
+        """Collect an event emitted by job (see BPSProject.emit)"""
+
+        event['job'] = self.seriesID + '_' + self.jobID
+        # Jobs run by the same process are told apart by their worker slot
+        if self.slot is not None:
+            event['tid'] = self.slot
+        BPSProject.emit(self, event)
+
+
+    @traced('prepare')
     def prepare(self):
         """Prepare simulation job
 
         Prepares job by copying content of project folder to a temporary folder
         identified by a unique ID. Simulation job will be run from this folder.
 
+        With 'Workspace_Mode = link' in config.ini, read-only input files
+        matching 'Workspace_LinkFiles' are hardlinked or symlinked to project
+        files, while all other files are copied. Files matching
+        'Workspace_CopyFiles' and result and log files (which the simulation
+        tool writes in place) are always copied. Template files, rendered
+        directly from project folder, are left out.
+        In both modes, files matching 'Workspace_ExcludeFiles' are left out.
+
         """
 
 		# Check whether a single model file has been selected
@@ -733,63 +1653,79 @@ class BPSJob(BPSProject):
             print("Multiple model files selected for job run!" +
                 " Please select a single model file.")
         else:
-	        # Create temp dir for current simulation job and copy files to it
-            copytree(self.base_abspath, self.abspath)
-
-
-    def preprocess(self, pretool=False):
+            mode = self.config.get('workspace_mode', 'copy').strip()
+            copy_sstr = self.config.get('workspace_copyfiles', '').split(',')
+            excl_sstr = self.config.get('workspace_excludefiles', '').split(',')
+            link_sstr = self.config.get('workspace_linkfiles', '').split(',')
+            if mode == 'copy' and not any(p.strip() for p in excl_sstr):
+                # Create temp dir for current simulation job and copy files to it
+                copytree(self.base_abspath, self.abspath)
+                if self.tracing():
+                    self.event_bytes = tree_size(self.abspath)
+            else:
+                # Template files are rendered directly from project folder
+                excl_sstr.append(self.config['templatefile_searchstring'])
+                # Output files of a previous run found in project folder are
+                # overwritten by the simulation tool, so they must not be
+                # shared with project folder or other jobs
+                copy_sstr += (self.config['resultfile_extensions'].split(',') +
+                              self.config['logfile_extensions'].split(',') +
+                              ['.lst'])
+                self.event_bytes = util.link_tree(self.base_abspath,
+                    self.abspath, copy_sstr, excl_sstr, mode, link_sstr)
+
+
+    @traced('preprocess')
+    def preprocess(self, pretool=None):
         """Preprocess simulation job
 
         Replaces parameters found in template files with values from sample.
+        Template files are read and compiled only once per process (see
+        pybps.template.get_render_plan).
         When using TRNSYS simulation tool, if a Type56 is found in deck,
             the "gen_type56" preprocessing function is called to generate the
-            necessary matrices for the 3D model.
+            necessary matrices for the 3D model. Matrices are cached in the
+            '_pybps_type56' directory and generated only once per distinct
+            .b17 file, unless 'Type56_Cache' is set to 0 (see config.ini).
+            Matrix cache size is limited to 'ResultCache_MaxSize' MB.
+        When using DAYSIM simulation tool with 'DC_Cache' set to 1 (see
+            config.ini), daylight coefficients are computed by the "gen_dc"
+            preprocessing function, once per distinct geometry, and the
+            'run' method only runs the following stages of the pipeline.
+            DC cache size is limited to 'ResultCache_MaxSize' MB.
         When using DAYSIM simulation tool, if the scene rotation angel is
             different from zero, the "rotate_scene" function is called.
         Args:
             pretool: if True, activates tool-specific preprocessing
                 For example, matrix generation for TRNSYS Type56 or
-                scene rotation for DAYSIM
+                scene rotation for DAYSIM. By default (pretool=None), the
+                value given to the 'run' method of project is used
 
         """
 
+        self.rendered_abspaths = []
+        if pretool is None:
+            pretool = self.pretool
+
 		# Following code only runs when project uses template/sample files
         if self.jobdict:
-            # Get template file search string and look for them
-            tmp_sstr = self.config['templatefile_searchstring']
-            temp_abspathlist = util.get_file_paths([tmp_sstr], self.abspath)
-	        # Once we have a list of paths to template files, loop through
-            for temp_abspath in temp_abspathlist:
-                # Build name for simulation file
-                #(same name as tmp, without search string)
-                match = re.search(r'(.*)' + tmp_sstr + r'(.*)',
-                            os.path.basename(temp_abspath))
-                if match:
-                    siminput_abspath = os.path.join(
-                                           os.path.dirname(temp_abspath),
-                                           match.group(1) + match.group(2))
-                # Replace parameters with sample values in template file
-                with open(temp_abspath, 'rU') as T:
-                    # Read the entire file and store it in a temp variable
-                    template = Template(T.read())
-                    # Substitute the dollar-sign variables with values
-                    temp = template.safe_substitute(self.jobdict)
-                    # Replace special &PROJECT_DIR& var with cur dir path
-                    #temp = temp.replace('&PROJ_DIR&', str(self.abspath))
-                    # Proper way to manage existing model files
-                    if os.path.exists(siminput_abspath):
-                        try:
-                            os.remove(siminput_abspath)
-                        except:
-                            print("Exception: ", str(sys.exc_info()))
-                    # Open output file and write replaced content to it
-                    with open(siminput_abspath, 'w') as sim_f:
-                        sim_f.write(temp)
-                # Remove template file, which is not needed anymore
-                try:
-                    os.remove(temp_abspath)
-                except:
-                    print("Exception: ", str(sys.exc_info()))
+            # Render all templates with job parameters, using the render
+            # plan compiled once per process from project template files
+            plan = get_render_plan(self.base_abspath, self.temp_relpaths,
+                                   self.config['templatefile_searchstring'])
+            self.rendered_abspaths = plan.render(self.jobdict, self.abspath)
+            if self.tracing():
+                self.event_bytes = sum(os.path.getsize(f)
+                                       for f in self.rendered_abspaths)
+            # Remove template files copied to job folder, which are not
+            # needed anymore
+            for (temp_relpath, siminput_relpath, compiled) in plan.entries:
+                temp_abspath = os.path.join(self.abspath, temp_relpath)
+                if os.path.lexists(temp_abspath):
+                    try:
+                        os.remove(temp_abspath)
+                    except:
+                        print("Exception: ", str(sys.exc_info()))
 
             if pretool == True:
                 # If simtool is TRNSYS, generate TRNBUILD shading/insolation,
@@ -799,29 +1735,117 @@ class BPSJob(BPSProject):
                     #print("Waiting %.2f seconds before calling TRNBUILD" % wait_t)
                     #sleep(wait_t)
                     model_abspath = os.path.join(self.abspath, self.model_relpath)
-                    trnsys_pre.gen_type56(model_abspath)
+                    # Matrices are shared by jobs with the same geometry
+                    cache_abspath = None
+                    if int(self.config.get('type56_cache', 1)):
+                        cache_abspath = os.path.join(self.base_abspath,
+                                                     '../_pybps_type56')
+                    trnsys_pre.gen_type56(model_abspath,
+                        trnbuild_path=self.config.get('trnbuild_path'),
+                        trnsidf_path=self.config.get('trnsidf_path'),
+                        cache_abspath=cache_abspath,
+                        cache_maxsize=self.get_cache_maxsize())
                 # If simtool is DAYSIM, rotate scene and generate material and
                 # geometry radiance files required by Daysim
                 if self.simtool == 'DAYSIM':
                     model_abspath = os.path.join(self.abspath, self.model_relpath)
-                    daysim_pre.rotate_scene(model_abspath)
-                    daysim_pre.radfiles2daysim(model_abspath)
+                    bin_dir = self.config.get('bin_dir')
+                    daysim_pre.rotate_scene(model_abspath, bin_dir)
+                    daysim_pre.radfiles2daysim(model_abspath, bin_dir)
+
+        # First stage of staged DAYSIM pipeline: daylight coefficients are
+        # computed once per distinct geometry and shared by jobs
+        if self.staged:
+            model_abspath = os.path.join(self.abspath, self.model_relpath)
+            ignored = self.config.get('dc_ignoredkeywords')
+            if ignored is None:
+                ignored = daysim_pre.DC_IGNORED_KEYWORDS
+            else:
+                ignored = [k.strip() for k in ignored.split(',') if k.strip()]
+            daysim_pre.gen_dc(model_abspath, self.config.get('bin_dir'),
+                os.path.join(self.base_abspath, '../_pybps_dc'), ignored,
+                self.get_cache_maxsize())
+
+
+    def get_cachekey(self):
+        """Compute result cache key of simulation job
+
+        The key is a hash of the files rendered from templates, the model file
+        and the path to the simulation tool executable.
+
+        """
 
+        model_abspath = os.path.join(self.abspath, self.model_relpath)
+        return hash_files(self.rendered_abspaths + [model_abspath],
+                          self.abspath, extra=[self.simtool, self.get_exepath()])
 
+
+    def restore_results(self):
+        """Restore result and log files from result cache
+
+        Returns:
+            True if simulation results were found in cache and restored to job
+            folder (simulation then doesn't have to be run), False otherwise
+
+        """
+
+        self.cache_hit = False
+        if self.cache is not None:
+            self.cache_hit = self.cache.restore(self.get_cachekey(),
+                                                self.abspath)
+
+        return self.cache_hit
+
+
+    def store_results(self):
+        """Store result and log files of simulation job in result cache"""
+
+        if self.cache is None:
+            return
+        file_ext = (self.config['resultfile_extensions'].split(',') +
+                    self.config['logfile_extensions'].split(','))
+        file_abspathlist = util.get_file_paths(file_ext, self.abspath)
+        if file_abspathlist:
+            self.cache.store(self.get_cachekey(), file_abspathlist,
+                             self.abspath)
+
+
+    @traced('close')
     def close(self):
         """Close job by copying result and log files to main results folder
         and delete temporary job folder"""
 
+        self.parsetime = 0
+
+        # Results of cancelled attempts are discarded
+        if self.cancelled():
+            util.tmp_dir('remove', self.abspath)
+            self.runsumdict = {'JobID': self.get_jobID(),
+                               'Message': "Job attempt cancelled",
+                               'SimulTime(sec)': self.simtime,
+                               'Status': 'cancelled', 'Attempt': self.attempt}
+            return
+
         # Parse info about simulation run from TRNSYS lst and log files
         if self.simtool == 'TRNSYS':
+            start_time = time()
             # Get TRNSYS error/warning count from log file
             log_fname = os.path.splitext(self.model_relpath)[0]+'.log'
             log_abspath = os.path.join(self.abspath, log_fname)
-            self.runsumdict = trnsys_post.parse_log(log_abspath)
+            self.runsumdict = trnsys_post.parse_log(log_abspath,
+                                                    self.log_messages)
+            self.parsetime += time() - start_time
 
         # Save jobID and simulation time in run summary dict
         self.runsumdict['JobID'] = self.seriesID + '_' + self.jobID
         self.runsumdict['SimulTime(sec)'] = self.simtime
+        # Save resource usage of simulation tool process
+        self.runsumdict['CPUTime(sec)'] = self.usage.get('cpu')
+        self.runsumdict['PeakRSS(MB)'] = self.usage.get('maxrss')
+        self.runsumdict['Status'] = 'ok'
+        self.runsumdict['Attempt'] = self.attempt
+        if self.cache is not None:
+            self.runsumdict['CacheHit'] = int(self.cache_hit)
 
         # Create a subfolder in main results folder to store simulation results
         simresdir_abspath = os.path.join(self.resultsdir_abspath,
@@ -832,7 +1856,16 @@ class BPSJob(BPSProject):
         results_ext = self.config['resultfile_extensions']
         results_ext = results_ext.split(',')
         # Get list of paths to job results files
-        jobresfile_abspathlist = util.get_file_paths(results_ext, self.abspath)
+        index = util.DirIndex(self.abspath)
+        jobresfile_abspathlist = index.find(results_ext)
+        # Parse job results files before temporary folder is deleted, so
+        # that parsed results are sent back with run summary
+        if self.parse_inline:
+            start_time = time()
+            self.runsumdict['Results'] = parse_results(
+                (self.simtool, sorted(jobresfile_abspathlist)))
+            self.parsetime += time() - start_time
+        self.runsumdict['ParseTime(sec)'] = round(self.parsetime, 3)
 	    # Copy job results files to simulation results folder
         for jobresfile_abspath in jobresfile_abspathlist:
             copy(jobresfile_abspath, simresdir_abspath)
@@ -841,10 +1874,13 @@ class BPSJob(BPSProject):
         log_ext = self.config['logfile_extensions']
         log_ext = log_ext.split(',')
         # Get list of paths to job log files
-        joblogfile_abspathlist = util.get_file_paths(log_ext, self.abspath)
+        joblogfile_abspathlist = index.find(log_ext)
 	    # Copy log files to simulation results folder
         for joblogfile_abspath in joblogfile_abspathlist:
             copy(joblogfile_abspath, simresdir_abspath)
+        if self.tracing():
+            self.event_bytes = sum(os.path.getsize(f) for f in
+                jobresfile_abspathlist + joblogfile_abspathlist)
 
         # Remove temporary simulation folder
         util.tmp_dir('remove', self.abspath)
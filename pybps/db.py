@@ -0,0 +1,637 @@
+"""
+SQlite results database of batch simulation projects
+
+Jobs and results are stored in long format, so that tables keep the same
+columns whatever the parameters of samples and the variables of result files:
+
+- Series: one row per series of jobs
+- Jobs: one row per job, with the ID of its series and an integer key
+- JobParameters: one row per (job, parameter) pair
+- Variables: one row per result variable, with an integer key and the type
+  of its values ('integer', 'real' or 'text')
+- Results: one row per (job, result row, variable) triple, with the period
+  (month) of result row
+- RunSummary: one row per job, with one column per run summary item (columns
+  are added as new items show up)
+
+Results refer to jobs and variables through their integer keys, which keeps
+rows and the primary key index small. Each save is written in a single
+transaction, with bulk inserts. Databases are switched to WAL mode, so that
+batches can save their results while other processes query the database.
+"""
+
+# Common imports
+import os
+import sqlite3
+from itertools import compress, repeat
+from time import time
+
+# Third-party imports
+import numpy as np
+import pandas as pd
+
+# Handle Python 2/3 compatibility
+import six
+
+
+# Tables of database, with a column that tables created by older versions
+# (one wide table per DataFrame) lack
+SCHEMA = [
+    ('Series', 'SeriesID',
+     'CREATE TABLE IF NOT EXISTS Series (SeriesID TEXT PRIMARY KEY, '
+     'Project TEXT, SimTool TEXT, Timestamp REAL)'),
+    ('Jobs', 'JobKey',
+     'CREATE TABLE IF NOT EXISTS Jobs (JobKey INTEGER PRIMARY KEY, '
+     'JobID TEXT UNIQUE, SeriesID TEXT)'),
+    ('JobParameters', 'JobKey',
+     'CREATE TABLE IF NOT EXISTS JobParameters (JobKey INTEGER, '
+     'Parameter TEXT, Value, PRIMARY KEY (JobKey, Parameter)) WITHOUT ROWID'),
+    ('Variables', 'VariableKey',
+     'CREATE TABLE IF NOT EXISTS Variables (VariableKey INTEGER PRIMARY KEY, '
+     'Name TEXT UNIQUE, Type TEXT)'),
+    ('Results', 'VariableKey',
+     'CREATE TABLE IF NOT EXISTS Results (JobKey INTEGER, Row INTEGER, '
+     'Period TEXT, VariableKey INTEGER, Value, '
+     'PRIMARY KEY (JobKey, Row, VariableKey)) WITHOUT ROWID'),
+    ('RunSummary', 'SeriesID',
+     'CREATE TABLE IF NOT EXISTS RunSummary (JobID TEXT PRIMARY KEY, '
+     'SeriesID TEXT)'),
+]
+
+INDEXES = [
+    'CREATE INDEX IF NOT EXISTS ix_Jobs_SeriesID ON Jobs (SeriesID)',
+    'CREATE INDEX IF NOT EXISTS ix_Results_Period ON Results (Period)',
+    'CREATE INDEX IF NOT EXISTS ix_RunSummary_SeriesID ON RunSummary '
+    '(SeriesID)',
+]
+
+# Columns of result files holding the period of result rows
+PERIOD_COLUMNS = ['Month', 'Period']
+
+# DataFrame dtype of variables by type of their values (missing values are
+# allowed in all of them)
+VALUE_DTYPES = {'integer': 'Int64', 'real': 'float64', 'text': 'object'}
+
+# Value types, from narrowest to widest
+VALUE_TYPES = ['integer', 'real', 'text']
+
+
+def quote(name):
+    """Quote a column or table name for use in SQL statements"""
+
+    return '"%s"' % name.replace('"', '""')
+
+
+def table_columns(cnx, table):
+    """Get list of columns of a database table (empty if table not found)"""
+
+    return [row[1] for row in
+            cnx.execute('PRAGMA table_info(%s)' % quote(table))]
+
+
+def connect(db_abspath, timeout=60):
+    """Open connection to results database
+
+    The database is switched to WAL mode, in which readers do not block
+    writers (and conversely), and synced to disk at checkpoints only.
+    Transactions are managed explicitly (autocommit mode).
+
+    Args:
+        db_abspath: absolute path to SQlite database file
+        timeout: time in seconds to wait for other writers to commit
+
+    """
+
+    cnx = sqlite3.connect(db_abspath, timeout=timeout, isolation_level=None)
+    cnx.execute('PRAGMA journal_mode=WAL')
+    cnx.execute('PRAGMA synchronous=NORMAL')
+
+    return cnx
+
+
+def init_schema(cnx):
+    """Create tables and indexes of database, if not already there
+
+    Tables created by older versions (one wide table per DataFrame) are
+    renamed with a '_v1' suffix, and columns added since are added to
+    tables of the current layout.
+
+    Returns:
+        dict with name of renamed tables as key and their new name as value
+
+    """
+
+    renamed = {}
+    for table, marker, create in SCHEMA:
+        columns = table_columns(cnx, table)
+        if columns and marker not in columns:
+            legacy = table + '_v1'
+            n = 1
+            while table_columns(cnx, legacy):
+                n += 1
+                legacy = '%s_v1_%d' % (table, n)
+            cnx.execute('ALTER TABLE %s RENAME TO %s' % (quote(table),
+                                                         quote(legacy)))
+            renamed[table] = legacy
+        cnx.execute(create)
+    if 'Type' not in table_columns(cnx, 'Variables'):
+        cnx.execute('ALTER TABLE Variables ADD COLUMN Type TEXT')
+    for create in INDEXES:
+        cnx.execute(create)
+
+    return renamed
+
+
+def write(db_abspath, seriesID, jobs_df=None, results_df=None,
+          runsum_df=None, project=None, simtool=None):
+    """Save jobs, results and run summary of a series to results database
+
+    Everything is written in a single transaction. Jobs already found in
+    database are replaced.
+
+    Args:
+        db_abspath: absolute path to SQlite database file
+        seriesID: ID of series of jobs
+        jobs_df: DataFrame of jobs, with job ID as index and one column per
+            parameter
+        results_df: DataFrame of results, with a JobID column, an optional
+            period column (see PERIOD_COLUMNS) and one column per variable
+        runsum_df: DataFrame of run summaries, with a JobID column
+        project: path to project directory
+        simtool: name of simulation tool
+
+    Returns:
+        dict with name of tables of older versions renamed while saving as
+        key and their new name as value (see 'init_schema')
+
+    """
+
+    cnx = connect(db_abspath)
+    try:
+        # Take write lock at once, so that concurrent writers wait for it
+        # instead of failing when upgrading a read lock
+        cnx.execute('BEGIN IMMEDIATE')
+        try:
+            renamed = init_schema(cnx)
+            cnx.execute('INSERT OR REPLACE INTO Series VALUES (?, ?, ?, ?)',
+                        (seriesID, project, simtool, time()))
+            if jobs_df is not None:
+                write_jobs(cnx, seriesID, jobs_df)
+            if results_df is not None:
+                write_results(cnx, seriesID, results_df)
+            if runsum_df is not None:
+                write_runsum(cnx, seriesID, runsum_df)
+        except Exception:
+            cnx.execute('ROLLBACK')
+            raise
+        cnx.execute('COMMIT')
+    finally:
+        cnx.close()
+
+    return renamed
+
+
+def get_keys(cnx, table, key_col, name_col, names, extra=None):
+    """Get integer keys of names (job IDs or variable names), inserting
+    missing names into table
+
+    Args:
+        cnx: connection to database
+        table: name of table ('Jobs' or 'Variables')
+        key_col: name of key column
+        name_col: name of name column
+        names: list of names
+        extra: dict of values of other columns of inserted rows
+
+    Returns:
+        dict with name as key and integer key as value
+
+    """
+
+    extra = extra or {}
+    cols = [name_col] + sorted(extra)
+    cnx.executemany('INSERT OR IGNORE INTO %s (%s) VALUES (%s)' %
+                    (table, ', '.join(cols), ', '.join('?' * len(cols))),
+                    ((name,) + tuple(extra[c] for c in cols[1:])
+                     for name in names))
+    keys = {}
+    # Names are looked up by chunks, below SQlite's limit on the number of
+    # query parameters
+    names = list(names)
+    for i in range(0, len(names), 500):
+        chunk = names[i:i + 500]
+        keys.update((name, key) for (key, name) in cnx.execute(
+            'SELECT %s, %s FROM %s WHERE %s IN (%s)' %
+            (key_col, name_col, table, name_col, ', '.join('?' * len(chunk))),
+            chunk))
+
+    return keys
+
+
+def write_jobs(cnx, seriesID, jobs_df):
+    """Insert rows of jobs DataFrame into Jobs and JobParameters tables"""
+
+    jobIDs = [str(jobID) for jobID in jobs_df.index]
+    keys = get_keys(cnx, 'Jobs', 'JobKey', 'JobID', jobIDs,
+                    {'SeriesID': seriesID})
+    jobkeys = [keys[jobID] for jobID in jobIDs]
+    cnx.executemany('DELETE FROM JobParameters WHERE JobKey = ?',
+                    ((key,) for key in jobkeys))
+    for name in jobs_df.columns:
+        values = jobs_df[name]
+        cnx.executemany('INSERT INTO JobParameters VALUES (?, ?, ?)',
+                        compress(zip(jobkeys, repeat(str(name)),
+                                     values.tolist()),
+                                 values.notna().tolist()))
+
+
+def write_results(cnx, seriesID, results_df):
+    """Insert rows of results DataFrame into Results table, one row per
+    non-missing value
+
+    Values are inserted in primary key order, so that they are appended to
+    the table instead of being scattered over its pages.
+
+    """
+
+    period_col = None
+    for name in PERIOD_COLUMNS:
+        if name in results_df:
+            period_col = name
+            break
+    names = [str(name) for name in results_df.columns
+             if name not in ('JobID', period_col)]
+    jobIDs = results_df['JobID'].astype(str)
+    keys = get_keys(cnx, 'Jobs', 'JobKey', 'JobID', jobIDs.unique(),
+                    {'SeriesID': seriesID})
+    jobkeys = jobIDs.map(keys).to_numpy(dtype=np.int64)
+    varkeys = get_keys(cnx, 'Variables', 'VariableKey', 'Name', names)
+    names = sorted(names, key=varkeys.get)
+    write_types(cnx, varkeys, dict((str(name), value_type(results_df[name]))
+                                   for name in results_df.columns
+                                   if str(name) in varkeys))
+    rows = results_df.groupby('JobID', sort=False).cumcount().to_numpy()
+    order = np.lexsort((rows, jobkeys))
+    nvar = len(names)
+    if period_col is None:
+        periods = repeat(None)
+    else:
+        periods = np.repeat(results_df[period_col].astype(str).str.strip()
+                            .to_numpy(dtype=object)[order], nvar).tolist()
+    values = [results_df[name].to_numpy()[order].tolist() for name in names]
+    mask = results_df[names].notna().to_numpy()[order].ravel().tolist()
+
+    cnx.executemany('DELETE FROM Results WHERE JobKey = ?',
+                    ((int(key),) for key in np.unique(jobkeys)))
+    cnx.executemany('INSERT INTO Results VALUES (?, ?, ?, ?, ?)',
+                    compress(zip(np.repeat(jobkeys[order], nvar).tolist(),
+                                 np.repeat(rows[order], nvar).tolist(),
+                                 periods,
+                                 [varkeys[name] for name in names] *
+                                 len(order),
+                                 [x for row in zip(*values) for x in row]),
+                             mask))
+
+
+def value_type(values):
+    """Get type of values of a variable ('integer', 'real' or 'text')"""
+
+    if (pd.api.types.is_integer_dtype(values) or
+            pd.api.types.is_bool_dtype(values)):
+        return 'integer'
+    if pd.api.types.is_float_dtype(values):
+        return 'real'
+
+    return 'text'
+
+
+def write_types(cnx, varkeys, new_types):
+    """Record type of values of variables in Variables table
+
+    A variable saved with different types gets the widest one (an integer
+    variable saved with real values becomes real).
+
+    """
+
+    types = {}
+    keys = list(varkeys.values())
+    for i in range(0, len(keys), 500):
+        chunk = keys[i:i + 500]
+        types.update(cnx.execute(
+            'SELECT VariableKey, Type FROM Variables WHERE VariableKey ' +
+            'IN (%s)' % ', '.join('?' * len(chunk)), chunk))
+    updates = []
+    for name, key in varkeys.items():
+        new = new_types[name]
+        old = types.get(key)
+        if old in VALUE_TYPES and \
+                VALUE_TYPES.index(old) >= VALUE_TYPES.index(new):
+            continue
+        updates.append((new, key))
+    cnx.executemany('UPDATE Variables SET Type = ? WHERE VariableKey = ?',
+                    updates)
+
+
+def write_runsum(cnx, seriesID, runsum_df):
+    """Insert rows of run summary DataFrame into RunSummary table, adding
+    missing columns first"""
+
+    columns = table_columns(cnx, 'RunSummary')
+    names = [str(name) for name in runsum_df.columns
+             if name not in ('JobID', 'SeriesID')]
+    for name in names:
+        if name not in columns:
+            cnx.execute('ALTER TABLE RunSummary ADD COLUMN %s' % quote(name))
+    df = runsum_df[['JobID'] + names].astype(object)
+    df = df.where(df.notna(), None)
+    cnx.executemany('INSERT OR REPLACE INTO RunSummary (JobID, SeriesID%s) '
+                    % ''.join(', ' + quote(name) for name in names) +
+                    'VALUES (?, ?%s)' % (', ?' * len(names)),
+                    ((row[0], seriesID) + tuple(row[1:])
+                     for row in df.itertuples(index=False)))
+
+
+def value_clause(expr, value, params):
+    """Get SQL condition on an expression from a filter value
+
+    Args:
+        expr: SQL expression to be compared
+        value: value, (min, max) tuple (bounds included, None for no bound)
+            or list of values
+        params: list to which parameters of condition are appended
+
+    """
+
+    if isinstance(value, tuple):
+        low, high = value
+        clauses = []
+        if low is not None:
+            clauses.append('%s >= ?' % expr)
+            params.append(low)
+        if high is not None:
+            clauses.append('%s <= ?' % expr)
+            params.append(high)
+        return ' AND '.join(clauses) or '1'
+    elif isinstance(value, (list, set, frozenset)):
+        value = list(value)
+        params.extend(value)
+        return '%s IN (%s)' % (expr, ', '.join('?' * len(value)))
+    else:
+        params.append(value)
+        return '%s = ?' % expr
+
+
+def series_clause(expr, seriesID, params):
+    """Get SQL condition selecting one or several series"""
+
+    if isinstance(seriesID, six.string_types):
+        seriesID = [seriesID]
+
+    return value_clause(expr, list(seriesID), params)
+
+
+def open_db(db_abspath, tables):
+    """Open connection to results database if it holds all given tables
+    (None otherwise)"""
+
+    if not os.path.isfile(db_abspath):
+        return None
+    cnx = sqlite3.connect(db_abspath)
+    markers = dict((table, marker) for table, marker, create in SCHEMA)
+    for table in tables:
+        if markers[table] not in table_columns(cnx, table):
+            cnx.close()
+            return None
+
+    return cnx
+
+
+def pivot(rows, index, columns):
+    """Get wide DataFrame from long rows made of index values, other columns,
+    variable name and value"""
+
+    df = pd.DataFrame(rows, columns=index + columns + ['Variable', 'Value'])
+    wide = df.pivot(index=index, columns='Variable', values='Value')
+    wide.columns.name = None
+    wide = wide.infer_objects()
+    if columns:
+        wide = df.drop_duplicates(index).set_index(index)[columns].join(wide)
+
+    return wide.reset_index()
+
+
+def read_pivot(cnx, sql_query, params, nindex, chunksize, to_frame):
+    """Run a query returning long rows sorted by their nindex first columns
+    and get them as one wide DataFrame, or an iterator of DataFrames of at
+    most chunksize wide rows
+
+    Connection is closed once all rows have been read.
+
+    """
+
+    cur = cnx.execute(sql_query, params)
+    if chunksize is None:
+        try:
+            return to_frame(cur.fetchall())
+        finally:
+            cnx.close()
+
+    def chunks():
+        try:
+            buf = []
+            nkey = 0
+            last = None
+            while True:
+                rows = cur.fetchmany(10000)
+                if not rows:
+                    break
+                for row in rows:
+                    key = row[:nindex]
+                    if key != last:
+                        if nkey == chunksize:
+                            yield to_frame(buf)
+                            buf = []
+                            nkey = 0
+                        nkey += 1
+                        last = key
+                    buf.append(row)
+            if buf:
+                yield to_frame(buf)
+        finally:
+            cnx.close()
+
+    return chunks()
+
+
+def load_jobs(db_abspath, seriesID=None, params=None, chunksize=None):
+    """Get jobs from results database, with one column per parameter
+
+    Args:
+        db_abspath: absolute path to SQlite database file
+        seriesID: ID or list of IDs of series (by default, all series)
+        params: dict with parameter name as key and filter value as value
+            (see 'value_clause')
+        chunksize: if given, an iterator over DataFrames of at most chunksize
+            jobs is returned. All DataFrames have one column per parameter
+            found in database, even if their jobs lack some of them
+
+    Returns:
+        pandas DataFrame (or iterator of DataFrames) with JobID as index, or
+        None if database holds no jobs
+
+    """
+
+    cnx = open_db(db_abspath, ['Jobs', 'JobParameters'])
+    if cnx is None:
+        return None
+    clauses = []
+    sql_params = []
+    if seriesID is not None:
+        clauses.append(series_clause('j.SeriesID', seriesID, sql_params))
+    for name, value in sorted((params or {}).items()):
+        sql_params.append(name)
+        clauses.append('EXISTS (SELECT 1 FROM JobParameters f WHERE ' +
+                       'f.JobKey = j.JobKey AND f.Parameter = ? AND ' +
+                       value_clause('f.Value', value, sql_params) + ')')
+    sql_query = ('SELECT j.JobID, p.Parameter, p.Value FROM Jobs j ' +
+                 'JOIN JobParameters p ON p.JobKey = j.JobKey')
+    if clauses:
+        sql_query += ' WHERE ' + ' AND '.join(clauses)
+    sql_query += ' ORDER BY j.JobID'
+
+    if chunksize is not None:
+        names = [name for (name,) in cnx.execute(
+            'SELECT DISTINCT Parameter FROM JobParameters ORDER BY Parameter')]
+
+    def to_frame(rows):
+        df = pivot(rows, ['JobID'], []).set_index('JobID')
+        if chunksize is not None:
+            df = df.reindex(columns=names)
+
+        return df
+
+    return read_pivot(cnx, sql_query, sql_params, 1, chunksize, to_frame)
+
+
+def load_results(db_abspath, seriesID=None, periods=None, variables=None,
+                 filters=None, chunksize=None):
+    """Get results from results database, with one column per variable
+
+    Args:
+        db_abspath: absolute path to SQlite database file
+        seriesID: ID or list of IDs of series (by default, all series)
+        periods: period (month) or list of periods of result rows
+        variables: list of variables to be returned (by default, all
+            variables)
+        filters: dict with variable name as key and filter value as value
+            (see 'value_clause'); only result rows whose variables pass all
+            filters are returned
+        chunksize: if given, an iterator over DataFrames of at most chunksize
+            result rows is returned. All DataFrames have one column per
+            selected variable, even if their rows lack some of them
+
+    Returns:
+        pandas DataFrame (or iterator of DataFrames) with SeriesID, JobID and
+        Period columns, or None if database holds no results. Variables
+        whose values are integers get the nullable 'Int64' dtype
+
+    """
+
+    cnx = open_db(db_abspath, ['Jobs', 'Variables', 'Results'])
+    if cnx is None:
+        return None
+    if 'Type' in table_columns(cnx, 'Variables'):
+        variable_rows = cnx.execute('SELECT VariableKey, Name, Type ' +
+                                    'FROM Variables').fetchall()
+    else:
+        variable_rows = [(key, name, None) for (key, name) in
+                         cnx.execute('SELECT VariableKey, Name FROM Variables')]
+    varnames = dict((key, name) for (key, name, vtype) in variable_rows)
+    varkeys = dict((name, key) for key, name in varnames.items())
+    # Type of values of each variable, recorded when results were saved, so
+    # that it does not depend on the values found in each chunk (dtype is
+    # left to pandas for variables saved by older versions)
+    dtypes = dict((name, VALUE_DTYPES[vtype])
+                  for (key, name, vtype) in variable_rows
+                  if vtype in VALUE_DTYPES)
+    job_clauses = []
+    job_params = []
+    if seriesID is not None:
+        job_clauses.append(series_clause('j.SeriesID', seriesID, job_params))
+    clauses = list(job_clauses)
+    sql_params = list(job_params)
+    if periods is not None:
+        if isinstance(periods, tuple):
+            periods = list(periods)
+        clauses.append(value_clause('r.Period', periods, sql_params))
+    if variables is not None:
+        clauses.append(value_clause('r.VariableKey',
+                                    [varkeys[name] for name in variables
+                                     if name in varkeys], sql_params))
+    for name, value in sorted((filters or {}).items()):
+        sql_params.append(varkeys.get(name))
+        clauses.append('EXISTS (SELECT 1 FROM Results f WHERE ' +
+                       'f.JobKey = r.JobKey AND f.Row = r.Row AND ' +
+                       'f.VariableKey = ? AND ' +
+                       value_clause('f.Value', value, sql_params) + ')')
+    where = ' WHERE ' + ' AND '.join(clauses) if clauses else ''
+    selected = ([varkeys[name] for name in variables if name in varkeys]
+                if variables is not None else sorted(varnames))
+    # Rows are read with integer keys, in key order (which the jobs index
+    # provides without sorting), and names are joined afterwards
+    jobs = pd.read_sql_query('SELECT j.JobKey, j.SeriesID, j.JobID ' +
+                             'FROM Jobs j' + (' WHERE ' +
+                             ' AND '.join(job_clauses) if job_clauses
+                             else ''), cnx, params=job_params,
+                             index_col='JobKey')
+    sql_query = ('SELECT r.JobKey, r.Row, r.Period, r.VariableKey, ' +
+                 'r.Value FROM Jobs j JOIN Results r ON r.JobKey = j.JobKey' +
+                 where + ' ORDER BY j.JobKey, r.Row')
+
+    def to_frame(rows):
+        df = pivot(rows, ['JobKey', 'Row'], ['Period'])
+        df = df.rename(columns=varnames)
+        if chunksize is not None:
+            df = df.reindex(columns=['JobKey', 'Row', 'Period'] +
+                            [varnames[key] for key in selected])
+        for name in df.columns:
+            if name in dtypes:
+                df[name] = df[name].astype(dtypes[name])
+        df = jobs.join(df.set_index('JobKey'), how='inner')
+
+        return df.drop('Row', axis=1).reset_index(drop=True)
+
+    return read_pivot(cnx, sql_query, sql_params, 2, chunksize, to_frame)
+
+
+def load_runsum(db_abspath, seriesID=None, columns=None):
+    """Get run summaries from results database
+
+    Args:
+        db_abspath: absolute path to SQlite database file
+        seriesID: ID or list of IDs of series (by default, all series)
+        columns: list of columns to be returned, if found in table (by
+            default, all columns)
+
+    Returns:
+        pandas DataFrame, or None if database holds no run summaries
+
+    """
+
+    cnx = open_db(db_abspath, ['RunSummary'])
+    if cnx is None:
+        return None
+    try:
+        select = '*'
+        if columns is not None:
+            found = table_columns(cnx, 'RunSummary')
+            select = ', '.join(quote(name) for name in columns
+                               if name in found)
+        params = []
+        sql_query = 'SELECT %s FROM RunSummary' % select
+        if seriesID is not None:
+            sql_query += ' WHERE ' + series_clause('SeriesID', seriesID,
+                                                   params)
+        return pd.read_sql_query(sql_query, cnx, params=params)
+    finally:
+        cnx.close()
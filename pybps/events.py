@@ -0,0 +1,149 @@
+"""
+Instrumentation of the simulation job lifecycle
+
+Methods decorated with 'traced' emit an event before and after they are
+called, with timing and byte count, to the event sinks attached to a
+BPSProject instance (see 'add_sink' method). Jobs run in worker processes
+collect their events, which are sent back with their run summary and handed
+to sinks by the main process. Nothing is recorded when no sink is attached.
+"""
+
+# Common imports
+import os
+import json
+from functools import wraps
+from time import time
+
+
+def traced(name):
+    """Decorator of BPSProject/BPSJob methods emitting events named 'name'
+    before and after each call
+
+    The decorated method may store the number of bytes it processed in the
+    'event_bytes' attribute of its instance, which is reported in the 'after'
+    event.
+
+    """
+
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if not self.tracing():
+                return method(self, *args, **kwargs)
+            self.event_bytes = None
+            start_time = time()
+            self.emit({'name': name, 'when': 'before', 'time': start_time})
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                end_time = time()
+                self.emit({'name': name, 'when': 'after', 'time': end_time,
+                           'start': start_time,
+                           'duration': end_time - start_time,
+                           'bytes': self.event_bytes})
+        return wrapper
+
+    return decorator
+
+
+def tree_size(dir_abspath):
+    """Get total size in bytes of files found in a directory tree"""
+
+    size = 0
+    for root, dirs, files in os.walk(dir_abspath):
+        for name in files:
+            size += os.path.getsize(os.path.join(root, name))
+
+    return size
+
+
+
+class EventSink(object):
+    """Base class of event sinks
+
+    Events are dicts with the following keys:
+        name: name of traced method ('prepare', 'preprocess', 'run',
+            'close', 'results2df' or 'save2db')
+        when: 'before' or 'after' method call
+        time: timestamp of event (seconds since epoch)
+        job: JobID of job that emitted event (None for project events)
+        pid: ID of process that emitted event
+        tid: ID of worker that emitted event within process (worker slot of
+            asyncio engine, same as pid for other engines)
+    'after' events also hold the following keys:
+        start: timestamp of method call
+        duration: duration of method call in seconds
+        bytes: number of bytes processed by method (None if not measured)
+
+    """
+
+    def handle(self, event):
+        """Handle an event"""
+        pass
+
+
+    def close(self):
+        """Flush and release resources held by sink"""
+        pass
+
+
+
+class ChromeTraceSink(EventSink):
+    """Event sink writing a Chrome trace event file, which shows all jobs of
+    a batch run on a timeline (open it in chrome://tracing or Perfetto).
+
+    Events are written as soon as they are handled, in the JSON array format
+    of trace event files. The closing bracket is written by 'close', but
+    trace viewers also accept files where it is missing.
+
+    """
+
+    def __init__(self, file_abspath):
+        """Initialization of ChromeTraceSink Class
+
+        Args:
+            file_abspath: absolute path to trace file
+
+        """
+
+        self.file_abspath = file_abspath
+        self.f = open(file_abspath, 'w')
+        self.f.write('[')
+        self.pids = set()
+        self.tids = set()
+        self.count = 0
+
+
+    def handle(self, event):
+        if event['when'] != 'after':
+            return
+        pid = event['pid']
+        tid = event.get('tid', pid)
+        if pid not in self.pids:
+            self.pids.add(pid)
+            self._write({'name': 'process_name', 'ph': 'M', 'pid': pid,
+                         'tid': pid, 'args': {'name': 'pid %d' % pid}})
+        if tid != pid and (pid, tid) not in self.tids:
+            self.tids.add((pid, tid))
+            self._write({'name': 'thread_name', 'ph': 'M', 'pid': pid,
+                         'tid': tid, 'args': {'name': 'worker %d' % tid}})
+        args = {}
+        if event.get('job') is not None:
+            args['job'] = event['job']
+        if event.get('bytes') is not None:
+            args['bytes'] = event['bytes']
+        self._write({'name': event['name'], 'cat': 'pybps', 'ph': 'X',
+                     'ts': int(event['start'] * 1e6),
+                     'dur': int(event['duration'] * 1e6),
+                     'pid': pid, 'tid': tid, 'args': args})
+
+
+    def _write(self, trace_event):
+        self.f.write((',\n' if self.count else '\n') + json.dumps(trace_event))
+        self.count += 1
+
+
+    def close(self):
+        if not self.f.closed:
+            self.f.write('\n]\n')
+            self.f.close()
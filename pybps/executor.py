@@ -0,0 +1,346 @@
+"""
+Executors running simulation jobs for BPSProject.run
+
+An executor accepts jobs through its 'submit' method, which returns a task
+handle with 'ready' and 'get' methods (as multiprocessing AsyncResult). The
+default executor runs jobs in a local multiprocessing pool. FileQueueExecutor
+dispatches jobs to worker daemons (see 'run_worker' function), possibly run
+on other machines, through a work queue kept in a shared directory.
+"""
+
+# Common imports
+import os
+import sys
+import pickle
+import socket
+import threading
+from multiprocessing import Pool
+from time import time, sleep
+
+# Custom imports
+from pybps import util
+
+
+# Sub-folders of work queue directory
+QUEUE_DIRS = ['pending', 'leased', 'done', 'tmp', 'workers']
+
+
+class Executor(object):
+    """Base class of executors"""
+
+    # Number of jobs run at a time (None if unknown)
+    ncore = None
+
+    def submit(self, func, job):
+        """Submit a job to be run by func
+
+        Returns:
+            Task handle with 'ready' and 'get' methods
+
+        """
+        raise NotImplementedError
+
+
+    def ready(self, tasks):
+        """Get tasks that ended among a list of task handles"""
+
+        return [task for task in tasks if task.ready()]
+
+
+    def close(self):
+        """Wait for submitted jobs to end and release executor resources"""
+        pass
+
+
+
+class PoolExecutor(Executor):
+    """Executor running jobs in a local multiprocessing pool"""
+
+    def __init__(self, ncore=None):
+        """Initialization of PoolExecutor Class
+
+        Args:
+            ncore: number of processes of pool (by default, number of local
+                cores)
+
+        """
+
+        self.pool = Pool(ncore)
+        self.ncore = ncore
+
+
+    def __str__(self):
+        return 'local pool'
+
+
+    def submit(self, func, job):
+        return self.pool.apply_async(func, (job,))
+
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+
+
+
+class FileQueueTask(object):
+    """Handle of a job submitted to a FileQueueExecutor"""
+
+    def __init__(self, executor, task_id):
+        self.executor = executor
+        self.task_id = task_id
+        self.done_abspath = os.path.join(executor.abspath, 'done',
+                                         task_id + '.pkl')
+
+
+    def ready(self):
+        return self in self.executor.ready([self])
+
+
+    def get(self):
+        with open(self.done_abspath, 'rb') as f:
+            status, value = pickle.load(f)
+        os.remove(self.done_abspath)
+        if status == 'error':
+            raise RuntimeError('Job failed on worker: %s' % value)
+
+        return value
+
+
+
+class FileQueueExecutor(Executor):
+    """Executor dispatching jobs to worker daemons through a work queue kept
+    in a shared directory
+
+    Each job is pickled to a file of the 'pending' sub-folder. A worker
+    leases a job by moving its file to the 'leased' sub-folder (only one
+    worker can succeed) and keeps updating the modification time of the file
+    while the job runs (heartbeat). The result is written to the 'done'
+    sub-folder. Leases whose heartbeat stopped for more than 'lease_timeout'
+    seconds (worker died) are moved back to the 'pending' sub-folder.
+
+    Project, jobs and results folders must be found at the same paths on all
+    machines running workers. Workers unpickle and run whatever is found in
+    the 'pending' sub-folder, so that only trusted users should have write
+    access to the work queue directory.
+
+    """
+
+    def __init__(self, queue_abspath, ncore=None, lease_timeout=60):
+        """Initialization of FileQueueExecutor Class
+
+        Args:
+            queue_abspath: absolute path to work queue directory
+            ncore: maximum number of jobs in queue at a time (by default, all
+                jobs are queued at once)
+            lease_timeout: time in seconds after which a lease with no
+                heartbeat is considered lost
+
+        """
+
+        self.abspath = queue_abspath
+        self.ncore = ncore
+        self.lease_timeout = lease_timeout
+        init_queue(queue_abspath)
+        # Tasks are identified by a session ID and a counter, so that they
+        # are run in submission order
+        self.session = '%d_%s' % (time(), util.random_str(6))
+        self.count = 0
+        self.last_check = 0
+
+
+    def __str__(self):
+        return 'work queue %s' % self.abspath
+
+
+    def submit(self, func, job):
+        task_id = '%s_%08d' % (self.session, self.count)
+        self.count += 1
+        tmp_abspath = os.path.join(self.abspath, 'tmp', task_id + '.pkl')
+        with open(tmp_abspath, 'wb') as f:
+            pickle.dump((func, job), f, 2)
+        os.rename(tmp_abspath, os.path.join(self.abspath, 'pending',
+                                            task_id + '.0.pkl'))
+
+        return FileQueueTask(self, task_id)
+
+
+    def ready(self, tasks):
+        """Get tasks that ended among a list of task handles, listing the
+        'done' sub-folder once (rather than checking each task)"""
+
+        self.requeue_expired()
+        done = set(os.listdir(os.path.join(self.abspath, 'done')))
+
+        return [task for task in tasks if task.task_id + '.pkl' in done]
+
+
+    def requeue_expired(self):
+        """Move leases with no recent heartbeat back to pending jobs
+        (checked at most once per second)"""
+
+        if time() - self.last_check < 1:
+            return
+        self.last_check = time()
+        leased_abspath = os.path.join(self.abspath, 'leased')
+        for name in os.listdir(leased_abspath):
+            lease_abspath = os.path.join(leased_abspath, name)
+            try:
+                expired = (time() - os.path.getmtime(lease_abspath) >
+                           self.lease_timeout)
+            except OSError:
+                continue
+            if not expired:
+                continue
+            task_id, nlease, ext = name.rsplit('.', 2)
+            if os.path.exists(os.path.join(self.abspath, 'done',
+                                           task_id + '.pkl')):
+                continue
+            try:
+                os.rename(lease_abspath, os.path.join(self.abspath, 'pending',
+                          '%s.%d.pkl' % (task_id, int(nlease) + 1)))
+                print("Lease of task %s expired, job requeued" % task_id)
+            except OSError:
+                pass
+
+
+    def close(self):
+        # Remove jobs of current session that were never leased
+        pending_abspath = os.path.join(self.abspath, 'pending')
+        for name in os.listdir(pending_abspath):
+            if name.startswith(self.session):
+                try:
+                    os.remove(os.path.join(pending_abspath, name))
+                except OSError:
+                    pass
+
+
+
+def init_queue(queue_abspath):
+    """Create work queue directory and its sub-folders"""
+
+    for name in QUEUE_DIRS:
+        dir_abspath = os.path.join(queue_abspath, name)
+        if not os.path.isdir(dir_abspath):
+            try:
+                os.makedirs(dir_abspath)
+            except OSError:
+                # Created in the meantime by another process
+                pass
+
+
+def stop_workers(queue_abspath):
+    """Ask all workers of a work queue to stop once their current job ends
+
+    Workers started later are not affected.
+
+    """
+
+    open(os.path.join(queue_abspath, 'STOP'), 'w').close()
+
+
+def run_worker(queue_abspath, heartbeat=10, poll=1, idle_timeout=None):
+    """Run jobs found in a work queue until asked to stop
+
+    Jobs are unpickled from files of the work queue directory and run, so
+    that anyone with write access to this directory can run code with the
+    rights of the worker. Only use work queue directories that untrusted
+    users can not write to.
+
+    Args:
+        queue_abspath: absolute path to work queue directory
+        heartbeat: interval in seconds between updates of lease files
+        poll: interval in seconds between checks for pending jobs
+        idle_timeout: if given, worker stops after this number of seconds
+            without any pending job
+
+    """
+
+    init_queue(queue_abspath)
+    worker_id = '%s_%d' % (socket.gethostname(), os.getpid())
+    worker_abspath = os.path.join(queue_abspath, 'workers', worker_id)
+    pending_abspath = os.path.join(queue_abspath, 'pending')
+    stop_abspath = os.path.join(queue_abspath, 'STOP')
+    print("Worker %s waiting for jobs in %s" % (worker_id, queue_abspath))
+    start_time = idle_start = time()
+
+    def stopped():
+        try:
+            return os.path.getmtime(stop_abspath) >= start_time
+        except OSError:
+            return False
+
+    while not stopped():
+        # Register worker as alive
+        open(worker_abspath, 'w').close()
+        lease = None
+        for name in sorted(os.listdir(pending_abspath)):
+            lease_abspath = os.path.join(queue_abspath, 'leased', name)
+            try:
+                os.rename(os.path.join(pending_abspath, name), lease_abspath)
+            except OSError:
+                # Job leased by another worker
+                continue
+            # Lease is renewed from now on
+            os.utime(lease_abspath, None)
+            lease = (name, lease_abspath)
+            break
+        if lease is None:
+            if idle_timeout is not None and time() - idle_start > idle_timeout:
+                break
+            sleep(poll)
+            continue
+        run_task(queue_abspath, lease[0], lease[1], heartbeat)
+        idle_start = time()
+
+    try:
+        os.remove(worker_abspath)
+    except OSError:
+        pass
+    print("Worker %s stopped" % worker_id)
+
+
+def run_task(queue_abspath, name, lease_abspath, heartbeat):
+    """Run a leased job and write its result to the 'done' sub-folder"""
+
+    task_id, nlease, ext = name.rsplit('.', 2)
+    stop = threading.Event()
+
+    def beat():
+        while not stop.wait(heartbeat):
+            try:
+                os.utime(lease_abspath, None)
+            except OSError:
+                # Lease was requeued
+                return
+    thread = threading.Thread(target=beat)
+    thread.daemon = True
+    thread.start()
+
+    try:
+        with open(lease_abspath, 'rb') as f:
+            func, job = pickle.load(f)
+        # Worker holding a previous lease of the same job may still be
+        # running it (stalled heartbeat), so that job is run in its own
+        # folder
+        if int(nlease) > 0:
+            job.set_attempt(job.attempt, lease=int(nlease))
+        result = ('ok', func(job))
+    except Exception:
+        result = ('error', str(sys.exc_info()[1]))
+    finally:
+        stop.set()
+        thread.join()
+
+    # Result is only written if lease is still held, so that a requeued job
+    # gets a single result
+    try:
+        os.remove(lease_abspath)
+    except OSError:
+        print("Lease of task %s lost, result discarded" % task_id)
+        return
+    tmp_abspath = os.path.join(queue_abspath, 'tmp', task_id + '.done')
+    with open(tmp_abspath, 'wb') as f:
+        pickle.dump(result, f, 2)
+    os.rename(tmp_abspath, os.path.join(queue_abspath, 'done',
+                                        task_id + '.pkl'))
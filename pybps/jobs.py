@@ -0,0 +1,267 @@
+"""
+Lazy sample and job lists of batch simulation projects
+
+The sample is kept as one array per parameter and jobs as an array of sample
+row indices, so that memory use does not grow with the number of dicts or
+objects created per job. A BPSJob instance is only created when a job is
+about to be run (see 'JobList' class).
+"""
+
+# Common imports
+import numpy as np
+import pandas as pd
+
+
+def _native(value):
+    """Convert NumPy scalar to the equivalent Python object"""
+
+    return value.item() if isinstance(value, np.generic) else value
+
+
+
+class Sample(object):
+    """Sample of parameter values, stored column-wise
+
+    Rows are read as dicts holding all parameters of a job, as the list of
+    dicts previously built from the sample file. Since these dicts are built
+    on the fly, editing them does not change the sample: values are changed
+    with the 'set_value' method, or by assigning a dict to a row.
+
+    """
+
+    def __init__(self, columns, constants=None):
+        """Initialization of Sample Class
+
+        Args:
+            columns: dict with parameter name as key and NumPy array of
+                parameter values (one per job) as value
+            constants: dict of parameters that take the same value for all
+                jobs (e.g. 'ModelFile' and 'SampleFile')
+
+        """
+
+        self.columns = columns
+        self.constants = dict(constants or {})
+        self.nrow = len(next(iter(columns.values()))) if columns else 0
+
+
+    @classmethod
+    def from_df(cls, df, constants=None):
+        """Create sample from pandas DataFrame (one row per job)"""
+
+        return cls(dict((name, df[name].to_numpy()) for name in df.columns),
+                   constants)
+
+
+    @classmethod
+    def read_csv(cls, file_abspath, constants=None):
+        """Read sample from CSV file
+
+        Args:
+            file_abspath: absolute path to sample file
+            constants: dict of parameters added to all jobs
+
+        """
+
+        return cls.from_df(pd.read_csv(file_abspath), constants)
+
+
+    def __len__(self):
+        return self.nrow
+
+
+    def __getitem__(self, row):
+        if not -self.nrow <= row < self.nrow:
+            raise IndexError('sample row out of range')
+        values = dict(self.constants)
+        for name, column in self.columns.items():
+            values[name] = _native(column[row])
+
+        return values
+
+
+    def __setitem__(self, row, values):
+        """Set parameter values of a sample row from a dict (parameters
+        missing from dict keep their value)"""
+
+        for name, value in values.items():
+            self.set_value(row, name, value)
+
+
+    def __iter__(self):
+        for row in range(self.nrow):
+            yield self[row]
+
+
+    def set_value(self, row, name, value):
+        """Set value of a parameter in a sample row
+
+        A constant parameter becomes a column when one of its values is
+        changed, and a new parameter is missing (NaN) in other rows. Columns
+        are converted to a type that can hold the new value if needed.
+
+        Args:
+            row: sample row index
+            name: parameter name
+            value: parameter value
+
+        """
+
+        if not -self.nrow <= row < self.nrow:
+            raise IndexError('sample row out of range')
+        column = self.columns.get(name)
+        if column is None:
+            if name in self.constants:
+                column = np.full(self.nrow, self.constants.pop(name),
+                                 dtype=object)
+            else:
+                column = np.full(self.nrow, np.nan, dtype=object)
+        dtype = np.asarray(value).dtype
+        if column.dtype != object and column.dtype != dtype:
+            if 'O' in (column.dtype.kind, dtype.kind) or \
+                    not (column.dtype.kind in 'biuf' and dtype.kind in 'biuf'):
+                dtype = np.dtype(object)
+            else:
+                dtype = np.result_type(column.dtype, dtype)
+            column = column.astype(dtype)
+        elif not column.flags.writeable:
+            # Column shares its data with the DataFrame sample was read from
+            column = column.copy()
+        column[row] = value
+        self.columns[name] = column
+
+
+    def frame(self, rows=None):
+        """Get sample rows as pandas DataFrame
+
+        Args:
+            rows: array of row indices (by default, all rows)
+
+        """
+
+        if rows is None:
+            rows = np.arange(self.nrow)
+        df = pd.DataFrame(dict((name, column[rows]) for name, column in
+                               self.columns.items()))
+        for name, value in self.constants.items():
+            df[name] = value
+
+        return df
+
+
+
+class JobRecord(object):
+    """Lightweight record of a simulation job: job ID and sample row"""
+
+    __slots__ = ('jobID', 'row')
+
+    def __init__(self, jobID, row):
+        self.jobID = jobID
+        self.row = row
+
+
+    def __repr__(self):
+        return 'JobRecord(%r, %d)' % (self.jobID, self.row)
+
+
+
+class JobList(object):
+    """List of simulation jobs of a BPSProject, stored as an array of sample
+    row indices
+
+    Iterating over a JobList (or indexing it with an integer) creates BPSJob
+    instances on the fly, from the attributes that the project has at that
+    time. Use the 'records' method to go through jobs without creating them.
+
+    """
+
+    def __init__(self, project, rows, job_class):
+        """Initialization of JobList Class
+
+        Args:
+            project: BPSProject instance jobs belong to
+            rows: array of sample row indices, in job order
+            job_class: class of created jobs, called as
+                job_class(project, jobID, row)
+
+        """
+
+        self.project = project
+        self.rows = np.asarray(rows, dtype=np.int64)
+        self.job_class = job_class
+
+
+    def __len__(self):
+        return len(self.rows)
+
+
+    def __iter__(self):
+        for record in self.records():
+            yield self.job_class(self.project, self.project.startJobID +
+                                 record.row, record.row)
+
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.take(self.rows[index], rows=True)
+        row = int(self.rows[index])
+
+        return self.job_class(self.project, self.project.startJobID + row,
+                              row)
+
+
+    def take(self, indices, rows=False):
+        """Get JobList of a subset of jobs
+
+        Args:
+            indices: positions of jobs in current list (or sample row
+                indices if rows is True), in new job order
+
+        """
+
+        return JobList(self.project,
+                       indices if rows else self.rows[np.asarray(indices,
+                                                                 dtype=np.int64)],
+                       self.job_class)
+
+
+    def jobIDs(self):
+        """Get array of job IDs prefixed with series ID"""
+
+        numbers = (self.project.startJobID + self.rows).astype(str)
+
+        return np.char.add(self.project.seriesID + '_',
+                           np.char.zfill(numbers, 5)).astype(object)
+
+
+    def records(self):
+        """Iterate over jobs as JobRecord instances"""
+
+        start = self.project.startJobID
+        for row in self.rows:
+            yield JobRecord('%0*d' % (5, start + row), int(row))
+
+
+    def exclude(self, jobIDs):
+        """Get JobList without the jobs whose ID (prefixed with series ID) is
+        found in jobIDs"""
+
+        if not jobIDs:
+            return self
+        keep = ~np.isin(self.jobIDs(), list(jobIDs))
+
+        return self.take(np.flatnonzero(keep))
+
+
+    def frame(self):
+        """Get parameters of jobs as pandas DataFrame, with job ID (prefixed
+        with series ID) as index and sorted columns"""
+
+        sample = self.project.sample
+        if isinstance(sample, Sample):
+            df = sample.frame(self.rows)
+        else:
+            df = pd.DataFrame([sample[row] for row in self.rows])
+        df.index = self.jobIDs()
+
+        return df[sorted(df.columns)]
@@ -0,0 +1,126 @@
+"""
+Persistent ledger of simulation jobs, used to resume interrupted batch runs
+"""
+
+# Common imports
+import sqlite3
+from time import time
+
+
+def get_status(runsumdict):
+    """Get ledger status of a simulation job from its run summary
+
+    Returns:
+        'ok' if job ended without errors, 'failed' if job failed, timed out
+        or its log reports errors, and 'aborted' if job attempt was
+        cancelled or its log holds no error count (simulation interrupted
+        or log summary not found)
+
+    """
+
+    status = runsumdict.get('Status', 'ok')
+    if status in ('failed', 'timeout'):
+        return 'failed'
+    if status != 'ok':
+        return 'aborted'
+    if 'Errors' in runsumdict:
+        errors = runsumdict['Errors']
+        if errors is None:
+            return 'aborted'
+        if errors:
+            return 'failed'
+
+    return 'ok'
+
+
+
+class JobLedger(object):
+    """Class that records the run summary of every simulation job as soon as
+    it returns, in a table of the SQlite results database
+
+    Each record holds an explicit status (see 'get_status' function), and
+    only jobs recorded with 'ok' status are considered completed.
+
+    """
+
+    def __init__(self, db_abspath, table='JobLedger'):
+        """Initialization of JobLedger Class
+
+        Args:
+            db_abspath: absolute path to SQlite database file
+            table: name of ledger table in database
+
+        """
+
+        self.db_abspath = db_abspath
+        self.table = table
+        # Wait for batches saving their results to the same database
+        self.cnx = sqlite3.connect(db_abspath, timeout=60)
+        self.cnx.execute("CREATE TABLE IF NOT EXISTS %s (" % self.table +
+            "JobID TEXT PRIMARY KEY, SeriesID TEXT, Message TEXT, " +
+            "Warnings INTEGER, Errors INTEGER, SimulTime REAL, " +
+            "Timestamp REAL, Status TEXT)")
+        # Ledgers created by older versions have no status: their jobs are
+        # not considered completed
+        columns = [row[1] for row in self.cnx.execute(
+            "PRAGMA table_info(%s)" % self.table)]
+        if 'Status' not in columns:
+            self.cnx.execute("ALTER TABLE %s ADD COLUMN Status TEXT" %
+                             self.table)
+        self.cnx.execute("CREATE INDEX IF NOT EXISTS idx_%s_SeriesID " %
+            self.table + "ON %s (SeriesID)" % self.table)
+        self.cnx.commit()
+
+
+    def record(self, runsumdict):
+        """Record run summary of a simulation job
+
+        Any previous record for the same job is replaced.
+
+        Args:
+            runsumdict: run summary dict returned by a simulation job
+
+        """
+
+        jobID = runsumdict['JobID']
+        self.cnx.execute("INSERT OR REPLACE INTO %s " % self.table +
+            "(JobID, SeriesID, Message, Warnings, Errors, SimulTime, " +
+            "Timestamp, Status) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (jobID, jobID.split('_')[0], runsumdict.get('Message'),
+             runsumdict.get('Warnings'), runsumdict.get('Errors'),
+             runsumdict.get('SimulTime(sec)'), time(),
+             get_status(runsumdict)))
+        self.cnx.commit()
+
+
+    def completed(self, seriesID):
+        """Get run summaries of jobs of a series recorded with 'ok' status
+
+        Args:
+            seriesID: ID of series of jobs
+
+        Returns:
+            dict with JobID as key and run summary dict as value
+
+        """
+
+        cur = self.cnx.execute("SELECT JobID, Message, Warnings, Errors, " +
+            "SimulTime FROM %s " % self.table +
+            "WHERE SeriesID = ? AND Status = 'ok'",
+            (seriesID,))
+        runsumdicts = {}
+        for (jobID, message, warnings, errors, simtime) in cur:
+            runsumdict = {'JobID': jobID, 'SimulTime(sec)': simtime}
+            if message is not None:
+                runsumdict['Message'] = message
+                runsumdict['Warnings'] = warnings
+                runsumdict['Errors'] = errors
+            runsumdicts[jobID] = runsumdict
+
+        return runsumdicts
+
+
+    def close(self):
+        """Close connection to database"""
+
+        self.cnx.close()
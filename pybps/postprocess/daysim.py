@@ -3,10 +3,181 @@ A set of functions required to post-process DAYSIM simulation output files
 """
 
 
-import csv
+import io
 import re
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from pybps.postprocess.extract import Field, FieldExtractor
+
+
+# Short names of metrics found in DAYSIM DA files
+DA_METRICS = {'Daylight Autonomy': 'DA',
+              'Continuous Daylight Autonomy': 'DAcon',
+              'DA_max': 'DAmax',
+              'Daylight Saturation Potential': 'DSP'}
+
+# Fields extracted from DAYSIM electric lighting result file
+EL_LIGHTING_FIELDS = FieldExtractor([
+    # Lighting power density
+    Field('POWER_DENS', r'installed lighting power density of (\d+\.\d+)',
+          float),
+    # Minimum illuminance level
+    Field('MIN_ILL_LEV', r'minimum illuminance level of (\d+)', float),
+    # Ballast loss factor
+    Field('LOSS_FACTOR', r'ballast loss factor of (\d+)', float),
+    # Standby power
+    Field('STANDBY', r'standby power of (\d+\.\d+)', float),
+    # Daylight Factor
+    Field('DF', r'\n(\d\.\d)</td>', float),
+    # Daylight Autonomy
+    Field('DA', r'The daylight autonomy for the core workplane sensor ' +
+          r'is (\d+)%', float),
+    # Useful daylight autonomy for UDI < 100 lux
+    Field('UDI_<100', r'UDI<sub><100</sub>=(\d+)%', float),
+    # Useful daylight autonomy for UDI between 100 and 2000 lux
+    Field('UDI_100-2000', r'UDI<sub>100-2000</sub>=(\d+)%', float),
+    # Useful daylight autonomy for UDI > 2000 lux
+    Field('UDI_>2000', r'UDI<sub>>2000</sub>=(\d+)%', float),
+    # Annual electric lighting energy use
+    Field('elec_use', r'(\d{2}\.\d) kWh/unit area', float),
+    # Number of occupied hours
+    Field('occ_hours', r'occupancy at the work place are (\d+\.\d)', float),
+    # Number of hours electrical lighting is activated
+    Field('el_light_hours', r'lighting is activated (\d+\.\d) hours', float),
+    ])
+
+
+class SensorGrid(object):
+    """Class that holds DAYSIM sensor point coordinates in x/y/z arrays and
+    results for all sensor points in one float64 array per metric"""
+
+    def __init__(self, x, y, z):
+        """Initialization of SensorGrid Class
+
+        Args:
+            x, y, z: arrays of sensor point coordinates
+
+        """
+
+        self.x = np.asarray(x, dtype=np.float64)
+        self.y = np.asarray(y, dtype=np.float64)
+        self.z = np.asarray(z, dtype=np.float64)
+        # Ordered mapping of metric names to arrays of values
+        self.metrics = OrderedDict()
+
+
+    def __len__(self):
+        return len(self.x)
+
+
+    def set_metric(self, name, values):
+        """Set values of a metric for all sensor points
+
+        Values are assigned in sensor point order. If the number of values
+        differs from the number of sensor points, missing values are set
+        to NaN and extra values are discarded.
+
+        Args:
+            name: metric name
+            values: array of metric values
+
+        """
+
+        values = np.asarray(values, dtype=np.float64)
+        if len(values) == len(self):
+            self.metrics[name] = values
+        else:
+            print("Number of values for %s doesn't match number of " % name +
+                "sensor points (%d vs %d)" % (len(values), len(self)))
+            column = np.full(len(self), np.nan)
+            n = min(len(values), len(self))
+            column[:n] = values[:n]
+            self.metrics[name] = column
+
+
+    def to_columns(self):
+        """Return sensor grid as an ordered dict of columns"""
+
+        columns = OrderedDict([('sens_x', self.x), ('sens_y', self.y),
+                               ('sens_z', self.z)])
+        columns.update(self.metrics)
+
+        return columns
+
+
+    def to_dicts(self):
+        """Return sensor grid as a list of dicts (one dict per sensor point)"""
+
+        columns = self.to_columns()
+        names = list(columns.keys())
+        rows = zip(*[columns[name].tolist() for name in names])
+
+        return [dict(zip(names, row)) for row in rows]
+
+
+
+def read_da(file_abspath):
+    """Read a DAYSIM DA results file in a single vectorized pass.
+
+    Args:
+        file_abspath: absolute path to DA result file.
+
+    Returns:
+        (metric name, coords, values) tuple where coords is a (n, 3) array of
+        sensor point coordinates and values an array of n metric values
+
+    Raises:
+        IOError: problem reading out_file
+    """
+
+    with io.open(file_abspath, 'r', encoding='latin-1') as out_f:
+        line_1 = out_f.readline() # Keep first line which identifies the data
+    # Read all sensor points at once with a C parser, skipping first two
+    # lines (second line doesn't hold any useful info)
+    values = pd.read_csv(file_abspath, sep='\t', skiprows=2, header=None,
+                         usecols=[0, 1, 2, 3], dtype=np.float64).values
 
-from pybps.util import dict_cleanconvert
+    # Search for string that describes data contained in file
+    match = re.search(r'# (.*) - Active User', line_1)
+    da_data = match.group(1)
+    # Extract illuminance level from found string
+    match = re.search(r'(.*) \((\d{3}) lux\)', da_data)
+    if match:
+        da_data = match.group(1)
+    name = DA_METRICS.get(da_data, da_data)
+
+    return name, values[:, :3], values[:, 3]
+
+
+def parse_da_grid(file_abspathlist):
+    """Parse results from DAYSIM DA results files into a sensor grid.
+
+    Sensor points are taken from the first file. Metrics of following files
+    are merged by aligned array assignment (files list sensor points in the
+    same order).
+
+    Args:
+        file_abspathlist: list of absolute paths to DA result files.
+
+    Returns:
+        SensorGrid instance (None if no file was given)
+
+    Raises:
+        IOError: problem reading out_file
+    """
+
+    grid = None
+
+    for file_abspath in file_abspathlist:
+        name, coords, values = read_da(file_abspath)
+        if grid is None:
+            grid = SensorGrid(coords[:, 0], coords[:, 1], coords[:, 2])
+        grid.set_metric(name, values)
+
+    return grid
 
 
 def parse_da(file_abspathlist):
@@ -25,59 +196,16 @@ def parse_da(file_abspathlist):
         IOError: problem reading out_file
     """
 
-    da_results = []
-    
-    # Parse data from DA files generated by Daysim and return a list of
-    # dicts (one dict per each sensor point in result file)
-    for file_abspath in file_abspathlist:
-        with open(file_abspath, 'rU') as out_f:
-            line_1 = next(out_f) # Keep first line which identifies the data
-            # Search for string that describes data contained in file
-            match = re.search(r'# (.*) - Active User', line_1)
-            da_data = match.group(1)
-            # Extract illuminance level from found string
-            match = re.search(r'(.*) \((\d{3}) lux\)', da_data)
-            if match:
-                da_data = match.group(1)
-            next(out_f) # Skip second line which doesn't hold any useful info
-            dr = csv.reader(out_f, delimiter='\t')
-            dict_list = []
-            # Build a list of dict (one row from file = one dict)
-            for i, row in enumerate(dr):
-                dict_list.append({})
-                dict_list[i]['sens_x'] = row[0]
-                dict_list[i]['sens_y'] = row[1]
-                dict_list[i]['sens_z'] = row[2]
-                if da_data == 'Daylight Autonomy':
-                    dict_list[i]['DA'] = row[3]
-                elif da_data == 'Continuous Daylight Autonomy':
-                    dict_list[i]['DAcon'] = row[3]
-                elif da_data == 'DA_max':
-                    dict_list[i]['DAmax'] = row[3]
-                elif da_data == 'Daylight Saturation Potential':
-                    dict_list[i]['DSP'] = row[3]
-                else:
-                    dict_list[i][da_data] = row[3]    
-            # Post-process generated list of dicts to remove unwanted 
-            # whitespaced and convert strings with numbers to float type
-            for dict in dict_list:
-                dict = dict_cleanconvert(dict)
-                
-        # Group results in list of dicts
-        if not da_results:
-            da_results.extend(dict_list)
-        else:
-            for (res_dict, new_dict) in zip(da_results, dict_list):
-                for k, v in new_dict.items():
-                    res_dict[k] = new_dict[k]
+    grid = parse_da_grid(file_abspathlist)
+
+    return grid.to_dicts() if grid is not None else []
+
 
-    return da_results                    
-    
-    
 def parse_el_lighting(file_abspath):
     """Parse results from DAYSIM electric lighting result file.
 
     Parses results from electric lighting result file and put them in a dict.
+    All fields are extracted in a single pass over the file.
 
     Args:
         file_abspath: absolute path to electric lighting result file.
@@ -89,57 +217,6 @@ def parse_el_lighting(file_abspath):
         IOError: problem reading out_file
     """
 
-    el_results = {}
-    
-    with open(file_abspath, 'rU') as out_f:
-        temp = out_f.read()
-        # Retrieve lighting power density value
-        match = re.search(r'installed lighting power density of (\d+\.\d+)', temp)
-        if match: 
-            el_results['POWER_DENS'] = float(match.group(1))
-        # Retrieve minimum illuminance level value
-        match = re.search(r'minimum illuminance level of (\d+)', temp)
-        if match: 
-            el_results['MIN_ILL_LEV'] = float(match.group(1))
-        # Retrieve ballast lost factor value
-        match = re.search(r'ballast loss factor of (\d+)', temp)
-        if match: 
-            el_results['LOSS_FACTOR'] = float(match.group(1))
-        # Retrieve standby power value
-        match = re.search(r'standby power of (\d+\.\d+)', temp)
-        if match: 
-            el_results['STANDBY'] = float(match.group(1))
-        # Retrieve Daylight Factor values
-        match = re.search(r'\n(\d\.\d)</td>', temp)
-        if match: 
-            el_results['DF'] = float(match.group(1))
-        # Retrieve Daylight Autonomy values
-        match = re.search(r'The daylight autonomy for the core workplane sensor is (\d+)%', temp)
-        if match: 
-            el_results['DA'] = float(match.group(1))
-        # Retrieve useful daylight autonomy for UDI < 100 lux
-        match = re.search(r'UDI<sub><100</sub>=(\d+)%', temp)
-        if match:
-            el_results['UDI_<100'] = float(match.group(1))
-        # Retrieve useful daylight autonomy for UDI between 100 and 2000 lux
-        match = re.search(r'UDI<sub>100-2000</sub>=(\d+)%', temp)
-        if match:
-            el_results['UDI_100-2000'] = float(match.group(1))
-        # Retrieve useful daylight autonomy for UDI > 2000 lux
-        match = re.search(r'UDI<sub>>2000</sub>=(\d+)%', temp)
-        if match:
-            el_results['UDI_>2000'] = float(match.group(1))
-        # Retrieve annual electric lighting energy use
-        match = re.search(r'(\d{2}\.\d) kWh/unit area', temp)
-        if match:
-            el_results['elec_use'] = float(match.group(1))
-        # Retrieve number of occupied hours
-        match = re.search(r'occupancy at the work place are (\d+\.\d)', temp)
-        if match:
-            el_results['occ_hours'] = float(match.group(1))
-        # Retrieve number of hours electrical lighting is activated        
-        match = re.search(r'lighting is activated (\d+\.\d) hours', temp)
-        if match:
-            el_results['el_light_hours'] = float(match.group(1))
+    el_results = EL_LIGHTING_FIELDS.extract_file(file_abspath)
 
     return [el_results]
\ No newline at end of file
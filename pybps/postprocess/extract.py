@@ -0,0 +1,226 @@
+"""
+A generic engine to extract named fields from simulation output files
+"""
+
+
+import io
+import os
+import re
+
+
+class Field(object):
+    """Declaration of a field to be extracted from text"""
+
+    def __init__(self, name, pattern, type=str, mode='first', limit=None,
+                 separate=False):
+        """Initialization of Field Class
+
+        Fields of an extractor are searched with a single combined regular
+        expression, which only finds one match at a time: text matched by a
+        field is not searched for other fields. Fields whose matches may
+        overlap those of other fields (e.g. a pattern matching part of the
+        text matched by another pattern) must be declared with 'separate' set
+        to True. Fields with identical patterns are detected and searched
+        separately.
+
+        Args:
+            name: name of field (key in extracted results dict)
+            pattern: regular expression matching field. If it holds groups,
+                the first group gives the field value, otherwise the whole
+                match is used.
+            type: function used to convert matched string (str, int, float)
+            mode: 'first' keeps the first match, 'last' the last match,
+                'count' counts matches and 'distinct' keeps a list of distinct
+                values in order of appearance
+            limit: for 'distinct' mode, maximum number of values kept
+            separate: if True, field is searched in its own pass over text
+
+        """
+
+        self.name = name
+        self.pattern = pattern
+        self.type = type
+        self.mode = mode
+        self.limit = limit
+        self.separate = separate
+
+
+
+class FieldExtractor(object):
+    """Class that compiles a table of fields once into a single combined
+    regular expression, so that all fields are extracted in one pass over
+    the text. Fields that may overlap others are searched in additional
+    passes (see Field class)."""
+
+    def __init__(self, fields, overlap=4096):
+        """Initialization of FieldExtractor Class
+
+        Args:
+            fields: list of Field instances
+            overlap: number of characters kept between chunks when streaming
+                through files. Should be larger than the longest match.
+
+        """
+
+        self.fields = list(fields)
+        self.overlap = overlap
+        # Share fields out between passes, so that no pass holds fields that
+        # may overlap each other
+        passes = []
+        for i, field in enumerate(self.fields):
+            for fields in passes:
+                if not field.separate and not any(
+                        self.fields[j].separate or
+                        self.fields[j].pattern == field.pattern
+                        for j in fields):
+                    fields.append(i)
+                    break
+            else:
+                passes.append([i])
+        # Build combined pattern of each pass. Each field pattern is followed
+        # by an empty named group, which identifies the matching field
+        # (capturing groups around alternatives would prevent the regex
+        # engine from quickly skipping text that cannot match)
+        self.regexes = []
+        self._value_groups = {}
+        for fields in passes:
+            parts = []
+            index = 0
+            for i in fields:
+                field = self.fields[i]
+                ngroups = re.compile(field.pattern).groups
+                group = 'f%d' % i
+                parts.append('(?:%s)(?P<%s>)' % (field.pattern, group))
+                self._value_groups[group] = (i, index + 1 if ngroups else 0)
+                index += ngroups + 1
+            self.regexes.append(re.compile('|'.join(parts)))
+
+
+    def _new_results(self):
+        results = {}
+        for field in self.fields:
+            if field.mode == 'count':
+                results[field.name] = 0
+            elif field.mode == 'distinct':
+                results[field.name] = []
+        return results
+
+
+    def _done(self, results):
+        """Return True if no further match can change results"""
+        for field in self.fields:
+            if field.mode != 'first' or field.name not in results:
+                return False
+        return True
+
+
+    def _handle(self, match, results):
+        i, gi = self._value_groups[match.lastgroup]
+        field = self.fields[i]
+        if field.mode == 'count':
+            results[field.name] += 1
+        elif field.mode == 'first':
+            if field.name not in results:
+                results[field.name] = field.type(match.group(gi))
+        elif field.mode == 'last':
+            results[field.name] = field.type(match.group(gi))
+        elif field.mode == 'distinct':
+            values = results[field.name]
+            if field.limit is None or len(values) < field.limit:
+                value = field.type(match.group(gi))
+                if value not in values:
+                    values.append(value)
+
+
+    def extract(self, text):
+        """Extract all fields from text
+
+        Args:
+            text: text to be scanned
+
+        Returns:
+            dict with field names as keys (fields in 'first' and 'last' modes
+            are only present if found)
+
+        """
+
+        results = self._new_results()
+        for regex in self.regexes:
+            for match in regex.finditer(text):
+                self._handle(match, results)
+
+        return results
+
+
+    def extract_file(self, file_abspath, chunk_size=1 << 20):
+        """Extract all fields from a file, streaming through it by chunks
+
+        Memory use is bounded by chunk_size and overlap, whatever the size of
+        the file. Reading stops early if all fields are in 'first' mode and
+        all of them have been found.
+
+        Args:
+            file_abspath: absolute path to file
+            chunk_size: number of characters read at a time
+
+        Returns:
+            dict with field names as keys (see 'extract' method)
+
+        Raises:
+            IOError: problem reading file
+        """
+
+        results = self._new_results()
+        buf = ''
+        # Offset of buffer in file and offset from which each pass has still
+        # to scan text
+        base = 0
+        starts = [0] * len(self.regexes)
+        with io.open(file_abspath, 'r', encoding='latin-1') as f:
+            while True:
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buf += chunk
+                # Matches ending in the last 'overlap' characters might be
+                # incomplete: they are scanned again with next chunk
+                limit = len(buf) if eof else len(buf) - self.overlap
+                for p, regex in enumerate(self.regexes):
+                    keep = max(0, limit)
+                    for match in regex.finditer(buf, starts[p] - base):
+                        if match.end() > limit:
+                            keep = match.start()
+                            break
+                        self._handle(match, results)
+                    starts[p] = base + max(keep, starts[p] - base)
+                if eof or self._done(results):
+                    break
+                buf = buf[min(starts) - base:]
+                base = min(starts)
+
+        return results
+
+
+    def extract_tail(self, file_abspath, tail_size=65536):
+        """Extract all fields from the end of a file only
+
+        Useful for summary blocks written at the end of (possibly very large)
+        log files: the file is not read from its beginning but from
+        'tail_size' bytes before its end.
+
+        Args:
+            file_abspath: absolute path to file
+            tail_size: number of bytes read at end of file
+
+        Returns:
+            dict with field names as keys (see 'extract' method)
+
+        Raises:
+            IOError: problem reading file
+        """
+
+        with io.open(file_abspath, 'rb') as f:
+            f.seek(max(0, os.fstat(f.fileno()).st_size - tail_size))
+            tail = f.read().decode('latin-1')
+        tail = tail.replace('\r\n', '\n').replace('\r', '\n')
+
+        return self.extract(tail)
@@ -3,21 +3,63 @@ A set of functions required to post-process TRNSYS simulation output files
 """
 
 
-import csv
-import re
+import io
+from collections import OrderedDict
 
-from pybps.util import dict_cleanconvert
+import numpy as np
 
+from pybps.util import is_float
+from pybps.postprocess.extract import Field, FieldExtractor
 
-def parse_log(file_abspath):
+
+# Names of months, used to check that Type 46 results are integrated monthly
+MONTHS = ['January','February','March','April','May','June','July','August',
+          'September','October','November','December']
+
+# Indices of Type 46 rows holding max and min integrated values, which are
+# discarded since they can be easily deduced from monthly integrated values
+TYPE46_SKIPROWS = [16, 21, 25, 26, 30, 31]
+
+# Fields extracted from summary block at end of TRNSYS log file
+LOG_SUMMARY_FIELDS = FieldExtractor([
+    Field('Stopped', r'Simulation stopped with errors'),
+    Field('Warnings', r'Total Warnings\s+:\s+(\d+)', int),
+    Field('Errors', r'Total Fatal Errors\s+:\s+(\d+)', int),
+    ])
+
+# Fields extracted from whole TRNSYS log file
+LOG_FIELDS = FieldExtractor([
+    Field('Stopped', r'Simulation stopped with errors'),
+    Field('WarningCount', r'Warning at time', mode='count'),
+    ])
+
+# Number of bytes read at end of TRNSYS log file to find summary block
+LOG_TAIL_SIZE = 65536
+
+
+def clean_message(message):
+    """Collapse whitespaces in TRNSYS log message"""
+    return ' '.join(message.split())
+
+
+def parse_log(file_abspath, max_messages=0):
     """Parse warning and error info from TRNSYS generated log file.
 
     Parses warning and error count when simulation ends with errors.
     If simulation ends successfully, counts number of warnings and return
     successful completion message.
+    Summary block is read from the end of the log file and warnings are
+    counted by streaming through the file, so that memory use stays bounded
+    whatever the size of the log file. If the summary block is not found at
+    the end of the file (long messages written after it), it is looked for
+    while streaming through the whole file.
 
     Args:
         file_abspath: absolute path to result file.
+        max_messages: maximum number of distinct messages ('TRNSYS Message'
+            lines of warnings and errors) kept in the 'WarningMessages' key
+            of returned dict, in order of appearance. By default, no message
+            is kept.
 
     Returns:
         dict.
@@ -28,26 +70,38 @@ def parse_log(file_abspath):
 
     runsumdict = {}
 
-    # Parse data from Type-46-generated tab separated file and return a list of
-    # dicts (one dict per each row of result file)
-    pat01 = re.compile(r'Simulation stopped with errors')
-    pat02 = re.compile(r'Total Warnings\s+:\s+(\d+)')
-    pat03 = re.compile(r'Total Fatal Errors\s+:\s+(\d+)')
-    pat04 = re.compile(r'Warning at time')
-    with open(file_abspath, 'rU') as log_f:
-        temp = log_f.read()
-        match = pat01.search(temp)
-        if match:
-            runsumdict['Message'] = match.group()
-            match = pat02.search(temp)
-            runsumdict['Warnings'] = int(match.group(1))
-            match = pat03.search(temp)
-            runsumdict['Errors'] = int(match.group(1))
-        else:
-            runsumdict['Message'] = "Simulation ended successfully"
-            match = pat04.findall(temp)
-            runsumdict['Warnings'] = len(match)
-            runsumdict['Errors'] = 0
+    summary = LOG_SUMMARY_FIELDS.extract_tail(file_abspath, LOG_TAIL_SIZE)
+    tail_summary = 'Warnings' in summary and 'Errors' in summary
+    # Whole log file only needs to be read if simulation ended successfully
+    # (warnings are counted), if messages are requested or if summary block
+    # was not found at the end of the file
+    fields = {}
+    if 'Stopped' not in summary or max_messages or not tail_summary:
+        extra = []
+        if not tail_summary:
+            extra += [f for f in LOG_SUMMARY_FIELDS.fields
+                      if f.name in ('Warnings', 'Errors')]
+        if max_messages:
+            extra.append(Field('Messages',
+                r'TRNSYS Message\s+\d+\s*:[^\n]*', clean_message,
+                mode='distinct', limit=max_messages))
+        extractor = LOG_FIELDS
+        if extra:
+            extractor = FieldExtractor(LOG_FIELDS.fields + extra)
+        fields = extractor.extract_file(file_abspath)
+        for name in ('Warnings', 'Errors'):
+            if name not in summary and name in fields:
+                summary[name] = fields[name]
+    if 'Stopped' in summary or 'Stopped' in fields:
+        runsumdict['Message'] = "Simulation stopped with errors"
+        runsumdict['Warnings'] = summary.get('Warnings')
+        runsumdict['Errors'] = summary.get('Errors')
+    else:
+        runsumdict['Message'] = "Simulation ended successfully"
+        runsumdict['Warnings'] = fields['WarningCount']
+        runsumdict['Errors'] = 0
+    if max_messages:
+        runsumdict['WarningMessages'] = ' | '.join(fields['Messages'])
 
     return runsumdict
 
@@ -71,37 +125,101 @@ def parse_type46(file_abspath):
         IOError: problem reading out_file
     """
 
-    # Parse data from Type-46-generated tab separated file and return a list of
-    # dicts (one dict per each row of result file)
-    with open(file_abspath, 'rU') as out_f:
-        next(out_f) # Skip first line which doesn't hold any useful info
-        dr = csv.DictReader(out_f, delimiter='\t')
-        fieldnames = dr.fieldnames
-        dr_list = list(dr)
-        dict_list = []
-        months_list = ['January','February','March','April','May','June','July','August','September','October','November','December']
-        # Verify that the file is a valid Type46 output file
-        if fieldnames[0].strip() == 'Month' or fieldnames[0].strip() == 'Period':
-            # Check if the given file holds results integrated monthly
-            if dr_list[0][fieldnames[0]].strip() in months_list:
-                # Build a list of dict (one row from file = one dict)
-                for idx, row in enumerate(dr_list):
-                    # Only append rows containing results and discard
-                    # rows containing max and min integrated values
-                    if (any(row[fieldnames[0]].strip()) and
-                        (idx not in [16, 21, 25, 26, 30, 31])):
-                        dict_list.append(row)
-            else:
-                # Print error message if integration period is not monthly
-                print("Invalid integration period." +
-                    "\nFunction only parses monthly integrated results.")
-        # Print error message if file format doesn't fit Type 46
-        else:
-            print("Unrecognized file format.")
+    columns = parse_type46_columns(file_abspath)
+    names = list(columns.keys())
+    rows = zip(*[columns[name].tolist() for name in names])
+
+    return [dict(zip(names, row)) for row in rows]
+
+
+def parse_type46_columns(file_abspath):
+    """Parse results from TRNSYS Type 46 generated file into columns.
 
-        # Post-process generated list of dicts to remove unwanted whitespaced
-        # and convert strings with numbers to float type
-        for idx, item in enumerate(dict_list):
-            dict_list[idx] = dict_cleanconvert(dict_list[idx])
+    Same as 'parse_type46', but results are returned column by column as
+    NumPy arrays. All numeric cells of the file are converted to float in a
+    single vectorized pass: variable columns are float64 arrays and the
+    first (Month/Period) column is an object array of strings.
 
-    return dict_list
+    Args:
+        file_abspath: absolute path to result file.
+
+    Returns:
+        OrderedDict with column names as keys and NumPy arrays as values
+        (empty if file is not a valid monthly Type 46 file).
+
+    Raises:
+        IOError: problem reading out_file
+    """
+
+    columns = OrderedDict()
+
+    with io.open(file_abspath, 'r', encoding='latin-1') as out_f:
+        next(out_f) # Skip first line which doesn't hold any useful info
+        fieldnames = next(out_f).rstrip('\r\n').split('\t')
+        # Blank lines are ignored (as done by csv readers)
+        lines = [line for line in out_f.read().splitlines() if line]
+
+    # Verify that the file is a valid Type46 output file
+    if fieldnames[0].strip() not in ['Month', 'Period']:
+        # Print error message if file format doesn't fit Type 46
+        print("Unrecognized file format.")
+        return columns
+    # Check if the given file holds results integrated monthly
+    if not lines or lines[0].split('\t', 1)[0].strip() not in MONTHS:
+        # Print error message if integration period is not monthly
+        print("Invalid integration period." +
+            "\nFunction only parses monthly integrated results.")
+        return columns
+
+    # Only keep rows containing results and discard rows containing max
+    # and min integrated values
+    nfield = len(fieldnames)
+    labels = []
+    cells = []
+    for idx, line in enumerate(lines):
+        fields = line.split('\t')
+        label = fields[0].strip()
+        if label and idx not in TYPE46_SKIPROWS:
+            # Pad or truncate row to the number of header fields
+            fields = (fields + [''] * nfield)[:nfield]
+            labels.append(label)
+            cells.extend(fields[1:])
+    nrow = len(labels)
+
+    # Keep columns with a name, in file order
+    keep = [(pos, name.strip()) for pos, name in enumerate(fieldnames)
+            if pos > 0 and name.strip()]
+    block = np.array(cells, dtype=object).reshape(nrow, nfield - 1)
+    block = block[:, [pos - 1 for (pos, name) in keep]]
+    # Convert all variables in one pass, falling back to column by column
+    # conversion if some cells are not numbers
+    try:
+        values = np.round(block.astype(np.float64), 3)
+        block_columns = [values[:, i] for i in range(len(keep))]
+    except ValueError:
+        block_columns = [convert_column(block[:, i]) for i in range(len(keep))]
+
+    columns[fieldnames[0].strip()] = convert_column(
+        np.array(labels, dtype=object))
+    for (pos, name), col in zip(keep, block_columns):
+        columns[name] = col
+
+    return columns
+
+
+def convert_column(col):
+    """Convert a column of strings to float64 if all of its non-empty cells
+    are numbers (empty cells become NaN). Otherwise, strip whitespaces and
+    only convert cells identified as numbers, in an object array."""
+
+    col = np.array([c.strip() for c in col], dtype=object)
+    filled = col != ''
+    try:
+        values = np.full(len(col), np.nan)
+        values[filled] = col[filled].astype(np.float64)
+        return np.round(values, 3)
+    except ValueError:
+        for i, c in enumerate(col):
+            if is_float(c):
+                col[i] = round(float(c), 3)
+        return col
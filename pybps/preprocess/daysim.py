@@ -4,10 +4,10 @@ A set of functions required to pre-process DAYSIM simulation input files
 
 # Common imports
 import os
-import re
 
 # Custom imports
 from pybps import util
+from pybps.cache import hash_files, StageCache
 
 # Handle Python 2/3 compatibility
 from six.moves import configparser
@@ -19,15 +19,33 @@ else:
   ConfigParser = configparser.ConfigParser
 
 
-def rotate_scene(model_abspath):
+# Keywords of DAYSIM header files that do not affect daylight coefficients
+DC_IGNORED_KEYWORDS = ['project_name', 'project_directory', 'bin_directory',
+                       'tmp_directory', 'occupancy',
+                       'minimum_illuminance_level', 'daylight_savings_time',
+                       'electric_lighting_system', 'electric_lighting',
+                       'daylight_autonomy_active_RGB', 'thermal_simulation']
+
+
+def get_bin_dir(bin_dir=None):
+    """Return absolute path to DAYSIM binaries directory (by default, read
+    from default config.ini file)"""
+
+    if bin_dir is None:
+        conf = ConfigParser()
+        conf_file = os.path.join(os.path.abspath(os.path.dirname(__file__)),
+            '..', 'config.ini')
+        conf.read(conf_file)
+        bin_dir = conf.get('DAYSIM', 'Bin_Dir')
+
+    return os.path.abspath(bin_dir)
+
+
+def rotate_scene(model_abspath, bin_dir=None):
     """Rotate Radiance geometry in Daysim project"""
 
 	# Get information from config file
-    conf = SafeConfigParser()
-    conf_file = os.path.join(os.path.abspath(os.path.dirname(__file__)),
-        '..\config.ini')
-    conf.read(conf_file)
-    bin_dir = os.path.abspath(conf.get('DAYSIM', 'Bin_Dir'))
+    bin_dir = get_bin_dir(bin_dir)
     rotatescene_path = os.path.join(bin_dir, 'rotate_scene.exe')
 
     # Call rotate_scene program
@@ -51,18 +69,85 @@ def rotate_scene(model_abspath):
                     os.rename(old, new)
 
 
-def radfiles2daysim(model_abspath):
+def radfiles2daysim(model_abspath, bin_dir=None):
     """Call radfiles2daysim program to convert source rad file to
     daysim material and geometry rad files"""
 
 	# Get information from config file
-    conf = SafeConfigParser()
-    conf_file = os.path.join(os.path.abspath(os.path.dirname(__file__)),
-        '..\config.ini')
-    conf.read(conf_file)
-    bin_dir = os.path.abspath(conf.get('DAYSIM', 'Bin_Dir'))
+    bin_dir = get_bin_dir(bin_dir)
     radfiles2daysim_path = os.path.join(bin_dir, 'radfiles2daysim.exe')
 
     # Call radfiles2daysim program
     cmd = [radfiles2daysim_path, model_abspath, '-g', '-m', '-d']
     util.run_cmd(cmd)
+
+
+def get_dc_key(model_abspath, ignored_keywords=DC_IGNORED_KEYWORDS):
+    """Compute hash key of the inputs of daylight coefficient calculation
+
+    The key covers the content of all Radiance geometry (.rad) and sensor
+    point (.pts) files found in model directory and the lines of the header
+    (.hea) file, except those starting with one of the ignored keywords
+    (occupancy, lighting control and other downstream parameters).
+
+    Args:
+        model_abspath: absolute path to DAYSIM header file
+        ignored_keywords: list of header keywords left out of the key
+
+    Returns:
+        Hash key as an hexadecimal string.
+
+    """
+
+    ignored = set(k.lower() for k in ignored_keywords)
+    hea_lines = []
+    with open(model_abspath, 'r') as hea_f:
+        for line in hea_f:
+            words = line.split()
+            if not words or words[0].startswith('#'):
+                continue
+            if words[0].lower() not in ignored:
+                hea_lines.append(' '.join(words))
+
+    work_dir = os.path.dirname(model_abspath)
+    geom_abspathlist = []
+    for root, dirs, files in os.walk(work_dir):
+        for fname in files:
+            if fname.lower().endswith(('.rad', '.pts')):
+                geom_abspathlist.append(os.path.join(root, fname))
+
+    return hash_files(geom_abspathlist, work_dir, extra=hea_lines)
+
+
+def gen_dc(model_abspath, bin_dir=None, cache_abspath=None,
+           ignored_keywords=DC_IGNORED_KEYWORDS, cache_maxsize=None):
+    """Calculate daylight coefficients with gen_dc, through a DC cache
+
+    Daylight coefficient files are computed at most once per distinct
+    geometry (see 'get_dc_key' function and pybps.cache.StageCache) and
+    copied to the folder of other jobs.
+
+    Args:
+        model_abspath: absolute path to DAYSIM header file
+        bin_dir: path to DAYSIM binaries directory (by default, read from
+            default config.ini file)
+        cache_abspath: absolute path to DC cache directory (daylight
+            coefficients are always calculated if None)
+        ignored_keywords: list of header keywords left out of cache key
+        cache_maxsize: maximum size of DC cache in bytes, over which least
+            recently used entries are evicted (no limit if None)
+
+    Returns:
+        True if daylight coefficients were restored from cache
+
+    """
+
+    cmd = [os.path.join(get_bin_dir(bin_dir), 'gen_dc'), model_abspath]
+    if cache_abspath is None:
+        util.run_cmd(cmd)
+        return False
+
+    key = get_dc_key(model_abspath, ignored_keywords)
+
+    return StageCache(cache_abspath, max_size=cache_maxsize).run(
+        key, os.path.dirname(model_abspath), lambda: util.run_cmd(cmd))
@@ -4,12 +4,12 @@ A set of functions required to pre-process TRNSYS simulation input files
 
 # Common imports
 import os
-import sys
 import shutil
 import re
 
 # Custom imports
 from pybps import util
+from pybps.cache import hash_files, StageCache
 
 # Handle Python 2/3 compatibility
 from six.moves import configparser
@@ -72,7 +72,7 @@ def prepare_deck_template(deck_abspath, param_list):
 
     Transforms a TRNSYS deck in a template file valid for parametric analysis
     by replacing constant values with parameter search strings (the name of
-    the constant surrounded by '%' signs). That parameters are given in a list.
+    the constant with a leading '$' sign). That parameters are given in a list.
 
     Args:
         deck_abspath: absolute path to TRNSYS deck file
@@ -93,17 +93,21 @@ def prepare_deck_template(deck_abspath, param_list):
         data = f.read()
 
         for par in param_list:
-            data = re.sub(r'(' + par + r')\s=\s(\d+\.*\d*)', r'\g<1> = %\g<1>%', data)
+            data = re.sub(r'(' + par + r')\s=\s(\d+\.*\d*)', r'\g<1> = $\g<1>', data)
 
         f.seek(0)
         f.write(data)
         f.truncate()
 
 
-def gen_type56(model_abspath, select='all'):
+def gen_type56(model_abspath, select='all', trnbuild_path=None,
+               trnsidf_path=None, cache_abspath=None, cache_maxsize=None):
     """Generate Type56 matrices and idf files
 
     Calls TRNBUILD.exe with flags to generate matrices and IDF files.
+    If a cache directory is given, matrices are generated at most once per
+    distinct .b17 file content and reused by other jobs (see
+    'gen_type56_matrix' function).
 
     Args:
         model_abspath: absolute path to Type56 model file
@@ -112,23 +116,36 @@ def gen_type56(model_abspath, select='all'):
             matrix, 'matrices' generates both
             'idf' generates the IDF file (similar to TRNBUILD 'export' funtion)
             'all' generates everything
+        trnbuild_path: path to TRNBUILD executable (by default, read from
+            default config.ini file)
+        trnsidf_path: path to trnsIDF executable (by default, read from
+            default config.ini file)
+        cache_abspath: absolute path to matrix cache directory (no cache if
+            None)
+        cache_maxsize: maximum size of matrix cache in bytes (no limit if
+            None)
 
     Returns:
         Generated files.
 
     """
 
-	# Get information from config file
-    conf = SafeConfigParser()
-    conf_file = os.path.join(os.path.abspath(os.path.dirname(__file__)),
-        '..\config.ini')
-    conf.read(conf_file)
-    trnbuild_path = os.path.abspath(conf.get('TRNSYS', 'TRNBuild_Path'))
-    trnsidf_path = os.path.abspath(conf.get('TRNSYS', 'trnsIDF_Path'))
+    # Get information from config file
+    if trnbuild_path is None or trnsidf_path is None:
+        conf = ConfigParser()
+        conf_file = os.path.join(os.path.abspath(os.path.dirname(__file__)),
+            '..', 'config.ini')
+        conf.read(conf_file)
+        if trnbuild_path is None:
+            trnbuild_path = conf.get('TRNSYS', 'TRNBuild_Path')
+        if trnsidf_path is None:
+            trnsidf_path = conf.get('TRNSYS', 'trnsIDF_Path')
+    trnbuild_path = os.path.abspath(trnbuild_path)
+    trnsidf_path = os.path.abspath(trnsidf_path)
 
     # Get b17 file path from deck file
     pattern = re.compile(r'ASSIGN "(.*b17)"')
-    with open(model_abspath, 'rU') as m_f:
+    with open(model_abspath, 'r') as m_f:
         temp = m_f.read()
         match = pattern.search(temp)
         # TRNBUILD is only called if Type56 is found in deck file.
@@ -137,13 +154,44 @@ def gen_type56(model_abspath, select='all'):
             b17_abspath = os.path.join(os.path.dirname(model_abspath), b17_relpath)
             # Generate shading/insolation matrix
             if select == 'all' or select == 'matrices' or select == 'masks':
-                cmd = [trnbuild_path, b17_abspath, '/N', '/masks']
-                util.run_cmd(cmd)
+                gen_type56_matrix(b17_abspath, trnbuild_path, '/masks',
+                                  cache_abspath, cache_maxsize)
             # Generate view factor matrix
             if select == 'all' or select == 'matrices' or select == 'vfm':
-                cmd = [trnbuild_path, b17_abspath, '/N', '/vfm']
-                util.run_cmd(cmd)
+                gen_type56_matrix(b17_abspath, trnbuild_path, '/vfm',
+                                  cache_abspath, cache_maxsize)
             # Generate trnsys3D idf file, to view geometry in Sketchup
             if select == 'all' or select == 'idf':
                 cmd = [trnsidf_path, b17_abspath]
                 util.run_cmd(cmd)
+
+
+def gen_type56_matrix(b17_abspath, trnbuild_path, flag, cache_abspath=None,
+                      cache_maxsize=None):
+    """Generate a Type56 matrix with TRNBUILD, through a matrix cache
+
+    Cache entries are keyed on the content of the .b17 file, its name, the
+    TRNBUILD flag and the TRNBUILD path, so that TRNBUILD runs once per
+    distinct geometry even when many jobs start at the same time (see
+    pybps.cache.StageCache).
+
+    Args:
+        b17_abspath: absolute path to Type56 building description file
+        trnbuild_path: path to TRNBUILD executable
+        flag: TRNBUILD flag ('/masks' or '/vfm')
+        cache_abspath: absolute path to matrix cache directory (matrix is
+            always generated if None)
+        cache_maxsize: maximum size of matrix cache in bytes, over which
+            least recently used matrices are evicted (no limit if None)
+
+    """
+
+    cmd = [trnbuild_path, b17_abspath, '/N', flag]
+    if cache_abspath is None:
+        util.run_cmd(cmd)
+        return
+
+    b17_dir = os.path.dirname(b17_abspath)
+    key = hash_files([b17_abspath], b17_dir, extra=[flag, trnbuild_path])
+    StageCache(cache_abspath, max_size=cache_maxsize).run(
+        key, b17_dir, lambda: util.run_cmd(cmd))
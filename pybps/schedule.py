@@ -0,0 +1,194 @@
+"""
+Scheduling of simulation jobs from their expected run time
+"""
+
+# Third-party imports
+import numpy as np
+import pandas as pd
+
+# Custom imports
+from pybps import db
+
+
+def load_history(db_abspath):
+    """Get run times of previous simulation jobs with their parameters
+
+    Jobs and run summaries saved to the results database (see 'save2db'
+    method of BPSProject) are joined on JobID. Jobs whose results were
+    restored from cache or that ended with errors are left out, since their
+    run time is not representative.
+
+    Args:
+        db_abspath: absolute path to SQlite database file
+
+    Returns:
+        pandas DataFrame with one column per parameter and a 'SimulTime(sec)'
+        column, or None if no history was found
+
+    """
+
+    runsum_df = db.load_runsum(db_abspath, columns=['JobID', 'SimulTime(sec)',
+                                                    'CacheHit', 'Errors'])
+    if runsum_df is None or 'SimulTime(sec)' not in runsum_df:
+        return None
+    jobs_df = db.load_jobs(db_abspath)
+    if jobs_df is None or not len(jobs_df):
+        return None
+    if 'CacheHit' in runsum_df:
+        runsum_df = runsum_df[runsum_df['CacheHit'].fillna(0) == 0]
+    if 'Errors' in runsum_df:
+        runsum_df = runsum_df[runsum_df['Errors'].fillna(0) == 0]
+    history = jobs_df.reset_index().merge(
+        runsum_df[['JobID', 'SimulTime(sec)']], on='JobID')
+    history = history.drop('JobID', axis=1).dropna(subset=['SimulTime(sec)'])
+    if not len(history):
+        return None
+
+    return history.reset_index(drop=True)
+
+
+
+class RuntimeEstimator(object):
+    """Class that estimates the run time of simulation jobs from the run
+    time of previous jobs with the nearest parameters.
+
+    Numerical parameters are normalized with the range of values found in
+    history, so that all of them weigh the same in the distance between
+    jobs. Other parameters add a unit distance when values differ.
+
+    """
+
+    # Maximum number of (job, previous job) distances computed at a time
+    max_cells = 1 << 22
+
+    def __init__(self, history, k=1):
+        """Initialization of RuntimeEstimator Class
+
+        Args:
+            history: pandas DataFrame with one column per parameter and a
+                'SimulTime(sec)' column (see 'load_history' function)
+            k: number of nearest previous jobs whose run time is averaged
+
+        """
+
+        self.k = k
+        self.runtimes = history['SimulTime(sec)'].values.astype(np.float64)
+        params = history.drop('SimulTime(sec)', axis=1)
+        self.num_params = [p for p in params
+                           if pd.api.types.is_numeric_dtype(params[p])]
+        self.cat_params = [p for p in params if p not in self.num_params]
+        num = params[self.num_params].values.astype(np.float64)
+        self.low = np.nanmin(num, axis=0) if len(self.num_params) else num
+        span = (np.nanmax(num, axis=0) - self.low if len(self.num_params)
+                else num)
+        self.span = np.where(span > 0, span, 1.0)
+        self.num = (num - self.low) / self.span
+        self.cat = params[self.cat_params].values.astype(str)
+
+
+    def estimate(self, jobdict_list, chunk_size=256):
+        """Estimate run time of simulation jobs
+
+        Args:
+            jobdict_list: list of dicts holding job parameter values, or
+                pandas DataFrame with one row per job
+            chunk_size: maximum number of jobs whose distance to all
+                previous jobs is computed at a time. It is reduced so that
+                distance arrays hold at most 'max_cells' values, whatever
+                the size of history
+
+        Returns:
+            NumPy array of estimated run times (NaN for jobs that share no
+            parameter with previous jobs)
+
+        """
+
+        estimates = np.full(len(jobdict_list), np.nan)
+        if isinstance(jobdict_list, pd.DataFrame):
+            job_params = set(jobdict_list.columns)
+        else:
+            job_params = set(p for d in jobdict_list for p in d)
+        num_params = [p for p in self.num_params if p in job_params]
+        cat_params = [p for p in self.cat_params if p in job_params]
+        if not num_params and not cat_params:
+            return estimates
+        num_idx = [self.num_params.index(p) for p in num_params]
+        cat_idx = [self.cat_params.index(p) for p in cat_params]
+        k = min(self.k, len(self.runtimes))
+        chunk_size = max(1, min(chunk_size,
+                                self.max_cells // len(self.runtimes)))
+
+        for start in range(0, len(jobdict_list), chunk_size):
+            chunk = jobdict_list[start:start + chunk_size]
+            if isinstance(chunk, pd.DataFrame):
+                chunk = chunk.reindex(columns=num_params + cat_params)
+            else:
+                chunk = pd.DataFrame(chunk, columns=num_params + cat_params)
+            dist = np.zeros((len(chunk), len(self.runtimes)))
+            if num_idx:
+                num = chunk[num_params].apply(
+                    pd.to_numeric, errors='coerce').values
+                num = (num - self.low[num_idx]) / self.span[num_idx]
+                # Distance is accumulated one parameter at a time, so that
+                # temporary arrays have the size of dist
+                for j, i in enumerate(num_idx):
+                    diff = num[:, j, None] - self.num[None, :, i]
+                    diff **= 2
+                    # Missing values count as the largest normalized
+                    # difference
+                    diff[np.isnan(diff)] = 1.0
+                    dist += diff
+            if cat_idx:
+                cat = chunk[cat_params].values.astype(str)
+                for j, i in enumerate(cat_idx):
+                    dist += cat[:, j, None] != self.cat[None, :, i]
+            nearest = np.argpartition(dist, k - 1, axis=1)[:, :k]
+            estimates[start:start + len(chunk)] = \
+                self.runtimes[nearest].mean(axis=1)
+
+        return estimates
+
+
+
+def longest_first(jobs, estimates):
+    """Sort jobs by decreasing expected run time
+
+    Jobs with no run time estimate are dispatched first, since nothing tells
+    they are short. Sort is stable, so that jobs with equal estimates keep
+    their sample order.
+
+    Args:
+        jobs: list of jobs, or JobList (see pybps.jobs)
+        estimates: list of estimated run times (NaN if unknown)
+
+    Returns:
+        Sorted list of jobs (JobList if a JobList was given)
+
+    """
+
+    estimates = np.asarray(estimates, dtype=np.float64)
+    order = np.argsort(np.where(np.isnan(estimates), -np.inf, -estimates),
+                       kind='stable')
+    if hasattr(jobs, 'take'):
+        return jobs.take(order)
+
+    return [jobs[i] for i in order]
+
+
+def makespan_bound(runtimes, ncore):
+    """Get lower bound of the makespan of a batch of jobs, that is the
+    time needed to run all jobs with ncore cores if no core ever stays idle
+
+    Args:
+        runtimes: list of job run times
+        ncore: number of cores
+
+    Returns:
+        Lower bound of batch run time
+
+    """
+
+    if not len(runtimes):
+        return 0.
+
+    return max(max(runtimes), sum(runtimes) / float(ncore))
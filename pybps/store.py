@@ -0,0 +1,274 @@
+"""
+Columnar store of simulation jobs, results and run summaries
+
+Tables are partitioned by series, with one folder per SeriesID, and every
+write appends a new part to the partition of its series, so that data saved
+by previous batches is never rewritten. Parts are Parquet files if the
+optional 'pyarrow' package is installed, or folders holding one NumPy .npy
+file per column otherwise. Reads only open the partitions, parts and columns
+they need.
+"""
+
+# Common imports
+import os
+import json
+from time import time
+
+# Third-party imports
+import numpy as np
+import pandas as pd
+
+# Custom imports
+from pybps import util
+
+# Handle Python 2/3 compatibility
+import six
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+
+# Comparison operators allowed in filters
+FILTER_OPS = {
+    '==': lambda col, v: col == v,
+    '=': lambda col, v: col == v,
+    '!=': lambda col, v: col != v,
+    '<': lambda col, v: col < v,
+    '<=': lambda col, v: col <= v,
+    '>': lambda col, v: col > v,
+    '>=': lambda col, v: col >= v,
+    'in': lambda col, v: np.isin(col, list(v)),
+    'not in': lambda col, v: ~np.isin(col, list(v)),
+}
+
+
+class ResultStore(object):
+    """Class that stores pandas DataFrames of jobs, results and run summaries
+    in a columnar format, partitioned by SeriesID"""
+
+    def __init__(self, store_abspath, backend=None):
+        """Initialization of ResultStore Class
+
+        Args:
+            store_abspath: absolute path to store directory
+            backend: 'parquet' or 'npy'. By default, 'parquet' is used if
+                pyarrow is installed and 'npy' otherwise. Parts written with
+                either backend can be read as long as pyarrow is installed
+
+        """
+
+        if backend is None:
+            backend = 'npy' if pa is None else 'parquet'
+        if backend == 'parquet' and pa is None:
+            raise ImportError("pyarrow is required by the 'parquet' backend")
+        self.abspath = store_abspath
+        self.backend = backend
+
+
+    def append(self, table, df, seriesID):
+        """Append a DataFrame to a table, in the partition of a series
+
+        Args:
+            table: name of table (e.g. 'Jobs', 'Results' or 'RunSummary')
+            df: pandas DataFrame to be stored. A named index (such as the
+                JobID index of jobs DataFrame) is stored as a column
+            seriesID: ID of series the rows belong to
+
+        Returns:
+            Absolute path to written part
+
+        """
+
+        if df.index.name is not None:
+            df = df.reset_index()
+        else:
+            df = df.reset_index(drop=True)
+        part_dir = os.path.join(self.abspath, table, 'SeriesID=' + seriesID)
+        if not os.path.isdir(part_dir):
+            os.makedirs(part_dir)
+        # Parts are named after their write time, so that they are read in
+        # write order. They are written under a temporary name first, so that
+        # readers never see incomplete parts
+        name = 'part-%017.6f-%s' % (time(), util.random_str(4))
+        tmp_abspath = os.path.join(part_dir, '.tmp_' + name)
+        if self.backend == 'parquet':
+            name += '.parquet'
+            pq.write_table(pa.Table.from_pandas(df, preserve_index=False),
+                           tmp_abspath)
+        else:
+            write_npy_part(df, tmp_abspath)
+        part_abspath = os.path.join(part_dir, name)
+        os.rename(tmp_abspath, part_abspath)
+
+        return part_abspath
+
+
+    def tables(self):
+        """Get list of tables found in store"""
+
+        if not os.path.isdir(self.abspath):
+            return []
+
+        return sorted(name for name in os.listdir(self.abspath)
+                      if os.path.isdir(os.path.join(self.abspath, name)))
+
+
+    def series(self, table):
+        """Get list of SeriesIDs found in a table"""
+
+        table_abspath = os.path.join(self.abspath, table)
+        if not os.path.isdir(table_abspath):
+            return []
+
+        return sorted(name[len('SeriesID='):] for name in
+                      os.listdir(table_abspath)
+                      if name.startswith('SeriesID='))
+
+
+    def parts(self, table, series=None):
+        """Get list of (SeriesID, part path) tuples of a table
+
+        Args:
+            table: name of table
+            series: SeriesID or list of SeriesIDs (by default, all series)
+
+        """
+
+        if series is None:
+            series = self.series(table)
+        elif isinstance(series, six.string_types):
+            series = [series]
+        parts = []
+        for seriesID in series:
+            part_dir = os.path.join(self.abspath, table, 'SeriesID=' + seriesID)
+            if not os.path.isdir(part_dir):
+                continue
+            for name in sorted(os.listdir(part_dir)):
+                if name.startswith('part-'):
+                    parts.append((seriesID, os.path.join(part_dir, name)))
+
+        return parts
+
+
+    def load(self, table, series=None, columns=None, filters=None):
+        """Load rows of a table into a pandas DataFrame
+
+        Only partitions of requested series and requested columns are read.
+        Filters are pushed down to Parquet row groups when possible.
+
+        Args:
+            table: name of table
+            series: SeriesID or list of SeriesIDs (by default, all series)
+            columns: list of columns to be read (by default, all columns)
+            filters: list of (column, op, value) tuples, all of which rows
+                must satisfy. op is one of '==', '!=', '<', '<=', '>', '>=',
+                'in' or 'not in'
+
+        Returns:
+            pandas DataFrame with a 'SeriesID' column, or None if no row was
+            found
+
+        """
+
+        filters = list(filters or [])
+        for (col, op, value) in filters:
+            if op not in FILTER_OPS:
+                raise ValueError("Unknown filter operator: %s" % op)
+        frames = []
+        for seriesID, part_abspath in self.parts(table, series):
+            if part_abspath.endswith('.parquet'):
+                df = read_parquet_part(part_abspath, columns, filters)
+            else:
+                df = read_npy_part(part_abspath, columns, filters)
+            if df is not None and len(df):
+                df.insert(0, 'SeriesID', seriesID)
+                frames.append(df)
+        if not frames:
+            return None
+
+        return pd.concat(frames, ignore_index=True, sort=False)
+
+
+
+def write_npy_part(df, part_abspath):
+    """Write a DataFrame to a folder holding one .npy file per column
+
+    Column names and dtypes are kept in a '_columns.json' file. Text columns
+    are stored as fixed-width unicode arrays, with missing values stored as
+    empty strings.
+
+    """
+
+    os.mkdir(part_abspath)
+    meta = []
+    for i, name in enumerate(df.columns):
+        values = df[name]
+        if pd.api.types.is_numeric_dtype(values) or \
+                pd.api.types.is_bool_dtype(values):
+            array = values.to_numpy()
+        else:
+            array = values.fillna('').astype(str).to_numpy().astype(str)
+        np.save(os.path.join(part_abspath, 'c%d.npy' % i), array,
+                allow_pickle=False)
+        meta.append({'name': str(name), 'file': 'c%d.npy' % i})
+    with open(os.path.join(part_abspath, '_columns.json'), 'w') as f:
+        json.dump(meta, f)
+
+
+def read_npy_part(part_abspath, columns=None, filters=()):
+    """Read columns of a .npy part, keeping rows that satisfy all filters
+
+    Column files are memory-mapped, so that only filtered rows of requested
+    columns are actually read.
+
+    """
+
+    with open(os.path.join(part_abspath, '_columns.json')) as f:
+        files = dict((c['name'], c['file']) for c in json.load(f))
+    arrays = {}
+
+    def column(name):
+        if name not in arrays:
+            arrays[name] = np.load(os.path.join(part_abspath, files[name]),
+                                   mmap_mode='r', allow_pickle=False)
+        return arrays[name]
+
+    mask = None
+    for (col, op, value) in filters:
+        if col not in files:
+            # Rows of parts without filtered column never match
+            return None
+        col_mask = FILTER_OPS[op](column(col), value)
+        mask = col_mask if mask is None else mask & col_mask
+    names = [name for name in (columns or list(files)) if name in files]
+    if mask is None:
+        data = dict((name, np.asarray(column(name))) for name in names)
+    else:
+        rows = np.flatnonzero(mask)
+        data = dict((name, column(name)[rows]) for name in names)
+
+    return pd.DataFrame(data, columns=names)
+
+
+def read_parquet_part(part_abspath, columns=None, filters=()):
+    """Read columns of a Parquet part, keeping rows that satisfy all
+    filters"""
+
+    if pa is None:
+        raise ImportError("pyarrow is required to read Parquet parts")
+    names = pq.ParquetFile(part_abspath).schema_arrow.names
+    for (col, op, value) in filters:
+        if col not in names:
+            return None
+    if columns is not None:
+        columns = [name for name in columns if name in names]
+    pq_filters = [(col, '=' if op == '==' else op,
+                   list(value) if op in ('in', 'not in') else value)
+                  for (col, op, value) in filters]
+    table = pq.read_table(part_abspath, columns=columns,
+                          filters=pq_filters or None)
+
+    return table.to_pandas()
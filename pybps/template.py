@@ -0,0 +1,206 @@
+"""
+Precompiled rendering of simulation template files
+
+Parameters are identified in template files by placeholders made of the
+parameter name with a leading '$' sign ('$NAME' or '${NAME}'). A literal '$'
+sign is written '$$'. The same tokenizer is used to discover parameters,
+validate samples and render templates, so that all of them agree.
+"""
+
+# Common imports
+import io
+import os
+import re
+from math import isnan
+
+
+# Placeholder pattern: escaped '$$', '$NAME' or '${NAME}'
+PLACEHOLDER_PATTERN = re.compile(r"""
+    \$(?:
+        (?P<escaped>\$) |
+        (?P<named>[_a-zA-Z][_a-zA-Z0-9]*) |
+        {(?P<braced>[_a-zA-Z][_a-zA-Z0-9]*)}
+    )
+    """, re.VERBOSE)
+
+# Render plans already compiled in current process, identified by project
+# directory and list of template files (with their size and mtime)
+_render_plans = {}
+
+
+def tokenize(text):
+    """Split template text into literal chunks and parameter slots.
+
+    Text is scanned in a single pass. Rules are those of
+    string.Template.safe_substitute: '$$' is turned into a literal '$' and
+    '$' signs not followed by a valid parameter name are kept as is.
+
+    Args:
+        text: content of template file.
+
+    Returns:
+        list alternating literal chunks (even indices) and slots (odd
+        indices). Each slot is a (parameter name, raw text) tuple.
+    """
+
+    chunks = []
+    literal = []
+    pos = 0
+    for match in PLACEHOLDER_PATTERN.finditer(text):
+        literal.append(text[pos:match.start()])
+        pos = match.end()
+        if match.group('escaped') is not None:
+            literal.append('$')
+        else:
+            chunks.append(''.join(literal))
+            chunks.append((match.group('named') or match.group('braced'),
+                           match.group()))
+            literal = []
+    literal.append(text[pos:])
+    chunks.append(''.join(literal))
+
+    return chunks
+
+
+def is_missing(value):
+    """Return True if parameter value is missing (None or NaN)"""
+
+    if value is None:
+        return True
+    try:
+        return isnan(value)
+    except TypeError:
+        return False
+
+
+
+class CompiledTemplate(object):
+    """Template text split once into literal chunks and parameter slots
+
+    Placeholders with no value (or a None or NaN value) are left untouched
+    when rendering.
+
+    """
+
+    def __init__(self, text):
+        """Initialization of CompiledTemplate Class
+
+        Args:
+            text: content of template file
+
+        """
+
+        # List alternating literal chunks (even indices) and slots (odd
+        # indices). Each slot is a (parameter name, raw text) tuple
+        self.chunks = tokenize(text)
+        # Names of parameters found in template
+        self.params = sorted(set(slot[0] for slot in self.chunks[1::2]))
+
+
+    def render(self, values):
+        """Render template with given parameter values
+
+        Args:
+            values: dict holding parameter values
+
+        Returns:
+            Rendered text
+
+        """
+
+        parts = list(self.chunks)
+        for i in range(1, len(parts), 2):
+            name, raw = parts[i]
+            value = values.get(name)
+            parts[i] = raw if is_missing(value) else '%s' % (value,)
+
+        return ''.join(parts)
+
+
+
+class RenderPlan(object):
+    """Class that holds all template files of a project, read and compiled
+    once, with the relative paths to the simulation input files they render"""
+
+    def __init__(self, base_abspath, temp_relpaths, tmp_sstr):
+        """Initialization of RenderPlan Class
+
+        Args:
+            base_abspath: absolute path to project directory
+            temp_relpaths: list of relative paths to template files
+            tmp_sstr: template file search string (stripped from template
+               file names to build simulation input file names)
+
+        """
+
+        self.base_abspath = base_abspath
+        # List of (template relpath, sim input relpath, CompiledTemplate)
+        self.entries = []
+        pattern = re.compile(r'(.*)' + tmp_sstr + r'(.*)')
+        for temp_relpath in temp_relpaths:
+            match = pattern.search(os.path.basename(temp_relpath))
+            if not match:
+                continue
+            siminput_relpath = os.path.join(os.path.dirname(temp_relpath),
+                                            match.group(1) + match.group(2))
+            with io.open(os.path.join(base_abspath, temp_relpath), 'r',
+                         encoding='latin-1') as tmp_f:
+                compiled = CompiledTemplate(tmp_f.read())
+            self.entries.append((temp_relpath, siminput_relpath, compiled))
+        # Names of parameters found in all templates
+        self.params = sorted(set(param for entry in self.entries
+                                 for param in entry[2].params))
+
+
+    def render(self, values, dst_abspath):
+        """Render all templates with given parameter values and write
+        simulation input files to destination directory
+
+        Args:
+            values: dict holding parameter values
+            dst_abspath: absolute path to destination (job) directory
+
+        Returns:
+            list of absolute paths to written simulation input files
+
+        """
+
+        siminput_abspathlist = []
+        for (temp_relpath, siminput_relpath, compiled) in self.entries:
+            siminput_abspath = os.path.join(dst_abspath, siminput_relpath)
+            # Remove existing file first, which might be a link to a
+            # project file that must not be modified
+            if os.path.lexists(siminput_abspath):
+                os.remove(siminput_abspath)
+            with io.open(siminput_abspath, 'w', encoding='latin-1') as sim_f:
+                sim_f.write(compiled.render(values))
+            siminput_abspathlist.append(siminput_abspath)
+
+        return siminput_abspathlist
+
+
+
+def get_render_plan(base_abspath, temp_relpaths, tmp_sstr):
+    """Get render plan of project templates, compiling it only once per
+    process as long as template files are not modified
+
+    Args:
+        base_abspath: absolute path to project directory
+        temp_relpaths: list of relative paths to template files
+        tmp_sstr: template file search string
+
+    Returns:
+        RenderPlan instance
+
+    """
+
+    key = [base_abspath, tmp_sstr]
+    for temp_relpath in temp_relpaths:
+        st = os.stat(os.path.join(base_abspath, temp_relpath))
+        key.append((temp_relpath, st.st_size, st.st_mtime))
+    key = tuple(key)
+    if key not in _render_plans:
+        _render_plans.clear()
+        _render_plans[key] = RenderPlan(base_abspath, temp_relpaths, tmp_sstr)
+
+    return _render_plans[key]
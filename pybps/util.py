@@ -6,18 +6,26 @@ Miscellaneous utility functions
 import os
 import sys
 import re
-import csv
 import string
 import random
+import signal
+import socket
 import smtplib
 import zipfile
-from subprocess import check_call, STDOUT
+from collections import OrderedDict
+from itertools import chain
+from subprocess import Popen, CalledProcessError, STDOUT, call
+from threading import Timer
 from tempfile import NamedTemporaryFile
-from shutil import rmtree
+from time import sleep
+from shutil import rmtree, copy2
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email import encoders
 
+# Third-party imports
+import numpy as np
+
 # Handle Python 2/3 compatibility
 from six.moves import email_mime_base
 MIMEBase = email_mime_base.MIMEBase
@@ -88,16 +96,178 @@ def get_file_paths(pattern_list, dir):
         list of paths to files containing specified pattern.
     """
 
-    paths_list = []
+    return DirIndex(dir).find(pattern_list)
+
+
+class DirIndex(object):
+    """In-memory index of files found in a directory tree.
+
+    The directory tree is walked only once, when the first query is made.
+    Queries are answered from memory and their results are cached, until
+    the index is explicitly invalidated (for example after files have been
+    added to or removed from the directory tree).
+
+    """
+
+    def __init__(self, dir):
+        # Absolute path to indexed directory
+        self.dir = dir
+        # Ordered mapping of sub-folder paths to lists of file names
+        self._tree = None
+        # Cache of query results, with query as key
+        self._queries = {}
+
+    def invalidate(self):
+        """Forget indexed files, so that directory is walked again on next
+        query"""
+        self._tree = None
+        self._queries = {}
+
+    def _get_tree(self):
+        if self._tree is None:
+            self._tree = OrderedDict()
+            for root, dirs, files in os.walk(self.dir):
+                if files:
+                    self._tree[root] = files
+        return self._tree
+
+    def files(self, subdir=None):
+        """Get paths to all files in index.
+
+        Args:
+            subdir: if given, only files directly in this sub-folder
+                (absolute path or path relative to indexed directory) are
+                returned.
+
+        Returns:
+            list of paths to files.
+        """
+
+        tree = self._get_tree()
+        if subdir is None:
+            return [os.path.join(root, name)
+                    for root, files in tree.items() for name in files]
+        root = os.path.join(self.dir, subdir)
+
+        return [os.path.join(root, name) for name in tree.get(root, [])]
+
+    def find(self, pattern_list, subdir=None):
+        """Get paths to files with name following specified pattern.
+
+        Args:
+            pattern_list: list of search patterns (each pattern as string).
+            subdir: if given, only files directly in this sub-folder are
+                searched (see 'files' method).
+
+        Returns:
+            list of paths to files containing specified pattern.
+        """
+
+        key = ('find', tuple(p.strip() for p in pattern_list), subdir)
+        if key not in self._queries:
+            pat = compile_patterns(pattern_list)
+            self._queries[key] = [] if pat is None else [
+                path for path in self.files(subdir)
+                if pat.search(os.path.basename(path))]
+
+        return list(self._queries[key])
+
+    def find_suffix(self, suffix_list, subdir=None):
+        """Get paths to files with name ending with one of the specified
+        suffixes (plain strings, not regular expressions).
+
+        Args:
+            suffix_list: list of suffixes (each suffix as string).
+            subdir: if given, only files directly in this sub-folder are
+                searched (see 'files' method).
+
+        Returns:
+            list of paths to files ending with specified suffix.
+        """
+
+        suffixes = tuple(s.strip() for s in suffix_list if s.strip())
+        key = ('suffix', suffixes, subdir)
+        if key not in self._queries:
+            self._queries[key] = [path for path in self.files(subdir)
+                                  if path.endswith(suffixes)]
+
+        return list(self._queries[key])
+
+
+def link_tree(src, dst, copy_patterns=(), exclude_patterns=(), mode='link',
+              link_patterns=()):
+    """Create a lightweight copy of a directory tree.
+
+    Files matching one of the link patterns (read-only input files) are
+    hardlinked to the source file (or symlinked if hardlinks are not
+    supported, or copied as a last resort), unless they match one of the copy
+    patterns. Files matching one of the exclude patterns are left out and all
+    other files are copied, so that files written by the simulation never
+    alias source files. In 'copy' mode, all files that are not excluded are
+    copied.
 
-    for root, dirs, files in os.walk(dir):
+    Args:
+        src: absolute path to source directory.
+        dst: absolute path to destination directory (must not exist).
+        copy_patterns: list of search patterns (each pattern as string) for
+            files that should always be copied (files modified by simulation).
+        exclude_patterns: list of search patterns for files to be left out.
+        mode: either 'link' or 'copy'.
+        link_patterns: list of search patterns for files that can be
+            hardlinked (input files never modified by simulation).
+
+    Returns:
+        Total size in bytes of copied files.
+    """
+
+    link_pat = compile_patterns(link_patterns)
+    copy_pat = compile_patterns(copy_patterns)
+    exclude_pat = compile_patterns(exclude_patterns)
+    copied = 0
+
+    for root, dirs, files in os.walk(src):
+        dst_root = os.path.join(dst, os.path.relpath(root, src))
+        if not os.path.isdir(dst_root):
+            os.makedirs(dst_root)
         for name in files:
-            for pattern in pattern_list:
-                match = re.search(r'.*' + pattern.strip() + r'.*', name)
-                if match:
-                    paths_list.append(os.path.join(root, name))
+            if exclude_pat and exclude_pat.search(name):
+                continue
+            src_f = os.path.join(root, name)
+            dst_f = os.path.join(dst_root, name)
+            if mode == 'link' and link_pat and link_pat.search(name) and \
+                    not (copy_pat and copy_pat.search(name)):
+                try:
+                    os.link(src_f, dst_f)
+                    continue
+                except (AttributeError, OSError):
+                    pass
+                try:
+                    os.symlink(src_f, dst_f)
+                    continue
+                except (AttributeError, NotImplementedError, OSError):
+                    pass
+            copy2(src_f, dst_f)
+            copied += os.path.getsize(dst_f)
+
+    return copied
+
+
+def compile_patterns(pattern_list):
+    """Compile a list of search patterns into a single regular expression.
 
-    return paths_list
+    Args:
+        pattern_list: list of search patterns (each pattern as string).
+
+    Returns:
+        Compiled regular expression matching any of the patterns, or None if
+        the list contains no pattern.
+    """
+
+    patterns = [p.strip() for p in pattern_list if p.strip()]
+    if not patterns:
+        return None
+
+    return re.compile('|'.join('(?:%s)' % p for p in patterns))
 
 
 def dict_cleanconvert(dict):
@@ -124,26 +294,236 @@ def dict_cleanconvert(dict):
     return dict
 
 
-def run_cmd(cmd, debug=False):
+class ColumnBuffer(object):
+    """Columnar buffer used to collect parsed results before building a
+    pandas DataFrame.
+
+    Rows are appended in batches (typically one batch per parsed result file)
+    and stored column by column as a list of chunks, so that the final
+    DataFrame is built only once, whatever the number of batches.
+    Batches can be given either as lists of dicts (one dict per row) or as
+    dicts of columns (lists or NumPy arrays). Columns missing from a batch
+    are padded with None values.
+
+    """
+
+    def __init__(self):
+        # Ordered mapping of column names to lists of chunks
+        self.columns = OrderedDict()
+        # Total number of rows stored in buffer
+        self.nrows = 0
+
+    def __len__(self):
+        return self.nrows
+
+    def _pad(self, name, n):
+        """Add a chunk of n empty values to a column, creating it if needed"""
+        if name not in self.columns:
+            self.columns[name] = [[None] * self.nrows] if self.nrows else []
+        if n:
+            self.columns[name].append([None] * n)
+
+    def extend(self, batch, **constants):
+        """Append a batch of rows.
+
+        Args:
+            batch: either a list of dicts (one dict per row) or a dict of
+                columns (all columns of same length).
+            constants: optional column values shared by all rows of the batch
+                (for example JobID=...).
+
+        """
+
+        if isinstance(batch, dict):
+            columns = OrderedDict((k, v) for k, v in batch.items()
+                                  if k not in constants)
+            n = len(next(iter(columns.values()))) if columns else 0
+        else:
+            n = len(batch)
+            columns = OrderedDict()
+            for row in batch:
+                for key in row:
+                    if key not in constants and key not in columns:
+                        columns[key] = None
+            for name in columns:
+                columns[name] = [row.get(name) for row in batch]
+        if not n:
+            return
+        names = list(columns)
+        for name in names:
+            if name not in self.columns:
+                self._pad(name, 0)
+            self.columns[name].append(columns[name])
+        for name, value in constants.items():
+            if name not in self.columns:
+                self._pad(name, 0)
+            self.columns[name].append([value] * n)
+        # Pad columns absent from current batch
+        for name in self.columns:
+            if name not in names and name not in constants:
+                self._pad(name, n)
+        self.nrows += n
+
+    def to_dict(self):
+        """Return buffer content as an ordered dict of columns. Columns made
+        only of NumPy array chunks are concatenated into a single array,
+        other columns are returned as lists"""
+
+        columns = OrderedDict()
+        for name, chunks in self.columns.items():
+            if all(isinstance(c, np.ndarray) for c in chunks):
+                columns[name] = np.concatenate(chunks)
+            else:
+                columns[name] = list(chain.from_iterable(chunks))
+
+        return columns
+
+
+class CommandTimeout(Exception):
+    """Raised when a command did not end within its timeout"""
+
+    def __init__(self, cmd, timeout):
+        Exception.__init__(self, 'Command killed after %s seconds: %s' %
+                           (timeout, ' '.join(str(c) for c in cmd)))
+        self.cmd = cmd
+        self.timeout = timeout
+
+
+def run_cmd(cmd, debug=False, timeout=None, pid_abspath=None):
     """Run a shell command.
 
     Args:
         cmd: shell command in list format.
+        debug: if True, standard output of command is not captured.
+        timeout: if given, command (and all of its sub-processes) is killed
+            if it did not end after this number of seconds.
+        pid_abspath: if given, host name and ID of command process are
+            written to this file, so that it can be killed by another
+            process of the same host (see 'kill_tree').
+
+    Returns:
+        dict with CPU time ('cpu', in seconds) and peak resident memory
+        ('maxrss', in MB) of command process (and of the sub-processes it
+        waited for), or an empty dict if they could not be measured.
 
     Raises:
+        CommandTimeout: command was killed after timeout.
+        CalledProcessError: command returned a non-zero exit status.
         Problem executing: cmd
     """
 
-    try:
-        if debug == False:
-            with NamedTemporaryFile() as f:
-                check_call(cmd, stdout=f, stderr=STDOUT)
-                #f.seek(0)
-                #output = f.read()
+    usage = {}
+    expired = []
+    kwargs = {}
+    # Run command in a new process group, so that it can be killed along
+    # with all of its sub-processes
+    if os.name == 'posix':
+        if sys.version_info[0] >= 3:
+            kwargs['start_new_session'] = True
         else:
-            check_call(cmd)
+            kwargs['preexec_fn'] = os.setsid
+    try:
+        with NamedTemporaryFile() as f:
+            if debug == False:
+                kwargs['stdout'] = f
+                kwargs['stderr'] = STDOUT
+            proc = Popen(cmd, **kwargs)
+            if pid_abspath is not None:
+                with open(pid_abspath, 'w') as pid_f:
+                    pid_f.write('%s %d' % (socket.gethostname(), proc.pid))
+            if timeout:
+                def expire():
+                    expired.append(True)
+                    kill_tree(proc.pid)
+                timer = Timer(timeout, expire)
+                timer.start()
+            try:
+                usage = wait_usage(proc)
+            finally:
+                if timeout:
+                    timer.cancel()
+            #f.seek(0)
+            #output = f.read()
     except OSError:
         sys.stderr.write('Problem executing: ' + ' '.join(cmd))
+        return usage
+    if expired:
+        raise CommandTimeout(cmd, timeout)
+    if proc.returncode:
+        raise CalledProcessError(proc.returncode, cmd)
+
+    return usage
+
+
+def kill_tree(pid):
+    """Kill a process started by 'run_cmd' and all of its sub-processes.
+
+    Args:
+        pid: ID of process.
+    """
+
+    try:
+        if os.name == 'posix':
+            os.killpg(pid, signal.SIGKILL)
+        else:
+            with open(os.devnull, 'w') as devnull:
+                call(['taskkill', '/T', '/F', '/PID', str(pid)],
+                     stdout=devnull, stderr=STDOUT)
+    except OSError:
+        # Process already ended
+        pass
+
+
+def wait_usage(proc):
+    """Wait for a process to end and get its resource usage.
+
+    On POSIX systems, resource usage is given by the 'wait4' system call.
+    Note that on Linux, peak memory of the process includes memory of the
+    calling process at the time it was forked.
+    On other systems, the process is polled with the 'psutil' package, if
+    installed.
+
+    Args:
+        proc: subprocess.Popen instance.
+
+    Returns:
+        dict with 'cpu' and 'maxrss' keys (see 'run_cmd' function), or an
+        empty dict if resource usage could not be measured.
+    """
+
+    if hasattr(os, 'wait4'):
+        pid, status, rusage = os.wait4(proc.pid, 0)
+        if os.WIFSIGNALED(status):
+            proc.returncode = -os.WTERMSIG(status)
+        else:
+            proc.returncode = os.WEXITSTATUS(status)
+        # Peak memory is given in bytes on Mac OS X and in KB elsewhere
+        maxrss = rusage.ru_maxrss / (1024. ** 2 if sys.platform == 'darwin'
+                                     else 1024.)
+        return {'cpu': round(rusage.ru_utime + rusage.ru_stime, 3),
+                'maxrss': round(maxrss, 1)}
+
+    try:
+        import psutil
+    except ImportError:
+        proc.wait()
+        return {}
+    usage = {}
+    try:
+        ps = psutil.Process(proc.pid)
+        while proc.poll() is None:
+            # Counters can no longer be read once process has ended, so the
+            # last values read while it was running are kept
+            mem = ps.memory_info()
+            maxrss = getattr(mem, 'peak_wset', mem.rss) / 1024. ** 2
+            usage['maxrss'] = round(max(usage.get('maxrss', 0), maxrss), 1)
+            usage['cpu'] = round(sum(ps.cpu_times()[:2]), 3)
+            sleep(0.1)
+    except psutil.Error:
+        pass
+    proc.wait()
+
+    return usage
 
 
 def zip(src, dst):
@@ -25,5 +25,6 @@ setup(
     packages = find_packages(),
     package_data = {'':['*.ini']},
     install_requires = ['pandas'],
+    extras_require = {'parquet': ['pyarrow']},
     scripts = ['bin/run-pybps.py','bin/pybps_daysim-exe.bat'],
 )
@@ -0,0 +1,47 @@
+"""
+Tests of the normalized simulation results database
+"""
+
+import numpy as np
+import pandas as pd
+
+from pybps import db
+
+
+MONTHS = ['January', 'February']
+
+
+def write_series(db_abspath):
+    jobs_df = pd.DataFrame({'A': [1.5, 2.5]}, index=['S_00001', 'S_00002'])
+    results_df = pd.DataFrame({'JobID': np.repeat(jobs_df.index, 2),
+                               'Month': MONTHS * 2, 'Q': [1., 2., 3., 4.],
+                               'N': [1, 2, 3, 4]})
+    db.write(db_abspath, 'S', jobs_df, results_df)
+    # Later batch adds parameters and variables
+    jobs_df = pd.DataFrame({'A': [3.5], 'B': ['x']}, index=['S_00003'])
+    results_df = pd.DataFrame({'JobID': ['S_00003'] * 2, 'Month': MONTHS,
+                               'Q': [5., 6.], 'T': ['a', 'b']})
+    db.write(db_abspath, 'S', jobs_df, results_df)
+
+
+def test_value_types(tmpdir):
+    db_abspath = str(tmpdir.join('SimResults.db'))
+    write_series(db_abspath)
+    results_df = db.load_results(db_abspath)
+
+    assert str(results_df['N'].dtype) == 'Int64'
+    assert results_df['Q'].dtype == np.float64
+    assert results_df['T'].dtype == object
+    assert results_df['N'].isnull().sum() == 2
+
+
+def test_chunks_share_columns(tmpdir):
+    db_abspath = str(tmpdir.join('SimResults.db'))
+    write_series(db_abspath)
+    chunks = list(db.load_results(db_abspath, chunksize=2))
+
+    assert sum(len(chunk) for chunk in chunks) == 6
+    assert all(chunk.columns.tolist() == chunks[0].columns.tolist()
+               for chunk in chunks)
+    assert all(chunk.dtypes.tolist() == chunks[0].dtypes.tolist()
+               for chunk in chunks)
@@ -0,0 +1,117 @@
+"""
+Tests of the daylight coefficient cache with a stub gen_dc executable
+"""
+
+import os
+import sys
+import stat
+from multiprocessing import Pool
+from time import sleep
+
+from pybps.cache import StageCache
+from pybps.preprocess.daysim import gen_dc
+
+
+STUB_GEN_DC = '''#!%s
+import os, sys, time
+# Count invocations, then write daylight coefficients next to header file
+with open(os.path.join(os.path.dirname(__file__), 'calls.txt'), 'a') as f:
+    f.write(sys.argv[1] + '\\n')
+time.sleep(0.5)
+work_dir = os.path.dirname(sys.argv[1])
+with open(os.path.join(work_dir, 'model.dc'), 'w') as f:
+    f.write('dc of ' + open(os.path.join(work_dir, 'geometry.rad')).read())
+'''
+
+HEADER = '''project_name job
+occupancy occ_%s.csv
+sensor_file sensors.pts
+'''
+
+
+def make_stub(dir_abspath):
+    bin_dir = os.path.join(dir_abspath, 'bin')
+    os.makedirs(bin_dir)
+    stub_abspath = os.path.join(bin_dir, 'gen_dc')
+    with open(stub_abspath, 'w') as f:
+        f.write(STUB_GEN_DC % sys.executable)
+    os.chmod(stub_abspath, os.stat(stub_abspath).st_mode | stat.S_IEXEC)
+
+    return bin_dir
+
+
+def make_job(root, name, geometry, occupancy):
+    job_abspath = os.path.join(root, name)
+    os.makedirs(job_abspath)
+    with open(os.path.join(job_abspath, 'geometry.rad'), 'w') as f:
+        f.write(geometry)
+    with open(os.path.join(job_abspath, 'sensors.pts'), 'w') as f:
+        f.write('0 0 0.8 0 0 1\n')
+    hea_abspath = os.path.join(job_abspath, 'model.hea')
+    with open(hea_abspath, 'w') as f:
+        f.write(HEADER % occupancy)
+
+    return hea_abspath
+
+
+def run_gen_dc(args):
+    hea_abspath, bin_dir, cache_abspath = args
+    restored = gen_dc(hea_abspath, bin_dir, cache_abspath)
+    with open(os.path.join(os.path.dirname(hea_abspath), 'model.dc')) as f:
+        return restored, f.read()
+
+
+def test_gen_dc_runs_once_per_geometry(tmpdir):
+    bin_dir = make_stub(str(tmpdir))
+    cache_abspath = str(tmpdir.join('_pybps_dc'))
+    # Jobs only differ by occupancy, which does not affect daylight
+    # coefficients, or by geometry
+    args = [(make_job(str(tmpdir), 'job%d' % i, 'room %d' % (i % 2), i),
+             bin_dir, cache_abspath) for i in range(8)]
+    pool = Pool(8)
+    try:
+        results = pool.map(run_gen_dc, args)
+    finally:
+        pool.close()
+        pool.join()
+
+    with open(str(tmpdir.join('bin', 'calls.txt'))) as f:
+        assert len(f.read().splitlines()) == 2
+    assert [dc for (restored, dc) in results] == \
+        ['dc of room %d' % (i % 2) for i in range(8)]
+    assert sorted(restored for (restored, dc) in results) == [False] * 2 + \
+        [True] * 6
+    # No lock or temporary folder is left
+    assert len(os.listdir(cache_abspath)) == 2
+
+
+def slow_stage(args):
+    work_abspath, cache_abspath = args
+    os.makedirs(work_abspath)
+
+    def stage():
+        with open(os.path.join(os.path.dirname(work_abspath), 'calls.txt'),
+                  'a') as f:
+            f.write(work_abspath + '\n')
+        # Stage runs longer than lock timeout
+        sleep(2.5)
+        with open(os.path.join(work_abspath, 'model.dc'), 'w') as f:
+            f.write('dc')
+
+    return StageCache(cache_abspath, lock_timeout=1).run('key', work_abspath,
+                                                         stage)
+
+
+def test_stage_longer_than_lock_timeout_runs_once(tmpdir):
+    cache_abspath = str(tmpdir.join('_pybps_dc'))
+    pool = Pool(4)
+    try:
+        restored = pool.map(slow_stage, [(str(tmpdir.join('job%d' % i)),
+                                          cache_abspath) for i in range(4)])
+    finally:
+        pool.close()
+        pool.join()
+
+    with open(str(tmpdir.join('calls.txt'))) as f:
+        assert len(f.read().splitlines()) == 1
+    assert sorted(restored) == [False, True, True, True]
@@ -0,0 +1,35 @@
+"""
+Tests of job lifecycle event sinks
+"""
+
+import json
+
+from pybps.events import ChromeTraceSink
+
+
+def make_event(name, start, pid, tid=None):
+    event = {'name': name, 'when': 'after', 'time': start + 1.,
+             'start': start, 'duration': 1., 'bytes': None,
+             'job': 'S_00001', 'pid': pid}
+    if tid is not None:
+        event['tid'] = tid
+    return event
+
+
+def test_workers_of_one_process_get_own_tracks(tmpdir):
+    trace_abspath = str(tmpdir.join('trace.json'))
+    sink = ChromeTraceSink(trace_abspath)
+    # Events of two asyncio worker slots, then of pool worker processes
+    sink.handle(make_event('run', 0., 100, 0))
+    sink.handle(make_event('run', 0., 100, 1))
+    sink.handle(make_event('close', 1., 100, 0))
+    sink.handle(make_event('run', 0., 200))
+    sink.handle(make_event('run', 0., 300, 300))
+    sink.close()
+
+    with open(trace_abspath) as f:
+        trace = json.load(f)
+    assert [(e['pid'], e['tid']) for e in trace if e['ph'] == 'X'] == \
+        [(100, 0), (100, 1), (100, 0), (200, 200), (300, 300)]
+    assert [e['args']['name'] for e in trace if e['name'] == 'thread_name'] \
+        == ['worker 0', 'worker 1']
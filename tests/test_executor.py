@@ -0,0 +1,124 @@
+"""
+Tests of the shared-directory work queue with local worker processes
+"""
+
+import os
+import multiprocessing
+from time import time, sleep
+
+from pybps.executor import FileQueueExecutor, run_worker, stop_workers
+
+
+class StubJob(object):
+    """Picklable job with the attributes used by workers"""
+
+    def __init__(self, root, jobID, duration=0.):
+        self.root = root
+        self.jobID = jobID
+        self.duration = duration
+        self.set_attempt(1)
+
+
+    def set_attempt(self, attempt, lease=0):
+        self.attempt = attempt
+        self.abspath = os.path.join(self.root, '%s_l%d' % (self.jobID, lease))
+
+
+
+def run_stub(job):
+    """Record start and end of job in its folder"""
+
+    os.makedirs(job.abspath)
+    open(os.path.join(job.abspath, 'started'), 'w').close()
+    sleep(job.duration)
+    open(os.path.join(job.abspath, 'ended'), 'w').close()
+
+    return job.abspath
+
+
+def start_workers(queue_abspath, n):
+    workers = [multiprocessing.Process(target=run_worker, args=(queue_abspath,),
+                                       kwargs={'heartbeat': 0.1, 'poll': 0.05})
+               for i in range(n)]
+    for w in workers:
+        w.daemon = True
+        w.start()
+
+    return workers
+
+
+def wait_all(executor, tasks, timeout=30):
+    """Get results of all tasks, in submission order"""
+
+    start = time()
+    while len(executor.ready(tasks)) < len(tasks):
+        assert time() - start < timeout, 'tasks did not end in time'
+        sleep(0.05)
+
+    return [task.get() for task in tasks]
+
+
+def stop_all(queue_abspath, workers, timeout=10):
+    stop_workers(queue_abspath)
+    for w in workers:
+        w.join(timeout)
+
+    return [w.is_alive() for w in workers]
+
+
+def test_each_job_runs_once(tmpdir):
+    queue_abspath = str(tmpdir.join('queue'))
+    jobs_abspath = str(tmpdir.join('jobs'))
+    executor = FileQueueExecutor(queue_abspath, lease_timeout=10)
+    workers = start_workers(queue_abspath, 3)
+    try:
+        jobs = [StubJob(jobs_abspath, 'J%02d' % i, 0.05) for i in range(20)]
+        tasks = [executor.submit(run_stub, job) for job in jobs]
+        results = wait_all(executor, tasks)
+    finally:
+        alive = stop_all(queue_abspath, workers)
+
+    assert results == [job.abspath for job in jobs]
+    assert sorted(os.listdir(jobs_abspath)) == sorted(
+        os.path.basename(job.abspath) for job in jobs)
+    assert os.listdir(os.path.join(queue_abspath, 'done')) == []
+    assert os.listdir(os.path.join(queue_abspath, 'leased')) == []
+    assert not any(alive)
+
+
+def test_killed_worker_job_is_requeued(tmpdir):
+    queue_abspath = str(tmpdir.join('queue'))
+    jobs_abspath = str(tmpdir.join('jobs'))
+    executor = FileQueueExecutor(queue_abspath, lease_timeout=0.5)
+    job = StubJob(jobs_abspath, 'SLOW', 2.)
+    task = executor.submit(run_stub, job)
+    worker, = start_workers(queue_abspath, 1)
+    started = os.path.join(job.abspath, 'started')
+    start = time()
+    while not os.path.exists(started):
+        assert time() - start < 10, 'job was not leased'
+        sleep(0.05)
+    # Kill worker in the middle of its lease
+    worker.terminate()
+    worker.join()
+    workers = start_workers(queue_abspath, 2)
+    try:
+        result, = wait_all(executor, [task])
+    finally:
+        alive = stop_all(queue_abspath, workers)
+
+    # Job was run again in a folder of its own
+    assert result == os.path.join(jobs_abspath, 'SLOW_l1')
+    assert os.path.exists(os.path.join(result, 'ended'))
+    assert not os.path.exists(os.path.join(job.abspath, 'ended'))
+    assert not any(alive)
+
+
+def test_stop_workers(tmpdir):
+    queue_abspath = str(tmpdir.join('queue'))
+    workers = start_workers(queue_abspath, 3)
+    sleep(0.5)
+    assert all(w.is_alive() for w in workers)
+
+    assert not any(stop_all(queue_abspath, workers))
+    assert os.listdir(os.path.join(queue_abspath, 'workers')) == []
@@ -0,0 +1,37 @@
+"""
+Tests of the field extraction engine
+"""
+
+from pybps.postprocess.extract import Field, FieldExtractor
+
+
+LOG = ''.join('*** Warning at time : %d\n    TRNSYS Message %d : Odd\n' %
+              (i, 100 + i % 3) for i in range(50)) + 'Total Warnings : 50\n'
+
+
+def make_extractor():
+    return FieldExtractor([
+        Field('WarningCount', r'TRNSYS Message \d+', mode='count'),
+        # Same pattern as previous field
+        Field('Messages', r'TRNSYS Message \d+', mode='distinct'),
+        # Matches part of the text matched by 'Time'
+        Field('FirstMessage', r'Message (\d+)', int, separate=True),
+        Field('Time', r'Warning at time : (\d+)', int, mode='last'),
+        Field('Warnings', r'Total Warnings : (\d+)', int)], overlap=64)
+
+
+EXPECTED = {'WarningCount': 50, 'FirstMessage': 100, 'Time': 49,
+            'Messages': ['TRNSYS Message 100', 'TRNSYS Message 101',
+                         'TRNSYS Message 102'], 'Warnings': 50}
+
+
+def test_overlapping_fields():
+    assert make_extractor().extract(LOG) == EXPECTED
+
+
+def test_overlapping_fields_in_file(tmpdir):
+    log = tmpdir.join('Model.log')
+    log.write(LOG)
+
+    assert make_extractor().extract_file(str(log), chunk_size=100) == \
+        EXPECTED
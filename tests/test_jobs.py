@@ -0,0 +1,65 @@
+"""
+Tests of the column-wise parameter sample
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pybps.jobs import Sample
+
+
+def make_sample():
+    df = pd.DataFrame({'WIDTH': [5, 10, 15], 'U': [0.2, 0.3, 0.4],
+                       'GLAZING': ['single', 'double', 'triple']})
+
+    return Sample.from_df(df, {'ModelFile': 'Model.dck'})
+
+
+def test_rows_are_copies():
+    sample = make_sample()
+    sample[0]['WIDTH'] = 50
+
+    assert sample[0]['WIDTH'] == 5
+
+
+def test_set_value():
+    sample = make_sample()
+    sample.set_value(1, 'WIDTH', 12)
+    sample.set_value(2, 'U', 1)
+    # Integer column gets float value
+    sample.set_value(0, 'WIDTH', 7.5)
+    # Constant parameter only changed in one row
+    sample.set_value(2, 'ModelFile', 'Large.dck')
+    # New parameter
+    sample.set_value(0, 'HEIGHT', 3)
+
+    assert [row['WIDTH'] for row in sample] == [7.5, 12, 15]
+    assert [row['U'] for row in sample] == [0.2, 0.3, 1.0]
+    assert [row['ModelFile'] for row in sample] == ['Model.dck'] * 2 + \
+        ['Large.dck']
+    assert sample[0]['HEIGHT'] == 3
+    assert np.isnan(sample[1]['HEIGHT'])
+    assert sample.frame()['ModelFile'].tolist() == [row['ModelFile']
+                                                    for row in sample]
+
+
+def test_set_row():
+    sample = make_sample()
+    sample[-1] = {'WIDTH': 'auto', 'GLAZING': 'double'}
+
+    assert sample[2] == {'WIDTH': 'auto', 'U': 0.4, 'GLAZING': 'double',
+                         'ModelFile': 'Model.dck'}
+    assert sample[0]['WIDTH'] == 5
+    with pytest.raises(IndexError):
+        sample[3] = {'WIDTH': 1}
+
+
+def test_read_csv(tmpdir):
+    samp = tmpdir.join('Model_Samples.csv')
+    samp.write('WIDTH,U\n5,0.2\n10,0.3\n')
+    sample = Sample.read_csv(str(samp), {'SampleFile': 'Model_Samples.csv'})
+
+    assert len(sample) == 2
+    assert sample[1] == {'WIDTH': 10, 'U': 0.3,
+                         'SampleFile': 'Model_Samples.csv'}
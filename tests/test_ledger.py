@@ -0,0 +1,51 @@
+"""
+Tests of the job ledger used to resume batch runs
+"""
+
+import sqlite3
+
+from pybps.ledger import JobLedger
+
+
+def test_only_ok_jobs_are_completed(tmpdir):
+    db_abspath = str(tmpdir.join('SimResults.db'))
+    ledger = JobLedger(db_abspath)
+    ledger.record({'JobID': 'S_00001', 'Message': 'Simulation ended',
+                   'Warnings': 0, 'Errors': 0, 'Status': 'ok'})
+    # Log reports errors
+    ledger.record({'JobID': 'S_00002', 'Message': 'Simulation stopped',
+                   'Warnings': 0, 'Errors': 2, 'Status': 'ok'})
+    # Error count not found in log
+    ledger.record({'JobID': 'S_00003', 'Message': 'Simulation stopped',
+                   'Warnings': None, 'Errors': None, 'Status': 'ok'})
+    ledger.record({'JobID': 'S_00004', 'Message': 'Job failed',
+                   'Warnings': None, 'Errors': 1, 'Status': 'timeout'})
+    ledger.record({'JobID': 'S_00005', 'Message': 'Job attempt cancelled',
+                   'Status': 'cancelled'})
+    # Simulation tool without log summary
+    ledger.record({'JobID': 'S_00006', 'Status': 'ok'})
+
+    assert sorted(ledger.completed('S')) == ['S_00001', 'S_00006']
+    assert dict(ledger.cnx.execute('SELECT JobID, Status FROM JobLedger')) \
+        == {'S_00001': 'ok', 'S_00002': 'failed', 'S_00003': 'aborted',
+            'S_00004': 'failed', 'S_00005': 'aborted', 'S_00006': 'ok'}
+    ledger.close()
+
+
+def test_ledger_of_older_version_is_upgraded(tmpdir):
+    db_abspath = str(tmpdir.join('SimResults.db'))
+    cnx = sqlite3.connect(db_abspath)
+    cnx.execute('CREATE TABLE JobLedger (JobID TEXT PRIMARY KEY, ' +
+                'SeriesID TEXT, Message TEXT, Warnings INTEGER, ' +
+                'Errors INTEGER, SimulTime REAL, Timestamp REAL)')
+    cnx.execute("INSERT INTO JobLedger VALUES ('S_00001', 'S', NULL, NULL, " +
+                "NULL, 1.0, 0)")
+    cnx.commit()
+    cnx.close()
+
+    ledger = JobLedger(db_abspath)
+    # Job recorded without status is run again
+    assert ledger.completed('S') == {}
+    ledger.record({'JobID': 'S_00001', 'Errors': 0, 'Status': 'ok'})
+    assert list(ledger.completed('S')) == ['S_00001']
+    ledger.close()
@@ -0,0 +1,38 @@
+"""
+Tests of TRNSYS log file parsing
+"""
+
+from pybps.postprocess.trnsys import parse_log, LOG_TAIL_SIZE
+
+
+WARNINGS = '*** Warning at time : %d\n    TRNSYS Message 123 : Odd\n'
+SUMMARY = '''Simulation stopped with errors
+Total Warnings   :  3
+Total Fatal Errors  :  2
+'''
+
+
+def write_log(tmpdir, trailer=''):
+    log = tmpdir.join('Model.log')
+    log.write(''.join(WARNINGS % i for i in range(3)) + SUMMARY + trailer)
+
+    return str(log)
+
+
+def test_summary_in_tail(tmpdir):
+    runsumdict = parse_log(write_log(tmpdir))
+
+    assert runsumdict == {'Message': 'Simulation stopped with errors',
+                          'Warnings': 3, 'Errors': 2}
+
+
+def test_summary_before_tail(tmpdir):
+    # Long messages written after summary block
+    trailer = ('x' * 99 + '\n') * (2 * LOG_TAIL_SIZE // 100)
+    log_abspath = write_log(tmpdir, trailer)
+
+    assert parse_log(log_abspath) == {
+        'Message': 'Simulation stopped with errors', 'Warnings': 3,
+        'Errors': 2}
+    assert parse_log(log_abspath, 5)['WarningMessages'] == \
+        'TRNSYS Message 123 : Odd'
@@ -0,0 +1,90 @@
+"""
+Tests of the Type56 matrix cache with a stub TRNBUILD executable
+"""
+
+import os
+import sys
+import stat
+from multiprocessing import Pool
+
+from pybps.preprocess.trnsys import gen_type56_matrix
+
+
+STUB_TRNBUILD = '''#!%s
+import os, sys, time
+# Count invocations, then write a matrix next to the .b17 file
+with open(os.path.join(os.path.dirname(__file__), 'calls.txt'), 'a') as f:
+    f.write(' '.join(sys.argv[1:]) + '\\n')
+time.sleep(0.5)
+b17 = sys.argv[1]
+with open(os.path.splitext(b17)[0] + '.ism', 'w') as f:
+    f.write('matrix of ' + open(b17).read())
+'''
+
+
+def make_stub(dir_abspath):
+    stub_abspath = os.path.join(dir_abspath, 'trnbuild.py')
+    with open(stub_abspath, 'w') as f:
+        f.write(STUB_TRNBUILD % sys.executable)
+    os.chmod(stub_abspath, os.stat(stub_abspath).st_mode | stat.S_IEXEC)
+
+    return stub_abspath
+
+
+def make_job(root, name, geometry):
+    job_abspath = os.path.join(root, name)
+    os.makedirs(job_abspath)
+    b17_abspath = os.path.join(job_abspath, 'Building.b17')
+    with open(b17_abspath, 'w') as f:
+        f.write(geometry)
+
+    return b17_abspath
+
+
+def gen_masks(args):
+    b17_abspath, stub_abspath, cache_abspath, max_size = args
+    gen_type56_matrix(b17_abspath, stub_abspath, '/masks', cache_abspath,
+                      max_size)
+    with open(os.path.splitext(b17_abspath)[0] + '.ism') as f:
+        return f.read()
+
+
+def calls(tmpdir):
+    with open(str(tmpdir.join('calls.txt'))) as f:
+        return f.read().splitlines()
+
+
+def test_trnbuild_runs_once_per_geometry(tmpdir):
+    stub_abspath = make_stub(str(tmpdir))
+    cache_abspath = str(tmpdir.join('_pybps_type56'))
+    b17_abspaths = [make_job(str(tmpdir), 'job%d' % i, 'WALL 1')
+                    for i in range(6)]
+    pool = Pool(6)
+    try:
+        matrices = pool.map(gen_masks, [(b17, stub_abspath, cache_abspath,
+                                         None) for b17 in b17_abspaths])
+    finally:
+        pool.close()
+        pool.join()
+
+    assert len(calls(tmpdir)) == 1
+    assert matrices == ['matrix of WALL 1'] * 6
+    # Jobs get their own copy of cached matrix
+    ism_abspath = os.path.splitext(b17_abspaths[0])[0] + '.ism'
+    assert os.stat(ism_abspath).st_nlink == 1
+
+
+def test_cache_is_bounded(tmpdir):
+    stub_abspath = make_stub(str(tmpdir))
+    cache_abspath = str(tmpdir.join('_pybps_type56'))
+    for i in range(5):
+        b17_abspath = make_job(str(tmpdir), 'job%d' % i, 'WALL %d' % i)
+        gen_masks((b17_abspath, stub_abspath, cache_abspath, 40))
+
+    # Each matrix is 16 bytes, so that only the last two are kept
+    assert len(calls(tmpdir)) == 5
+    assert len(os.listdir(cache_abspath)) == 2
+    b17_abspath = make_job(str(tmpdir), 'again', 'WALL 4')
+    assert gen_masks((b17_abspath, stub_abspath, cache_abspath, 40)) == \
+        'matrix of WALL 4'
+    assert len(calls(tmpdir)) == 5